@@ -0,0 +1,83 @@
+import argparse
+import datetime
+from io import StringIO
+
+from common import median_ms, parse_sizes, setup_database, teardown_database
+
+"""
+Benchmark for the analytics endpoints (see khanto/analytics.py): generates synthetic datasets of growing sizes
+(see the "generate_data" management command) over a year, then times the revenue, occupancy and stay figures of
+the whole year computed from the reservations and read from the monthly rollup, and reports the queries each
+one sends. The cost the rollup adds to every reservation write is reported too.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+LAST_NIGHT = datetime.date(2030, 12, 31)
+
+
+def reservation_write_ms(advertisement, repetitions):
+    from khanto.models import Reservation
+
+    nights = iter(range(repetitions * 2))
+
+    # Reservations a few years after the dataset, one after the other, so that each of them fits.
+    def write():
+        checkin_date = LAST_NIGHT + datetime.timedelta(days=365 + 2 * next(nights))
+        Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+            checkout_date=checkin_date + datetime.timedelta(days=1), total_cost='100.00', comment='Benchmark',
+            guests=1)
+    return median_ms(write, repetitions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('100,1000,10000'),
+        help='comma separated numbers of properties')
+    parser.add_argument('--repetitions', type=int, default=15)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.core.management import call_command
+        from django.db import reset_queries
+        from django.test.utils import override_settings
+        from khanto import analytics
+        from khanto.models import Advertisement, Property, Reservation, ReservationRollup
+
+        figures = {
+            'revenue': lambda: analytics.revenue(FIRST_NIGHT, LAST_NIGHT, by='advertisement'),
+            'occupancy': lambda: analytics.occupancy(FIRST_NIGHT, LAST_NIGHT),
+            'stays': lambda: analytics.stays(FIRST_NIGHT, LAST_NIGHT),
+        }
+
+        print('properties,reservations,rollup_rows,figure,source,median_ms,queries')
+        for size in arguments.sizes:
+            Property.objects.all().delete()
+            with override_settings(ANALYTICS_ROLLUP=True):
+                call_command('generate_data', properties=size, start=FIRST_NIGHT, days=365, seed=size,
+                    stdout=StringIO())
+            reservations = Reservation.objects.count()
+            rollup_rows = ReservationRollup.objects.count()
+            for name, figure in figures.items():
+                for rollup in (False, True):
+                    with override_settings(ANALYTICS_ROLLUP=rollup):
+                        connection.force_debug_cursor = True
+                        reset_queries()
+                        source = figure()[0]
+                        queries = len(connection.queries)
+                        connection.force_debug_cursor = False
+                        print('{},{},{},{},{},{:.2f},{}'.format(size, reservations, rollup_rows, name, source,
+                            median_ms(figure, arguments.repetitions), queries))
+
+        advertisement = Advertisement.objects.first()
+        print()
+        print('rollup,reservation_write_median_ms')
+        for rollup in (False, True):
+            with override_settings(ANALYTICS_ROLLUP=rollup):
+                print('{},{:.2f}'.format(rollup, reservation_write_ms(advertisement, arguments.repetitions)))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
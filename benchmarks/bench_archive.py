@@ -0,0 +1,102 @@
+import argparse
+import datetime
+from io import StringIO
+
+from common import median_ms, setup_database, teardown_database
+
+"""
+Benchmark for the reservation archive (see khanto/archive.py): generates years of synthetic history (see the
+"generate_data" management command) ending a year from now, then times the hot paths reading and writing the
+reservation table before and after moving the reservations checked out more than `--keep-days` days ago to the
+archive: validating and creating a reservation, the first page of the reservation list, filtered lists (indexed
+or not), a lookup by code, the export, and the list with the archived reservations included. Also reports how long
+archiving took.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=200)
+    parser.add_argument('--years', type=int, default=5, help='years of history generated before today')
+    parser.add_argument('--keep-days', type=int, default=365, help='days of history kept in the live table')
+    parser.add_argument('--repetitions', type=int, default=25)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from decimal import Decimal
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.db import transaction
+        from rest_framework.test import APIClient
+        from khanto import archive
+        from khanto.models import Advertisement, ArchivedReservation, Reservation
+
+        today = datetime.date.today()
+        call_command('generate_data', properties=arguments.properties, seed=0,
+            start=today - datetime.timedelta(days=arguments.years * 365), days=(arguments.years + 1) * 365,
+            stdout=StringIO())
+        client = APIClient(HTTP_ACCEPT='application/json')
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+        advertisement = Advertisement.objects.order_by('id').first()
+        recent = today - datetime.timedelta(days=30)
+
+        # A stay far in the future, so that it never conflicts with the generated ones.
+        checkin_date = today + datetime.timedelta(days=(arguments.years + 2) * 365)
+        reservation = Reservation(advertisement=advertisement, checkin_date=checkin_date,
+            checkout_date=checkin_date + datetime.timedelta(days=2), total_cost=Decimal('100.00'),
+            comment='Benchmark', guests=1)
+
+        def create():
+            with transaction.atomic():
+                response = client.post('/reservations/', {'advertisement': advertisement.id,
+                    'checkin_date': checkin_date, 'checkout_date': checkin_date + datetime.timedelta(days=2),
+                    'total_cost': '100.00', 'comment': 'Benchmark', 'guests': 1})
+                assert response.status_code == 201, response.content
+                transaction.set_rollback(True)
+
+        def get(url):
+            def request():
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return request
+
+        code = Reservation.objects.filter(checkout_date__gte=recent).order_by('id').values_list('code',
+            flat=True).first()
+        scenarios = [
+            ('Reservation.clean()', reservation.clean),
+            ('POST /reservations/', create),
+            ('GET /reservations/', get('/reservations/')),
+            ('GET /reservations/?advertisement=', get('/reservations/?advertisement={}'.format(advertisement.id))),
+            ('GET /reservations/?checkin_date=', get('/reservations/?checkin_date={}'.format(recent))),
+            ('GET /reservations/?guests=', get('/reservations/?guests=2')),
+            ('GET /reservations/?code=', get('/reservations/?code={}'.format(code))),
+
+            # Filters without an index scan the table.
+            ('GET /reservations/?total_cost=', get('/reservations/?total_cost=1.00')),
+            ('GET /reservations/export/', get('/reservations/export/')),
+            ('GET /reservations/?include_archived=true', get('/reservations/?include_archived=true')),
+        ]
+
+        total = Reservation.objects.count()
+        before = [median_ms(function, arguments.repetitions) for name, function in scenarios]
+        start = datetime.datetime.now()
+        archived = archive.archive_reservations(archive.horizon(arguments.keep_days))
+        archive_seconds = (datetime.datetime.now() - start).total_seconds()
+        assert archived == ArchivedReservation.objects.count()
+        after = [median_ms(function, arguments.repetitions) for name, function in scenarios]
+
+        print('reservations,archived,archive_seconds')
+        print('{},{},{:.1f}'.format(total, archived, archive_seconds))
+        print()
+        print('scenario,before_ms,after_ms')
+        for (name, function), before_ms, after_ms in zip(scenarios, before, after):
+            print('{},{:.3f},{:.3f}'.format(name, before_ms, after_ms))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import datetime
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark of the async read endpoints (see khanto/async_views.py) against the synchronous views of the WSGI
+deployment: the same mix of property retrieves, availability searches, calendars and reservation lists is sent
+with a number of requests in flight at once, from a pool of threads through the WSGI handler and from asyncio
+tasks through the ASGI handler (both in this process, without a server in front), and the p50/p99 latency and
+throughput of each deployment are reported.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+def populate(properties, reservations, seed):
+    from django.core.management import call_command
+    from khanto.models import Property, Advertisement, Reservation
+
+    generator = random.Random(seed)
+    Property.objects.bulk_create([Property(code=code + 1, guest_vacancies=generator.randint(1, 6), bathrooms=1,
+        pets_allowed=True, cleaning_cost=Decimal('10.00')) for code in range(properties)])
+    property_ids = list(Property.objects.values_list('id', flat=True))
+    Advertisement.objects.bulk_create([Advertisement(property_id=property_id, platform='Benchmark',
+        platform_tax=Decimal('10.00')) for property_id in property_ids])
+    advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+    batch = []
+    for code in range(reservations):
+        checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(365))
+        batch.append(Reservation(advertisement_id=generator.choice(advertisement_ids), code=code + 1,
+            checkin_date=checkin_date, checkout_date=checkin_date + datetime.timedelta(days=generator.randint(1, 7)),
+            total_cost=Decimal('100.00'), comment='Benchmark', guests=1))
+    Reservation.objects.bulk_create(batch, batch_size=10000)
+    call_command('rebuild_occupancy', stdout=StringIO())
+    return property_ids
+
+
+def request_urls(property_ids, count, seed):
+    generator = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        property_id = generator.choice(property_ids)
+        checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(365))
+        urls.append(generator.choice([
+            '/properties/{}/'.format(property_id),
+            '/properties/available/?checkin={}&checkout={}&guests=1&page_size=20'.format(
+                checkin_date, checkin_date + datetime.timedelta(days=3)),
+            '/properties/{}/calendar/?from={}&to={}'.format(property_id, checkin_date,
+                checkin_date + datetime.timedelta(days=30)),
+            '/reservations/?page_size=20&checkin_date={}'.format(checkin_date),
+        ]))
+    return urls
+
+
+def percentile(durations, fraction):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * fraction))]
+
+
+def run_wsgi(user, urls, concurrency):
+    from django.db import connection
+    from django.test import Client
+
+    def get(url):
+        client = Client()
+        client.force_login(user)
+        start = time.perf_counter()
+        response = client.get(url, HTTP_ACCEPT='application/json')
+        duration = (time.perf_counter() - start) * 1000
+        connection.close()
+        assert response.status_code == 200, response.content
+        return duration
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(get, urls))
+    return durations, time.perf_counter() - start
+
+
+def run_asgi(user, urls, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    client.force_login(user)
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get(url):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, HTTP_ACCEPT='application/json')
+                assert response.status_code == 200, response.content
+                return (time.perf_counter() - start) * 1000
+
+        return await asyncio.gather(*[get(url) for url in urls])
+
+    start = time.perf_counter()
+    durations = asyncio.run(main())
+    return durations, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=1000)
+    parser.add_argument('--reservations', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64, help='number of requests in flight at once')
+    arguments = parser.parse_args()
+
+    connection = setup_database(shared=True)
+    try:
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from django.test.utils import override_settings
+
+        property_ids = populate(arguments.properties, arguments.reservations, 0)
+        user = User.objects.create_superuser(username='benchmark', password='benchmark')
+        urls = request_urls(property_ids, arguments.requests, 1)
+
+        print('deployment,requests,concurrency,requests_per_second,p50_ms,p99_ms')
+        for deployment, urlconf, run in [('wsgi', 'khanto.urls', run_wsgi), ('asgi', 'khanto.async_urls', run_asgi)]:
+            cache.clear()
+            with override_settings(ROOT_URLCONF=urlconf):
+                durations, duration = run(user, urls, arguments.concurrency)
+            print('{},{},{},{:.1f},{:.2f},{:.2f}'.format(deployment, len(urls), arguments.concurrency,
+                len(urls) / duration, percentile(durations, 0.5), percentile(durations, 0.99)))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import datetime
+import random
+import time
+from decimal import Decimal
+from io import StringIO
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for the availability search (GET /properties/available/): fills the database with properties and
+reservations spread over a year, then measures the p50 and p99 latency of random searches against a target.
+The reference dataset is 100k properties and 10M reservations (`--properties 100000 --reservations 10000000`),
+which is best run against PostgreSQL.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+def populate(properties, reservations, seed):
+    from django.core.management import call_command
+    from khanto.models import Property, Advertisement, Reservation
+
+    generator = random.Random(seed)
+    for start in range(0, properties, 10000):
+        Property.objects.bulk_create([Property(code=code + 1, guest_vacancies=generator.randint(1, 10),
+            bathrooms=1, pets_allowed=generator.random() < 0.5, cleaning_cost=Decimal('10.00'))
+            for code in range(start, min(start + 10000, properties))])
+    property_ids = list(Property.objects.values_list('id', flat=True))
+    for start in range(0, len(property_ids), 10000):
+        Advertisement.objects.bulk_create([Advertisement(property_id=property_id, platform='Benchmark',
+            platform_tax=Decimal('10.00')) for property_id in property_ids[start:start + 10000]])
+    advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+
+    # Reservations are inserted in bulk, without checking vacancies, so some nights may be overbooked; that only
+    # makes those properties unavailable, which is fine for measuring the search.
+    for start in range(0, reservations, 10000):
+        batch = []
+        for code in range(start, min(start + 10000, reservations)):
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(365))
+            batch.append(Reservation(advertisement_id=generator.choice(advertisement_ids), code=code + 1,
+                checkin_date=checkin_date, checkout_date=checkin_date + datetime.timedelta(days=generator.randint(1, 7)),
+                total_cost=Decimal('100.00'), comment='Benchmark', guests=generator.randint(1, 3)))
+        Reservation.objects.bulk_create(batch)
+    call_command('rebuild_occupancy', stdout=StringIO())
+
+
+def percentile(durations, fraction):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=1000)
+    parser.add_argument('--reservations', type=int, default=100000)
+    parser.add_argument('--searches', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--target-ms', type=float, default=50, help='p99 latency target in milliseconds')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+
+        populate(arguments.properties, arguments.reservations, 0)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+
+        generator = random.Random(1)
+        durations = []
+        for _ in range(arguments.searches):
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(365))
+            checkout_date = checkin_date + datetime.timedelta(days=generator.randint(1, 14))
+            url = '/properties/available/?checkin={}&checkout={}&guests={}&page_size={}'.format(
+                checkin_date, checkout_date, generator.randint(1, 6), arguments.page_size)
+            if generator.random() < 0.5:
+                url += '&pets_allowed=true'
+            connection.queries_log.clear()
+            start = time.perf_counter()
+            response = client.get(url)
+            durations.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.content
+
+        p99 = percentile(durations, 0.99)
+        print('properties,reservations,searches,p50_ms,p99_ms,target_ms,met')
+        print('{},{},{},{:.2f},{:.2f},{},{}'.format(arguments.properties, arguments.reservations,
+            arguments.searches, percentile(durations, 0.5), p99, arguments.target_ms, p99 <= arguments.target_ms))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import datetime
+import gc
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from common import median_ms, parse_sizes, setup_database, teardown_database
+
+"""
+Benchmark for the in-memory availability index (see khanto/availability_index.py): as the reservation table
+grows, measures how long loading the index takes, the memory it holds per reservation (its arrays alone, and
+everything allocated while loading it), and how long an availability search takes with the index compared to the
+occupancy ledger.
+"""
+
+PROPERTIES = 1000
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+HISTORY_DAYS = 3 * 365
+
+
+# Insert reservations until the table holds `total` rows, starting from `current` rows, along with the ledger.
+def grow(advertisement_ids, current, total, generator):
+    from django.core.management import call_command
+    from io import StringIO
+    from khanto.models import Reservation
+
+    for start in range(current, total, 10000):
+        batch = []
+        for code in range(start, min(start + 10000, total)):
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(HISTORY_DAYS))
+            checkout_date = checkin_date + datetime.timedelta(days=generator.randint(1, 7))
+            batch.append(Reservation(advertisement_id=advertisement_ids[code % PROPERTIES], code=code + 1,
+                checkin_date=checkin_date, checkout_date=checkout_date, total_cost=Decimal('100.00'),
+                comment='Benchmark', guests=1))
+        Reservation.objects.bulk_create(batch)
+    call_command('rebuild_occupancy', stdout=StringIO())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('10000,100000'),
+        help='comma separated reservation table sizes (e.g. 10000,100000,1000000)')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.test.utils import override_settings
+        from khanto.availability_index import index
+        from khanto.models import Property, Advertisement
+
+        Property.objects.bulk_create([Property(code=code + 1, guest_vacancies=100000, bathrooms=1,
+            pets_allowed=True, cleaning_cost=Decimal('10.00')) for code in range(PROPERTIES)])
+        Advertisement.objects.bulk_create([Advertisement(property_id=property_id, platform='Benchmark',
+            platform_tax=Decimal('10.00')) for property_id in Property.objects.order_by('id').values_list('id',
+            flat=True)])
+        advertisement_ids = list(Advertisement.objects.order_by('id').values_list('id', flat=True))
+
+        print('reservations,load_ms,array_bytes_per_reservation,allocated_bytes_per_reservation,'
+            'index_search_ms,ledger_search_ms')
+        generator = random.Random(0)
+        current = 0
+        for size in arguments.sizes:
+            grow(advertisement_ids, current, size, generator)
+            current = size
+
+            index.reset()
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            index.load()
+            load_ms = (time.perf_counter() - start) * 1000
+            allocated = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=HISTORY_DAYS // 2)
+            checkout_date = checkin_date + datetime.timedelta(days=3)
+            timings = {}
+            for enabled in (True, False):
+                with override_settings(AVAILABILITY_INDEX=enabled):
+                    timings[enabled] = median_ms(
+                        lambda: len(Property.objects.available(checkin_date, checkout_date, 1)[:100]), 25)
+            print('{},{:.1f},{:.1f},{:.1f},{:.3f},{:.3f}'.format(size, load_ms, index.nbytes() / size,
+                allocated / size, timings[True], timings[False]))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for the bulk reservation import (khanto/bulk.py): imports a batch of reservations spread across
+several properties and reports the total time, the time spent in the database and the number of queries,
+next to the same figures for saving a sample of the reservations one by one (the path of POST /reservations/).
+"""
+
+
+# Collects the number of queries and the time spent executing them.
+class QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def make_items(advertisement_ids, count, seed):
+    generator = random.Random(seed)
+    items = []
+    for _ in range(count):
+        checkin_date = datetime.date(2030, 1, 1) + datetime.timedelta(days=generator.randrange(365))
+        items.append({
+            'advertisement': generator.choice(advertisement_ids),
+            'checkin_date': checkin_date.isoformat(),
+            'checkout_date': (checkin_date + datetime.timedelta(days=generator.randint(1, 7))).isoformat(),
+            'total_cost': '100.00',
+            'comment': 'Benchmark',
+            'guests': generator.randint(1, 4),
+        })
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=10000, help='number of reservations imported at once')
+    parser.add_argument('--properties', type=int, default=200)
+    parser.add_argument('--sample', type=int, default=200, help='reservations saved one by one for comparison')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.core.exceptions import ValidationError
+        from khanto.bulk import import_reservations
+        from khanto.models import Property, Advertisement, Reservation
+
+        for code in range(1, arguments.properties + 1):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=20, bathrooms=1,
+                pets_allowed=True, cleaning_cost=Decimal('10.00'))
+            Advertisement.objects.create(property=reserved_property, platform='Benchmark',
+                platform_tax=Decimal('10.00'))
+        advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+
+        print('method,reservations,created,seconds,db_seconds,queries')
+        timer = QueryTimer()
+        items = make_items(advertisement_ids, arguments.batch, 0)
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            results = import_reservations(items)
+        duration = time.perf_counter() - start
+        created = sum(1 for result in results if result['status'] == 'created')
+        print('bulk,{},{},{:.3f},{:.3f},{}'.format(len(items), created, duration, timer.seconds, timer.queries))
+
+        timer = QueryTimer()
+        items = make_items(advertisement_ids, arguments.sample, 1)
+        created = 0
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            for item in items:
+                try:
+                    Reservation(advertisement_id=item.pop('advertisement'), **item).save()
+                    created += 1
+                except ValidationError:
+                    pass
+        duration = time.perf_counter() - start
+        print('one_by_one,{},{},{:.3f},{:.3f},{}'.format(len(items), created, duration, timer.seconds, timer.queries))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
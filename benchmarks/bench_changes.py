@@ -0,0 +1,102 @@
+import argparse
+import random
+import time
+from io import StringIO
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for the change feed (see khanto/changes.py): generates a synthetic dataset (see the "generate_data"
+management command) with the feed enabled, then, after a growing number of reservations are edited, compares the
+cost of a client catching up by listing every property, advertisement and reservation again with the cost of
+reading the changes since its last cursor: time, bytes received, requests and queries. Also reports the time taken
+by the compaction of the feed and the number of entries it deletes.
+"""
+
+
+# Follow the pages of each URL, returning the number of requests, bytes and queries.
+def fetch(client, urls, next_url):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # The query log is capped, so it is emptied for the queries to be counted.
+    connection.queries_log.clear()
+    requests, size = 0, 0
+    with CaptureQueriesContext(connection) as queries:
+        for url in urls:
+            while url:
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+                requests += 1
+                size += len(response.content)
+                url = next_url(response.json())
+    return requests, size, len(queries)
+
+
+def timed(function, repetitions):
+    results, durations = None, []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        results = function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return (sorted(durations)[len(durations) // 2],) + results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=1000)
+    parser.add_argument('--changes', default='10,100,1000,10000',
+        help='comma separated numbers of reservations edited before each sync')
+    parser.add_argument('--repetitions', type=int, default=3)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.test.utils import override_settings
+        from rest_framework.test import APIClient
+        from khanto import changes
+        from khanto.caching import get_cache
+        from khanto.models import Change, Reservation
+
+        with override_settings(CHANGE_FEED=True, CHANGE_FEED_SETTLE_SECONDS=0):
+            call_command('generate_data', properties=arguments.properties, seed=0, stdout=StringIO())
+            client = APIClient(HTTP_ACCEPT='application/json')
+            client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+            reservation_ids = list(Reservation.objects.values_list('id', flat=True))
+            generator = random.Random(0)
+
+            def full_listing():
+                get_cache().clear()
+                return fetch(client, ['/properties/?page_size=1000', '/advertisements/?page_size=1000',
+                    '/reservations/?page_size=1000'], lambda page: page['next'])
+
+            print('reservations,changes,full_ms,full_requests,full_bytes,full_queries,feed_ms,feed_requests,'
+                'feed_bytes,feed_queries')
+            for count in [int(count) for count in arguments.changes.split(',') if count]:
+                cursor = changes.latest()
+                for reservation in Reservation.objects.filter(pk__in=generator.sample(reservation_ids,
+                        min(count, len(reservation_ids)))):
+                    reservation.comment = 'Edited'
+                    reservation.save()
+
+                def feed():
+                    return fetch(client, ['/changes/?limit=5000&since={}'.format(cursor)],
+                        lambda page: page['has_more'] and '/changes/?limit=5000&since={}'.format(page['next']))
+
+                print('{},{},{:.1f},{},{},{},{:.1f},{},{},{}'.format(len(reservation_ids), count,
+                    *timed(full_listing, arguments.repetitions), *timed(feed, arguments.repetitions)))
+
+            print()
+            print('entries_before,entries_after,compaction_ms')
+            before = Change.objects.count()
+            start = time.perf_counter()
+            changes.compact()
+            print('{},{},{:.1f}'.format(before, Change.objects.count(), (time.perf_counter() - start) * 1000))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
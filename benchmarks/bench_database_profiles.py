@@ -0,0 +1,125 @@
+import argparse
+import datetime
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common import setup_database, teardown_database
+
+"""
+Load test of the database profile selected by the environment (see DATABASES in khanto/settings.py): several
+threads send reservation creations (POST /reservations/) and reservation list reads (GET /reservations/) at the
+same time, and the throughput, p50/p99 latency and failures of each endpoint are reported. Run it once per
+profile to compare them, e.g.:
+- `python3 benchmarks/bench_database_profiles.py`
+- `python3 benchmarks/bench_database_profiles.py --journal-mode DELETE` (SQLite without write-ahead logging)
+- `DATABASE_ENGINE=postgresql python3 benchmarks/bench_database_profiles.py`
+- `DATABASE_ENGINE=postgresql DATABASE_POOL=psycopg python3 benchmarks/bench_database_profiles.py`
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+def percentile(durations, fraction):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * fraction))] if durations else 0
+
+
+# Send requests from one thread, alternating creations and list reads according to `write_ratio`.
+def load(user, advertisement_ids, requests, write_ratio, seed, results, lock):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    client = APIClient(HTTP_ACCEPT='application/json')
+    client.force_authenticate(user=user)
+    generator = random.Random(seed)
+    local = {'create': ([], 0), 'list': ([], 0)}
+    for _ in range(requests):
+        if generator.random() < write_ratio:
+            endpoint = 'create'
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(3650))
+            start = time.perf_counter()
+            response = client.post('/reservations/', {'advertisement': generator.choice(advertisement_ids),
+                'checkin_date': checkin_date, 'checkout_date': checkin_date + datetime.timedelta(days=1),
+                'total_cost': '100.00', 'comment': 'Load test', 'guests': 1})
+            succeeded = response.status_code == 201
+        else:
+            endpoint = 'list'
+            start = time.perf_counter()
+            response = client.get('/reservations/?page_size=50&advertisement={}'.format(
+                generator.choice(advertisement_ids)))
+            succeeded = response.status_code == 200
+        durations, failures = local[endpoint]
+        if succeeded:
+            durations.append((time.perf_counter() - start) * 1000)
+        else:
+            failures += 1
+        local[endpoint] = (durations, failures)
+    connection.close()
+    with lock:
+        for endpoint, (durations, failures) in local.items():
+            results[endpoint][0].extend(durations)
+            results[endpoint][1].append(failures)
+
+
+def profile_name(connection):
+    from django.conf import settings
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return 'sqlite-{}'.format(cursor.fetchone()[0])
+    return '{}-{}'.format(connection.vendor, getattr(settings, 'DATABASE_POOL', '') or
+        'conn_max_age_{}'.format(connection.settings_dict['CONN_MAX_AGE']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests sent per thread')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='share of the requests creating reservations')
+    parser.add_argument('--properties', type=int, default=50)
+    parser.add_argument('--journal-mode', help='overrides the SQLite journal mode, e.g. DELETE')
+    arguments = parser.parse_args()
+
+    if arguments.journal_mode:
+        import django
+        from django.conf import settings
+        django.setup()
+        settings.SQLITE_PRAGMAS = {**settings.SQLITE_PRAGMAS, 'journal_mode': arguments.journal_mode}
+
+    connection = setup_database(shared=True)
+    try:
+        from django.contrib.auth.models import User
+        from khanto.models import Property, Advertisement
+
+        for code in range(1, arguments.properties + 1):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=1000, bathrooms=1,
+                pets_allowed=True, cleaning_cost=Decimal('10.00'))
+            Advertisement.objects.create(property=reserved_property, platform='Load', platform_tax=Decimal('10.00'))
+        advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+        user = User.objects.create_superuser(username='benchmark', password='benchmark')
+        profile = profile_name(connection)
+        connection.close()
+
+        results = {'create': ([], []), 'list': ([], [])}
+        lock = threading.Lock()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=arguments.threads) as executor:
+            for seed in range(arguments.threads):
+                executor.submit(load, user, advertisement_ids, arguments.requests, arguments.write_ratio, seed,
+                    results, lock)
+        duration = time.perf_counter() - start
+
+        print('profile,endpoint,threads,succeeded,failed,requests_per_second,p50_ms,p99_ms')
+        for endpoint, (durations, failures) in results.items():
+            print('{},{},{},{},{},{:.1f},{:.2f},{:.2f}'.format(profile, endpoint, arguments.threads, len(durations),
+                sum(failures), len(durations) / duration, percentile(durations, 0.5), percentile(durations, 0.99)))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import datetime
+import resource
+import time
+from decimal import Decimal
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for the streaming reservation export (/reservations/export/): measures the exported rows per second
+and how much the process' memory grows while streaming, for NDJSON and CSV.
+"""
+
+
+# Current resident memory of the process in MiB, read from /proc when available.
+def resident_mib():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def populate(rows):
+    from khanto.models import Property, Advertisement, Reservation
+
+    reserved_property = Property.objects.create(code=1, guest_vacancies=1, bathrooms=1,
+        pets_allowed=True, cleaning_cost=Decimal('10.00'))
+    advertisement = Advertisement.objects.create(property=reserved_property, platform='Benchmark',
+        platform_tax=Decimal('10.00'))
+    first_day = datetime.date(2000, 1, 1)
+    for start in range(0, rows, 10000):
+        Reservation.objects.bulk_create([Reservation(advertisement=advertisement, code=code + 1,
+            checkin_date=first_day + datetime.timedelta(days=code % 10000),
+            checkout_date=first_day + datetime.timedelta(days=code % 10000 + 2),
+            total_cost=Decimal('100.00'), comment='Benchmark', guests=1)
+            for code in range(start, min(start + 10000, rows))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000, help='number of reservations to export (e.g. 5000000)')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+
+        populate(arguments.rows)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+
+        print('output,rows,seconds,rows_per_second,bytes,rss_growth_mib')
+        for output in ('ndjson', 'csv'):
+            connection.queries_log.clear()
+            baseline = peak = resident_mib()
+            exported_bytes = 0
+            start = time.perf_counter()
+            response = client.get('/reservations/export/?output=' + output)
+            for chunk in response.streaming_content:
+                exported_bytes += len(chunk)
+                peak = max(peak, resident_mib())
+            duration = time.perf_counter() - start
+            print('{},{},{:.2f},{:.0f},{},{:.1f}'.format(output, arguments.rows, duration,
+                arguments.rows / duration, exported_bytes, peak - baseline))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
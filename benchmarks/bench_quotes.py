@@ -0,0 +1,105 @@
+import argparse
+import datetime
+import random
+from io import StringIO
+
+from common import median_ms, setup_database, teardown_database
+
+"""
+Benchmark for the quote engine (see khanto/quotes.py): generates a synthetic dataset (see the "generate_data"
+management command) with some nightly rates overridden, then reports the throughput of POST /quotes/ with
+batches of random stays, and of the engine on its own compared to pricing each stay night by night (both
+including the query loading the overridden rates).
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+def populate(properties, overridden, generator):
+    from django.core.management import call_command
+    from khanto.models import Advertisement, NightlyRate
+
+    call_command('generate_data', properties=properties, start=FIRST_NIGHT, days=365, seed=0, stdout=StringIO())
+    advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+    NightlyRate.objects.bulk_create([NightlyRate(advertisement_id=advertisement_id,
+        night=FIRST_NIGHT + datetime.timedelta(days=night), rate='250.00')
+        for advertisement_id in advertisement_ids
+        for night in generator.sample(range(365), overridden)], batch_size=5000)
+    return advertisement_ids
+
+
+def random_stays(advertisement_ids, count, generator):
+    stays = []
+    for _ in range(count):
+        checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(350))
+        stays.append({'advertisement': generator.choice(advertisement_ids), 'checkin_date': checkin_date.isoformat(),
+            'checkout_date': (checkin_date + datetime.timedelta(days=generator.randint(1, 14))).isoformat(),
+            'guests': 1})
+    return stays
+
+
+# Price each stay on its own by adding up the rate of every night, as a client would.
+def price_night_by_night(stays, advertisements, rates):
+    totals = []
+    for advertisement, checkin_date, checkout_date in stays:
+        total = advertisement.property.cleaning_cost + advertisement.platform_tax
+        night = checkin_date
+        while night < checkout_date:
+            total += rates.get((advertisement.id, night), advertisement.nightly_rate)
+            night += datetime.timedelta(days=1)
+        totals.append(total)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=1000)
+    parser.add_argument('--quotes', type=int, default=10000, help='number of stays quoted per request')
+    parser.add_argument('--overridden', type=int, default=30, help='nightly rates overridden per advertisement')
+    parser.add_argument('--repetitions', type=int, default=5)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.test.utils import override_settings
+        from rest_framework.test import APIClient
+        from khanto import quotes
+        from khanto.models import Advertisement, NightlyRate
+
+        generator = random.Random(0)
+        advertisement_ids = populate(arguments.properties, arguments.overridden, generator)
+        stays = random_stays(advertisement_ids, arguments.quotes, generator)
+        client = APIClient(HTTP_ACCEPT='application/json')
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+
+        def request():
+            response = client.post('/quotes/', stays, format='json')
+            assert response.status_code == 200 and response.data['errors'] == 0, response.content
+
+        print('numpy={}'.format(quotes.numpy is not None))
+        print('scenario,quotes,median_ms,quotes_per_second')
+        with override_settings(QUOTE_BATCH_LIMIT=arguments.quotes):
+            duration = median_ms(request, arguments.repetitions)
+        print('post_quotes,{},{:.1f},{:.0f}'.format(len(stays), duration, len(stays) / duration * 1000))
+
+        # The engine and the night by night pricing, given the same loaded advertisements.
+        advertisements = Advertisement.objects.select_related('property').in_bulk()
+        loaded = [(advertisements[stay['advertisement']], datetime.date.fromisoformat(stay['checkin_date']),
+            datetime.date.fromisoformat(stay['checkout_date'])) for stay in stays]
+        duration = median_ms(lambda: quotes.price_stays(loaded), arguments.repetitions)
+        print('engine,{},{:.1f},{:.0f}'.format(len(stays), duration, len(stays) / duration * 1000))
+
+        def night_by_night():
+            rates = {(advertisement_id, night): rate
+                for advertisement_id, night, rate in NightlyRate.objects.values_list('advertisement', 'night', 'rate')}
+            return price_night_by_night(loaded, advertisements, rates)
+        duration = median_ms(night_by_night, arguments.repetitions)
+        print('night_by_night,{},{:.1f},{:.0f}'.format(len(stays), duration, len(stays) / duration * 1000))
+        assert [price['total_cost'] for price in quotes.price_stays(loaded)] == night_by_night()
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from common import median_ms, parse_sizes, setup_database, teardown_database
+
+"""
+Benchmark for Reservation.clean(): measures how long validating one new reservation takes, and how
+many queries it sends, as the reservation table grows. The reservations are spread across a fixed
+number of properties and several years of history, so the busiest property also grows with the table.
+"""
+
+PROPERTIES = 1000
+HISTORY_DAYS = 5 * 365
+
+
+# Insert reservations until the table holds `total` rows, starting from `current` rows.
+def grow_reservations(advertisements, current, total):
+    from khanto.models import Reservation
+
+    first_day = datetime.date(2018, 1, 1)
+    batch = []
+    for i in range(current, total):
+        checkin_date = first_day + datetime.timedelta(days=(i // PROPERTIES) % HISTORY_DAYS)
+        batch.append(Reservation(
+            advertisement=advertisements[i % PROPERTIES],
+            code=i + 1,
+            checkin_date=checkin_date,
+            checkout_date=checkin_date + datetime.timedelta(days=2),
+            total_cost=Decimal('100.00'),
+            comment='Benchmark',
+            guests=1))
+        if len(batch) == 10000:
+            Reservation.objects.bulk_create(batch)
+            batch = []
+    Reservation.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('1000,10000,100000'),
+        help='comma separated reservation table sizes (e.g. 1000,10000,100000,1000000)')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.core.management import call_command
+        from django.test.utils import CaptureQueriesContext
+        from khanto.models import Property, Advertisement, Reservation
+
+        Property.objects.bulk_create([Property(code=i + 1, guest_vacancies=100000, bathrooms=1,
+            pets_allowed=True, cleaning_cost=Decimal('10.00')) for i in range(PROPERTIES)])
+        Advertisement.objects.bulk_create([Advertisement(property=p, platform='Benchmark',
+            platform_tax=Decimal('10.00')) for p in Property.objects.order_by('id')])
+        advertisements = list(Advertisement.objects.order_by('id'))
+
+        print('reservations,clean_ms,queries')
+        current = 0
+        for size in arguments.sizes:
+            grow_reservations(advertisements, current, size)
+            current = size
+
+            # Reservations inserted in bulk skip save(), so rebuild the occupancy ledger from them.
+            call_command('rebuild_occupancy', stdout=StringIO())
+
+            # A new reservation for the first property, overlapping the end of its history.
+            checkin_date = datetime.date(2018, 1, 1) + datetime.timedelta(days=HISTORY_DAYS - 1)
+            reservation = Reservation(advertisement_id=advertisements[0].id, code=size + 1,
+                checkin_date=checkin_date, checkout_date=checkin_date + datetime.timedelta(days=3),
+                total_cost=Decimal('100.00'), comment='Benchmark', guests=1)
+
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                reservation.clean()
+            duration = median_ms(reservation.clean)
+            print('{},{:.3f},{}'.format(size, duration, len(queries)))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
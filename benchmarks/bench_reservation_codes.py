@@ -0,0 +1,85 @@
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for reservation code generation: measures the throughput of inserting reservations when the codes
+come from the previous generator (a random number between 1 and 99999, retried until no reservation uses it)
+and from the current one (khanto/codes.py), as the legacy code range fills up.
+"""
+
+LEGACY_CODES = 99999
+
+
+# The previous generator, kept here for comparison.
+def legacy_code():
+    from khanto.models import Reservation
+
+    while True:
+        code = random.randint(1, LEGACY_CODES)
+        if not Reservation.objects.filter(code=code).exists():
+            return code
+
+
+def parse_fills(value):
+    return [float(fill) for fill in value.split(',') if fill]
+
+
+# Insert `count` reservations with codes from `generator`, returning the insertions per second. Each reservation
+# is removed right after being timed so that the table keeps the same fill throughout the measurement.
+def insert_throughput(advertisement, generator, count):
+    from khanto.models import Reservation
+
+    duration = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        reservation, = Reservation.objects.bulk_create([Reservation(advertisement=advertisement,
+            code=generator(), checkin_date='2030-01-01', checkout_date='2030-01-02',
+            total_cost=Decimal('100.00'), comment='Benchmark', guests=1)])
+        duration += time.perf_counter() - start
+        Reservation.objects.filter(code=reservation.code).delete()
+    return count / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fills', type=parse_fills, default=parse_fills('0.5,0.9,0.99,0.999'),
+        help='comma separated fractions of the legacy code range already in use')
+    parser.add_argument('--inserts', type=int, default=100, help='reservations inserted per measurement')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from khanto.models import Property, Advertisement, Reservation, random_unique_code
+
+        reserved_property = Property.objects.create(code=1, guest_vacancies=1, bathrooms=1,
+            pets_allowed=True, cleaning_cost=Decimal('10.00'))
+        advertisement = Advertisement.objects.create(property=reserved_property, platform='Benchmark',
+            platform_tax=Decimal('10.00'))
+
+        # Legacy codes in use, in random order so that each fill level is a random subset of the range.
+        legacy_codes = list(range(1, LEGACY_CODES + 1))
+        random.Random(0).shuffle(legacy_codes)
+
+        print('fill,legacy_inserts_per_second,current_inserts_per_second')
+        filled = 0
+        for fill in arguments.fills:
+            target = int(LEGACY_CODES * fill)
+            Reservation.objects.bulk_create([Reservation(advertisement=advertisement, code=code,
+                checkin_date='2020-01-01', checkout_date='2020-01-02', total_cost=Decimal('100.00'),
+                comment='Benchmark', guests=1) for code in legacy_codes[filled:target]], batch_size=10000)
+            filled = target
+            connection.queries_log.clear()
+
+            legacy = insert_throughput(advertisement, legacy_code, arguments.inserts)
+            current = insert_throughput(advertisement, random_unique_code, arguments.inserts)
+            print('{},{:.1f},{:.1f}'.format(fill, legacy, current))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
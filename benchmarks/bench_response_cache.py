@@ -0,0 +1,88 @@
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from common import setup_database, teardown_database
+
+"""
+Benchmark for the read-through response cache (see khanto/caching.py): fills the database with properties and
+advertisements, then measures the requests per second of property and advertisement reads with the cache
+cleared before every request (every read is a miss) and with a warm cache, along with the hit ratio.
+"""
+
+
+def populate(properties):
+    from khanto.models import Property, Advertisement
+
+    for start in range(0, properties, 10000):
+        Property.objects.bulk_create([Property(code=code + 1, guest_vacancies=2, bathrooms=1, pets_allowed=True,
+            cleaning_cost=Decimal('10.00')) for code in range(start, min(start + 10000, properties))])
+    property_ids = list(Property.objects.values_list('id', flat=True))
+    for start in range(0, len(property_ids), 10000):
+        Advertisement.objects.bulk_create([Advertisement(property_id=property_id, platform='Benchmark',
+            platform_tax=Decimal('10.00')) for property_id in property_ids[start:start + 10000]])
+    return property_ids
+
+
+def requests_per_second(client, urls, cold):
+    from khanto.caching import get_cache
+
+    start = time.perf_counter()
+    for url in urls:
+        if cold:
+            get_cache().clear()
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--distinct', type=int, default=200, help='number of distinct URLs requested')
+    parser.add_argument('--page-size', type=int, default=100)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from khanto.caching import cache_statistics
+
+        property_ids = populate(arguments.properties)
+        client = APIClient(HTTP_ACCEPT='application/json')
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+
+        generator = random.Random(0)
+        endpoints = {
+            'property_retrieve': ['/properties/{}/'.format(property_id)
+                for property_id in generator.sample(property_ids, min(arguments.distinct, len(property_ids)))],
+            'property_list': ['/properties/?page_size={}'.format(arguments.page_size + index)
+                for index in range(arguments.distinct)],
+            'advertisement_list': ['/advertisements/?expand=property&page_size={}&property={}'.format(
+                arguments.page_size, property_id) for property_id in property_ids[:arguments.distinct]],
+        }
+
+        print('endpoint,requests,cold_rps,warm_rps,speedup,warm_hit_ratio')
+        for name, distinct_urls in endpoints.items():
+            urls = [generator.choice(distinct_urls) for _ in range(arguments.requests)]
+            connection.queries_log.clear()
+            cold = requests_per_second(client, urls, cold=True)
+
+            # Warm the cache with every distinct URL, then measure.
+            requests_per_second(client, distinct_urls, cold=False)
+            before = cache_statistics()['responses']
+            connection.queries_log.clear()
+            warm = requests_per_second(client, urls, cold=False)
+            after = cache_statistics()['responses']
+            hits = after['hit'] - before['hit']
+            print('{},{},{:.0f},{:.0f},{:.1f},{:.3f}'.format(name, len(urls), cold, warm, warm / cold,
+                hits / (hits + after['miss'] - before['miss'])))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+from io import StringIO
+
+from common import median_ms, setup_database, teardown_database
+
+"""
+Benchmark for the fast path of the list endpoints (see khanto/fastpath.py): generates a synthetic dataset (see the
+"generate_data" management command), then reports the rows per second of formatting and rendering the properties
+and reservations with the ModelSerializers and DRF's JSONRenderer, and with the row serializer and render_json(),
+along with the latency of a full list page through each path.
+"""
+
+
+def rows_per_second(function, rows, repetitions):
+    return rows / median_ms(function, repetitions) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=20000, help='number of rows formatted at once')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repetitions', type=int, default=5)
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from unittest import mock
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.test import APIClient
+        from khanto import fastpath
+        from khanto.caching import get_cache
+        from khanto.fastpath import FastListViewSetMixin, RowSerializer, render_json
+        from khanto.models import Property, Reservation
+        from khanto.serializers import PropertySerializer, ReservationSerializer
+
+        call_command('generate_data', properties=arguments.properties, seed=0, stdout=StringIO())
+        client = APIClient(HTTP_ACCEPT='application/json')
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+        print('orjson={}'.format(fastpath.orjson is not None))
+
+        print('serializer,rows,serializer_rows_per_second,fast_rows_per_second,speedup')
+        for model, serializer_class in ((Property, PropertySerializer), (Reservation, ReservationSerializer)):
+            queryset = model.objects.order_by('id')[:arguments.rows]
+            rows = len(queryset)
+            row_serializer = RowSerializer.of(serializer_class)
+
+            def serialized():
+                return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+            def fast():
+                return render_json(row_serializer.data(row_serializer.rows(queryset.all())))
+
+            assert serialized() == fast()
+            slow_rate = rows_per_second(serialized, rows, arguments.repetitions)
+            fast_rate = rows_per_second(fast, rows, arguments.repetitions)
+            print('{},{},{:.0f},{:.0f},{:.1f}'.format(serializer_class.__name__, rows, slow_rate, fast_rate,
+                fast_rate / slow_rate))
+
+        print()
+        print('endpoint,page_size,serializer_median_ms,fast_median_ms')
+        for url in ('/properties/?page_size={}', '/reservations/?page_size={}'):
+            url = url.format(arguments.page_size)
+
+            # Property lists are cached otherwise (see khanto/caching.py).
+            def request():
+                get_cache().clear()
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+
+            with mock.patch.object(FastListViewSetMixin, 'fast_row_serializer', return_value=None):
+                slow = median_ms(request, arguments.repetitions)
+            fast = median_ms(request, arguments.repetitions)
+            print('{},{},{:.1f},{:.1f}'.format(url.split('?')[0], arguments.page_size, slow, fast))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
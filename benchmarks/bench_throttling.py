@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common import median_ms, setup_database, teardown_database
+
+"""
+Load test of the rate limits and the admission control (see khanto/throttling.py): a few aggressive users send
+reservation creations (POST /reservations/) and full exports as fast as they can while other users read the
+reservation and property lists at their own pace, all at the same time, once with THROTTLING off and once with it
+on. Reports the reads' p50/p99 latency, and the requests of each kind of user that succeeded, were throttled (429)
+or shed (503), every user waiting for the Retry-After of the ones that were. Also reports the overhead of the
+throttles on a cached read.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+def percentile(durations, fraction):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * fraction))] if durations else 0
+
+
+# Send requests from one thread for `duration` seconds: aggressive users create reservations and export them back
+# to back, the others read lists with a pause in between. Throttled and shed requests wait for their Retry-After.
+def load(user, advertisement_ids, aggressive, duration, seed, results, lock):
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    client = APIClient(HTTP_ACCEPT='application/json')
+    client.force_authenticate(user=user)
+    generator = random.Random(seed)
+    durations, statuses = [], {}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if aggressive and generator.random() < 0.9:
+            checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(3650))
+            response = client.post('/reservations/', {'advertisement': generator.choice(advertisement_ids),
+                'checkin_date': checkin_date, 'checkout_date': checkin_date + datetime.timedelta(days=1),
+                'total_cost': '100.00', 'comment': 'Load test', 'guests': 1})
+        elif aggressive:
+            response = client.get('/reservations/export/')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        else:
+            response = client.get(generator.choice(['/reservations/?page_size=50', '/properties/?page_size=50']))
+            if response.status_code == 200:
+                durations.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.has_header('Retry-After'):
+            time.sleep(min(int(response['Retry-After']), max(0, deadline - time.perf_counter())))
+    connection.close()
+    with lock:
+        role = 'aggressive' if aggressive else 'reader'
+        results[role][0].extend(durations)
+        for status, count in statuses.items():
+            results[role][1][status] = results[role][1].get(status, 0) + count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--aggressive', type=int, default=4, help='threads of aggressive users')
+    parser.add_argument('--readers', type=int, default=4, help='threads of other users')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load with throttling off and on')
+    parser.add_argument('--properties', type=int, default=50)
+    parser.add_argument('--repetitions', type=int, default=200)
+    arguments = parser.parse_args()
+
+    connection = setup_database(shared=True)
+
+    # Throttled and shed requests are logged.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    try:
+        from django.contrib.auth.models import User
+        from django.test.utils import override_settings
+        from rest_framework.test import APIClient
+        from khanto.models import Property, Advertisement
+        from khanto.throttling import get_cache
+
+        for code in range(1, arguments.properties + 1):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=1000, bathrooms=1,
+                pets_allowed=True, cleaning_cost=Decimal('10.00'))
+            Advertisement.objects.create(property=reserved_property, platform='Load', platform_tax=Decimal('10.00'))
+        advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+        users = [User.objects.create_superuser(username='benchmark{}'.format(index), password='benchmark')
+            for index in range(arguments.aggressive + arguments.readers)]
+
+        client = APIClient(HTTP_ACCEPT='application/json')
+        client.force_authenticate(user=users[0])
+        client.get('/properties/')
+        overhead = []
+        for throttling in (False, True):
+            with override_settings(THROTTLING=throttling):
+                get_cache().clear()
+                overhead.append(median_ms(lambda: client.get('/properties/'), arguments.repetitions))
+        connection.close()
+
+        print('throttling,role,requests,ok,throttled,shed,p50_ms,p99_ms')
+        for throttling in (False, True):
+            with override_settings(THROTTLING=throttling):
+                get_cache().clear()
+                results = {'aggressive': ([], {}), 'reader': ([], {})}
+                lock = threading.Lock()
+                with ThreadPoolExecutor(max_workers=len(users)) as executor:
+                    for index, user in enumerate(users):
+                        executor.submit(load, user, advertisement_ids, index < arguments.aggressive,
+                            arguments.duration, index, results, lock)
+                for role, (durations, statuses) in results.items():
+                    print('{},{},{},{},{},{},{:.2f},{:.2f}'.format('on' if throttling else 'off', role,
+                        sum(statuses.values()), statuses.get(200, 0) + statuses.get(201, 0), statuses.get(429, 0),
+                        statuses.get(503, 0), percentile(durations, 0.5), percentile(durations, 0.99)))
+
+        print()
+        print('cached_read_ms_throttling_off,cached_read_ms_throttling_on')
+        print('{:.3f},{:.3f}'.format(*overhead))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
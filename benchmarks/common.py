@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+"""
+Shared helpers for the scripts in this folder. Every benchmark runs against a throwaway test
+database (never against db.sqlite3) which is created with the same settings used by the API.
+
+Run a benchmark from the project's root folder, for example:
+- `python3 benchmarks/bench_reservation_clean.py --sizes 1000,10000,100000,1000000`
+"""
+
+# Make the project importable when running a script directly from this folder.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'khanto.settings')
+
+
+# Set up Django and create a fresh test database holding the tables for every khanto model. With `shared`, an
+# SQLite test database is created as a file instead of in memory, so that other threads and processes can reach it.
+def setup_database(shared=False):
+    import django
+    django.setup()
+
+    from django.apps import apps
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    # Allows requests through the test client, like the test runner does.
+    setup_test_environment()
+
+    if shared and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = str(Path(tempfile.mkdtemp()) / 'benchmark.sqlite3')
+        connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+
+    # Create the khanto tables directly when the app's migrations weren't generated yet.
+    existing_tables = connection.introspection.table_names()
+    with connection.schema_editor() as schema_editor:
+        for model in apps.get_app_config('khanto').get_models():
+            if model._meta.managed and model._meta.db_table not in existing_tables:
+                schema_editor.create_model(model)
+    return connection
+
+
+# Destroy the test database created by setup_database().
+def teardown_database(connection):
+    connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+
+
+# Parse a comma separated list of dataset sizes, e.g. "1000,10000".
+def parse_sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+# Time a callable over a number of repetitions and return the median duration in milliseconds.
+def median_ms(function, repetitions=25):
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    return durations[len(durations) // 2]
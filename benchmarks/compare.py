@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+
+"""
+Compare two result files written by benchmarks/run_suite.py, e.g. before and after a change:
+- `python3 benchmarks/compare.py before.json after.json --threshold 0.1`
+
+Prints the median duration and query count of every scenario and size in both files, and exits with status 1
+when a scenario got slower than the threshold allows (10% by default) or sends more queries than before.
+"""
+
+
+def load(path):
+    with open(path) as file:
+        report = json.load(file)
+    return report['environment'], {(result['scenario'], result['properties']): result
+        for result in report['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.1, help='tolerated slowdown, 0.1 for 10%%')
+    arguments = parser.parse_args()
+
+    before_environment, before = load(arguments.before)
+    after_environment, after = load(arguments.after)
+    print('before: {commit} ({database}, Python {python}, Django {django})'.format(**before_environment))
+    print('after:  {commit} ({database}, Python {python}, Django {django})'.format(**after_environment))
+
+    regressions = 0
+    print('{:<28} {:>10} {:>12} {:>12} {:>8} {:>10} {:>10}  '.format(
+        'scenario', 'properties', 'before_ms', 'after_ms', 'change', 'queries', 'queries'))
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        change = new['median_ms'] / old['median_ms'] - 1 if old['median_ms'] else 0
+        regressed = change > arguments.threshold or new['queries'] > old['queries']
+        regressions += regressed
+        print('{:<28} {:>10} {:>12.3f} {:>12.3f} {:>+7.1%} {:>10} {:>10}  {}'.format(key[0], key[1],
+            old['median_ms'], new['median_ms'], change, old['queries'], new['queries'],
+            'REGRESSION' if regressed else ''))
+
+    missing = sorted(set(before) ^ set(after))
+    if missing:
+        print('Only measured in one of the files: {}'.format(', '.join('{} ({})'.format(*key) for key in missing)))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from io import StringIO
+
+from common import parse_sizes, setup_database, teardown_database
+
+"""
+Benchmark suite for regression tracking: generates synthetic datasets of growing sizes with the
+"generate_data" management command, then times every scenario below against each of them and writes the
+results as JSON, along with the commit and environment they were measured on. Compare two result files with
+benchmarks/compare.py, for example:
+- `python3 benchmarks/run_suite.py --sizes 100,1000 --output before.json`
+- `python3 benchmarks/run_suite.py --sizes 100,1000 --output after.json`
+- `python3 benchmarks/compare.py before.json after.json`
+
+Responses are timed with the response cache cleared before every request, so the database work is measured.
+Sizes are numbers of properties; each property gets two advertisements and is booked about 60% of a year.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+DAYS = 365
+
+
+# Every scenario returns a callable performing one operation, given the benchmark's random generator.
+def scenarios(client, property_ids, advertisement_ids):
+    from django.core.exceptions import ValidationError
+    from khanto.models import Advertisement, Reservation
+
+    def get(url):
+        response = client.get(url, HTTP_ACCEPT='application/json')
+        assert response.status_code == 200, response.content
+
+    def random_night(generator):
+        return FIRST_NIGHT + datetime.timedelta(days=generator.randrange(DAYS))
+
+    # New reservations are booked after the generated time frame, one night each on its own date, so that
+    # they are always accepted.
+    created = iter(range(10 ** 9))
+
+    def reserve(generator):
+        checkin_date = FIRST_NIGHT + datetime.timedelta(days=DAYS + next(created))
+        response = client.post('/reservations/', {'advertisement': generator.choice(advertisement_ids),
+            'checkin_date': checkin_date, 'checkout_date': checkin_date, 'total_cost': '100.00',
+            'comment': 'Benchmark', 'guests': 1}, format='json')
+        assert response.status_code == 201, response.content
+
+    def clean(generator):
+        checkin_date = random_night(generator)
+        reservation = Reservation(advertisement=Advertisement.objects.get(pk=generator.choice(advertisement_ids)),
+            checkin_date=checkin_date, checkout_date=checkin_date + datetime.timedelta(days=3),
+            total_cost='100.00', comment='Benchmark', guests=1)
+        try:
+            reservation.clean()
+        except ValidationError:
+            pass
+
+    return {
+        'property_list': lambda generator: get('/properties/'),
+        'property_filter': lambda generator: get('/properties/?guest_vacancies={}'.format(generator.randint(1, 8))),
+        'property_retrieve': lambda generator: get('/properties/{}/'.format(generator.choice(property_ids))),
+        'property_available': lambda generator: get(
+            '/properties/available/?checkin={0}&checkout={0}&guests=2&page_size=20'.format(random_night(generator))),
+        'property_calendar': lambda generator: get('/properties/{}/calendar/?from={}&to={}'.format(
+            generator.choice(property_ids), FIRST_NIGHT, FIRST_NIGHT + datetime.timedelta(days=DAYS - 1))),
+        'advertisement_list_expand': lambda generator: get('/advertisements/?expand=property'),
+        'advertisement_filter': lambda generator: get('/advertisements/?platform=Vrbo'),
+        'reservation_list': lambda generator: get('/reservations/?expand=advertisement.property'),
+        'reservation_filter': lambda generator: get('/reservations/?checkin_date={}'.format(random_night(generator))),
+        'reservation_create': reserve,
+        'reservation_clean': clean,
+    }
+
+
+# Time one scenario, returning its median and 95th percentile durations in milliseconds and its average number
+# of queries.
+def measure(operation, repetitions, seed):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    generator = random.Random(seed)
+    durations = []
+    queries = 0
+    for _ in range(repetitions):
+        cache.clear()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            operation(generator)
+            durations.append((time.perf_counter() - start) * 1000)
+        queries += len(context.captured_queries)
+    durations.sort()
+    return {
+        'median_ms': round(durations[len(durations) // 2], 3),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+        'queries': round(queries / repetitions, 2),
+    }
+
+
+def environment(connection):
+    import django
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit or None,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('100,1000'),
+        help='comma separated numbers of properties (e.g. 100,1000,10000)')
+    parser.add_argument('--repetitions', type=int, default=30, help='operations timed per scenario and size')
+    parser.add_argument('--scenarios', help='comma separated scenarios to run (all by default)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file the JSON results are written to (standard output by default)')
+    arguments = parser.parse_args()
+
+    connection = setup_database()
+    try:
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from rest_framework.test import APIClient
+        from khanto.models import Property, Advertisement
+
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(username='benchmark', password='benchmark'))
+        report = {'environment': environment(connection), 'results': []}
+
+        current = 0
+        for size in sorted(arguments.sizes):
+            start = time.perf_counter()
+            call_command('generate_data', properties=size - current, advertisements=2, occupancy=0.6,
+                start=FIRST_NIGHT, days=DAYS, seed=arguments.seed + size, stdout=StringIO())
+            current = size
+            print('Generated {} properties in {:.1f}s'.format(size, time.perf_counter() - start), file=sys.stderr)
+
+            property_ids = list(Property.objects.values_list('id', flat=True))
+            advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+            selected = scenarios(client, property_ids, advertisement_ids)
+            if arguments.scenarios:
+                selected = {name: selected[name] for name in arguments.scenarios.split(',')}
+            for name, operation in selected.items():
+                result = measure(operation, arguments.repetitions, arguments.seed)
+                report['results'].append({'scenario': name, 'properties': size, **result})
+                print('{:>8} {:<28} {:>10.3f} ms'.format(size, name, result['median_ms']), file=sys.stderr)
+
+        output = json.dumps(report, indent=2)
+        if arguments.output:
+            with open(arguments.output, 'w') as file:
+                file.write(output + '\n')
+        else:
+            print(output)
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import datetime
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+
+from common import setup_database, teardown_database
+
+"""
+Stress test for concurrent reservation writes: several threads or processes create reservations for a handful
+of properties with few vacancies at the same time, all through Reservation.save() (the path used by
+POST /reservations/), and edit and delete random reservations (the paths used by PUT, PATCH and DELETE
+/reservations/<id>/), so that the same reservation is sometimes written by several workers at once. It reports
+the throughput and then proves that no property is ever booked over its guest capacity and that the occupancy
+ledger didn't drift.
+
+Row locks only take effect on databases that support them (such as PostgreSQL), so run it with
+DATABASE_ENGINE=postgresql against a local PostgreSQL instance to exercise them; SQLite serializes every write transaction instead
+and reports the writes it refused as errors.
+"""
+
+FIRST_NIGHT = datetime.date(2030, 1, 1)
+
+
+# Create reservations for random properties and stays, or edit or delete (a share `edits` of the attempts) random
+# reservations, returning the number accepted, rejected and failed.
+def book(advertisement_ids, attempts, window, edits, seed):
+    from django.core.exceptions import ValidationError
+    from django.db import DatabaseError, connection
+    from khanto.models import Reservation
+
+    generator = random.Random(seed)
+    outcome = Counter()
+    for _ in range(attempts):
+        checkin_date = FIRST_NIGHT + datetime.timedelta(days=generator.randrange(window))
+        if generator.random() < edits:
+            reservation = Reservation.objects.order_by('?').first()
+            if reservation is None:
+                continue
+            try:
+                if generator.random() < 0.5:
+                    reservation.delete()
+                    outcome['deleted'] += 1
+                    continue
+                reservation.checkin_date = checkin_date
+                reservation.checkout_date = checkin_date + datetime.timedelta(days=generator.randint(1, 4))
+                reservation.save()
+                outcome['edited'] += 1
+            except ValidationError:
+                outcome['rejected'] += 1
+            except DatabaseError:
+                outcome['errors'] += 1
+            continue
+        reservation = Reservation(
+            advertisement_id=generator.choice(advertisement_ids),
+            checkin_date=checkin_date,
+            checkout_date=checkin_date + datetime.timedelta(days=generator.randint(1, 4)),
+            total_cost=Decimal('100.00'),
+            comment='Stress test',
+            guests=generator.randint(1, 3))
+        try:
+            reservation.save()
+            outcome['accepted'] += 1
+        except ValidationError:
+            outcome['rejected'] += 1
+        except DatabaseError:
+            outcome['errors'] += 1
+    connection.close()
+    return outcome
+
+
+# Entry point of the worker processes, which inherit the test database settings when forked.
+def book_in_process(arguments):
+    return book(*arguments)
+
+
+def run(mode, workers, advertisement_ids, attempts, window, edits):
+    from django.db import connections
+
+    jobs = [(advertisement_ids, attempts, window, edits, seed) for seed in range(workers)]
+    start = time.perf_counter()
+    if mode == 'threads':
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(lambda job: book(*job), jobs))
+    else:
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            outcomes = pool.map(book_in_process, jobs)
+    duration = time.perf_counter() - start
+    return sum(outcomes, Counter()), duration
+
+
+# Add up the guests per property and night straight from the reservations and count the overbooked nights.
+def overbooked_nights():
+    from khanto.models import Property, Reservation, stay_nights
+
+    vacancies = dict(Property.objects.values_list('id', 'guest_vacancies'))
+    occupancy = Counter()
+    for property_id, checkin_date, checkout_date, guests in Reservation.objects.values_list(
+            'advertisement__property_id', 'checkin_date', 'checkout_date', 'guests'):
+        for night in stay_nights(checkin_date, checkout_date):
+            occupancy[(property_id, night)] += guests
+    return sum(1 for (property_id, night), guests in occupancy.items() if guests > vacancies[property_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', choices=['threads', 'processes', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=100, help='reservations attempted per worker')
+    parser.add_argument('--properties', type=int, default=10)
+    parser.add_argument('--vacancies', type=int, default=4)
+    parser.add_argument('--window', type=int, default=30, help='number of nights check-in dates are drawn from')
+    parser.add_argument('--edits', type=float, default=0.3, help='share of the attempts editing or deleting')
+    arguments = parser.parse_args()
+
+    connection = setup_database(shared=True)
+    try:
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from khanto.models import Property, Advertisement, Reservation
+
+        print('database: {}'.format(connection.vendor))
+        print('mode,workers,attempts,accepted,edited,deleted,rejected,errors,seconds,attempts_per_second,'
+            'overbooked_nights,ledger')
+        modes = ['threads', 'processes'] if arguments.mode == 'both' else [arguments.mode]
+        for mode in modes:
+
+            # Start each mode from an empty set of properties so their results are comparable.
+            Reservation.objects.all().delete()
+            Property.objects.all().delete()
+            for code in range(1, arguments.properties + 1):
+                reserved_property = Property.objects.create(code=code, guest_vacancies=arguments.vacancies,
+                    bathrooms=1, pets_allowed=True, cleaning_cost=Decimal('10.00'))
+                Advertisement.objects.create(property=reserved_property, platform='Stress',
+                    platform_tax=Decimal('10.00'))
+            advertisement_ids = list(Advertisement.objects.values_list('id', flat=True))
+
+            outcome, duration = run(mode, arguments.workers, advertisement_ids, arguments.attempts,
+                arguments.window, arguments.edits)
+            try:
+                call_command('rebuild_occupancy', check=True, stdout=StringIO())
+                ledger = 'consistent'
+            except CommandError:
+                ledger = 'drifted'
+
+            attempts = arguments.workers * arguments.attempts
+            print('{},{},{},{},{},{},{},{},{:.2f},{:.1f},{},{}'.format(mode, arguments.workers, attempts,
+                outcome['accepted'], outcome['edited'], outcome['deleted'], outcome['rejected'], outcome['errors'],
+                duration, attempts / duration, overbooked_nights(), ledger))
+    finally:
+        teardown_database(connection)
+
+
+if __name__ == '__main__':
+    main()
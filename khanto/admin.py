@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Property, Advertisement, Reservation
+from .models import Property, Advertisement, NightlyRate, Reservation, Task
 
 admin.site.register(Property)
 admin.site.register(Advertisement)
+admin.site.register(NightlyRate)
 admin.site.register(Reservation)
+admin.site.register(Task)
@@ -0,0 +1,138 @@
+from django.db.models import Count, DecimalField, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncMonth
+from .models import Property, ReservationRecord, ReservationRollup, PropertyNightOccupancy
+import calendar
+import datetime
+
+"""
+This file currently provides the revenue and occupancy figures served by the analytics endpoints
+(GET /analytics/revenue/, /analytics/occupancy/ and /analytics/stays/). Every figure is aggregated by the database
+over the requested time frame, properties and platforms, in one query (two for the occupancy), so no reservation
+is ever loaded:
+- revenue: number of reservations, total cost, platform taxes (a flat fee per reservation) and net revenue, per
+  property, platform or advertisement, attributed to the month of the check-in date;
+- occupancy: per month, the guests checked-in on each night added up across the nights (as in the occupancy
+  ledger), over the guest vacancies of the properties times the nights of the month;
+- stays: number of reservations and average length of the stays, in nights after the check-in date.
+Archived reservations count too (see khanto/archive.py).
+
+When the ANALYTICS_ROLLUP setting is on, the totals of each advertisement and month are kept up to date by every
+reservation write (see ReservationRollup in khanto/models.py), and the figures are read from them instead when
+the time frame is made of whole months, which is the default. Queries then read one row per advertisement and
+month instead of one per reservation (or per property and night for the occupancy).
+"""
+
+# Values each figure can be grouped by, and the lookups they are read from.
+GROUPS = {
+    'property': {'property': 'advertisement__property'},
+    'platform': {'platform': 'advertisement__platform'},
+    'advertisement': {
+        'advertisement': 'advertisement',
+        'property': 'advertisement__property',
+        'platform': 'advertisement__platform',
+    },
+}
+
+def grouped(queryset, by):
+    lookups = GROUPS[by]
+    return queryset.values(*[name for name, lookup in lookups.items() if name == lookup],
+        **{name: F(lookup) for name, lookup in lookups.items() if name != lookup})
+
+def month_start(day):
+    return day.replace(day=1)
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+def add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+# Whether the figures of the time frame can be read from the rollup.
+def use_rollup(first_day, last_day):
+    return ReservationRollup.objects.enabled() and first_day == month_start(first_day) \
+        and last_day == month_end(last_day)
+
+def filtered(queryset, properties=None, platforms=None):
+    if properties:
+        queryset = queryset.filter(advertisement__property__in=properties)
+    if platforms:
+        queryset = queryset.filter(advertisement__platform__in=platforms)
+    return queryset
+
+def revenue(first_day, last_day, properties=None, platforms=None, by='property'):
+    if use_rollup(first_day, last_day):
+        source = 'rollup'
+        rows = grouped(filtered(ReservationRollup.objects, properties, platforms).filter(
+            month__range=(first_day, last_day), reservations__gt=0), by).annotate(
+
+            # Annotated first, so that "reservations" still refers to the field of each row.
+            platform_taxes=Sum(ExpressionWrapper(F('reservations') * F('advertisement__platform_tax'),
+                output_field=DecimalField(max_digits=17, decimal_places=2))),
+            reservations=Sum('reservations'),
+            revenue=Sum('revenue'))
+    else:
+        source = 'reservations'
+        rows = grouped(filtered(ReservationRecord.objects, properties, platforms).filter(
+            checkin_date__range=(first_day, last_day)), by).annotate(
+            reservations=Count('id'),
+            revenue=Sum('total_cost'),
+            platform_taxes=Sum('advertisement__platform_tax'))
+    results = list(rows.order_by(*GROUPS[by]))
+    for row in results:
+        row['net_revenue'] = row['revenue'] - row['platform_taxes']
+    return source, results
+
+def occupancy(first_day, last_day, properties=None):
+    if use_rollup(first_day, last_day):
+        source = 'rollup'
+        rows = filtered(ReservationRollup.objects, properties).filter(
+            month__range=(first_day, last_day)).values('month').annotate(guest_nights=Sum('guest_nights'))
+    else:
+        source = 'reservations'
+        ledger = PropertyNightOccupancy.objects.filter(night__range=(first_day, last_day))
+        if properties:
+            ledger = ledger.filter(property__in=properties)
+        rows = ledger.annotate(month=TruncMonth('night')).values('month').annotate(guest_nights=Sum('guests'))
+    guest_nights = {row['month']: row['guest_nights'] for row in rows.order_by()}
+
+    # Every night of the time frame can host the guest vacancies of all the properties.
+    vacancies = Property.objects.all()
+    if properties:
+        vacancies = vacancies.filter(pk__in=properties)
+    vacancies = vacancies.aggregate(total=Sum('guest_vacancies'))['total'] or 0
+
+    results = []
+    month = month_start(first_day)
+    while month <= last_day:
+        nights = (min(month_end(month), last_day) - max(month, first_day)).days + 1
+        capacity = vacancies * nights
+        occupied = guest_nights.get(month, 0)
+        results.append({
+            'month': month.strftime('%Y-%m'),
+            'guest_nights': occupied,
+            'capacity': capacity,
+            'occupancy_rate': round(occupied / capacity, 4) if capacity else 0,
+        })
+        month = add_months(month, 1)
+    return source, results
+
+def stays(first_day, last_day, properties=None, platforms=None, by='property'):
+    if use_rollup(first_day, last_day):
+        source = 'rollup'
+        rows = grouped(filtered(ReservationRollup.objects, properties, platforms).filter(
+            month__range=(first_day, last_day), reservations__gt=0), by).annotate(
+            reservations=Sum('reservations'),
+            nights=Sum('stay_nights'))
+    else:
+        source = 'reservations'
+        rows = grouped(filtered(ReservationRecord.objects, properties, platforms).filter(
+            checkin_date__range=(first_day, last_day)), by).annotate(
+            reservations=Count('id'),
+            nights=Sum(ExpressionWrapper(F('checkout_date') - F('checkin_date'), output_field=DurationField())))
+    results = list(rows.order_by(*GROUPS[by]))
+    for row in results:
+        if isinstance(row['nights'], datetime.timedelta):
+            row['nights'] = row['nights'].days
+        row['average_stay'] = round(row['nights'] / row['reservations'], 2)
+    return source, results
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+"""
+This file currently provides the configuration of the khanto application, which connects its signal receivers.
+"""
+
+class KhantoConfig(AppConfig):
+    name = 'khanto'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework import permissions, serializers
+from .models import ArchivedReservation, Reservation, lock_properties
+import datetime
+
+"""
+This file currently provides the archive of past reservations, which `python3 manage.py archive_reservations`
+moves out of the Reservation table once their check-out date is older than RESERVATION_ARCHIVE_DAYS, so that the
+table read by reservation writes, filters and lists only holds the stays that still matter. Archived reservations
+are rows of the ArchivedReservation table, with the same IDs and codes:
+- they are read-only, and only listed, retrieved and exported by the reservation endpoints with
+  `?include_archived=true`, which read the ReservationRecord view joining both tables instead;
+- codes stay unique across both tables: generated codes never repeat, and the codes sent by clients are checked
+  against the archive too (see Reservation.validate_unique(), ReservationSerializer and khanto/bulk.py);
+- archiving isn't a change of the reservations: the occupancy ledger, the analytics rollup and the change feed
+  keep counting them, and the analytics, the ledger rebuild and the availability index read the ReservationRecord
+  view, so the indexes held by the server processes don't need to be loaded again.
+"""
+
+# Fields copied from each reservation to its archived row.
+FIELDS = ['id', 'advertisement_id', 'code', 'checkin_date', 'checkout_date', 'total_cost', 'comment', 'guests',
+    'creation_date', 'update_date']
+
+# First check-out date kept in the Reservation table when archiving the reservations older than `days` days.
+def horizon(days=None):
+    if days is None:
+        days = getattr(settings, 'RESERVATION_ARCHIVE_DAYS', 365)
+    return datetime.date.today() - datetime.timedelta(days=days)
+
+# Move the reservations whose check-out date is earlier than `before` to the archive, one transaction per batch
+# of `batch_size` reservations, and return the number of reservations moved.
+def archive_reservations(before, batch_size=5000):
+    archived = 0
+    while True:
+        with transaction.atomic():
+            reservations = Reservation.objects.filter(checkout_date__lt=before).order_by('id')
+            property_ids = set(reservations.values_list('advertisement__property_id', flat=True)[:batch_size])
+            if not property_ids:
+                break
+
+            # Lock the properties of the batch, like reservation writes do (see lock_properties()), and read the
+            # batch again once they are locked: reservations edited or deleted in between are copied as they are
+            # stored, and those moved to another property are left to a later batch.
+            lock_properties(*property_ids)
+            rows = list(reservations.select_for_update(of=('self',)).filter(
+                advertisement__property_id__in=property_ids).values(*FIELDS)[:batch_size])
+            if not rows:
+                continue
+            ArchivedReservation.objects.bulk_create([ArchivedReservation(**row) for row in rows])
+
+            # Deleted with a plain DELETE rather than Reservation.delete() or QuerySet.delete(), which send the
+            # deletion signals: those would release the nights of the stays from the ledger and log them as deleted
+            # in the change feed, while archived reservations still count. Only the rows just copied to the archive
+            # are deleted.
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM {reservation} WHERE id IN (SELECT id FROM {archive} WHERE id BETWEEN %s '
+                    'AND %s)'.format(reservation=connection.ops.quote_name(Reservation._meta.db_table),
+                    archive=connection.ops.quote_name(ArchivedReservation._meta.db_table)),
+                    [rows[0]['id'], rows[-1]['id']])
+        archived += len(rows)
+    return archived
+
+# Whether the request asks for the archived reservations too, with `?include_archived=true`.
+def include_archived(request):
+    value = request.query_params.get('include_archived')
+    if value is None:
+        return False
+    try:
+        return serializers.BooleanField().to_internal_value(value)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'include_archived': error.detail})
+
+class ArchiveViewSetMixin:
+
+    # Queryset of the live and archived instances, read instead of the viewset's queryset by the GET requests sent
+    # with `?include_archived=true`.
+    archive_queryset = None
+
+    def get_queryset(self):
+        if self.request.method in permissions.SAFE_METHODS and include_archived(self.request):
+            return self.archive_queryset.all()
+        return super().get_queryset()
@@ -3,6 +3,8 @@ ASGI config for khanto project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The hot read endpoints are served by async views here (see khanto/async_urls.py), unlike the WSGI deployment.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -12,5 +14,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'khanto.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'khanto.async_urls')
 
 application = get_asgi_application()
+
+# Load the availability index before the first request, when enabled (see khanto/availability_index.py).
+from khanto.availability_index import warm
+warm()
@@ -0,0 +1,17 @@
+"""khanto URL Configuration for the ASGI deployment
+
+Routes the hot read endpoints and the change feed to their async views (see khanto/async_views.py), which hand any
+other method to the synchronous viewsets, and every other URL to the same views as khanto/urls.py.
+"""
+from django.urls import re_path
+from khanto import async_views, urls
+
+# Same lookup format and names as the router's, e.g. /properties/1/ and property-detail.
+urlpatterns = [
+    re_path(r'^properties/available/$', async_views.property_available, name='property-available'),
+    re_path(r'^properties/(?P<pk>[^/.]+)/$', async_views.property_detail, name='property-detail'),
+    re_path(r'^properties/(?P<pk>[^/.]+)/calendar/$', async_views.property_calendar,
+        name='property-calendar'),
+    re_path(r'^reservations/$', async_views.reservation_list, name='reservation-list'),
+    re_path(r'^changes/$', async_views.change_list, name='change-list'),
+] + urls.urlpatterns
@@ -0,0 +1,158 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from rest_framework.response import Response
+from . import changes
+from .availability import aproperty_calendar, calendar_headers
+from .views import ChangesViewSet, PropertiesViewSet, ReservationsViewSet
+import asyncio
+
+"""
+This file currently provides async versions of the hot read endpoints, served by the ASGI deployment (see
+khanto/asgi.py and khanto/async_urls.py):
+- GET /properties/{id}/
+- GET /properties/available/
+- GET /properties/{id}/calendar/
+- GET /reservations/
+- GET /changes/, which may also wait for changes (see change_feed())
+
+Each endpoint runs the same viewset as the synchronous API, so authentication, permissions, filters, pagination,
+caching and serialization (including the fast path of lists, see khanto/fastpath.py) behave the same and
+responses are byte for byte identical. Only the queries fetching the data go through Django's async ORM (`aget()`,
+`async for`) instead of holding a thread for the whole request: the viewset's synchronous checks (authentication
+reads the session, filters may validate related IDs) run in a single thread hop first. Other methods, and the
+browsable API, are handed to the synchronous viewset.
+"""
+
+# Build an async view answering GET requests with the `read` coroutine, given the viewset's method to action
+# mapping and initkwargs as registered by the router.
+def async_read_view(viewset_class, actions, read, **initkwargs):
+    fallback = viewset_class.as_view(actions, **initkwargs)
+    fallback_async = sync_to_async(fallback)
+
+    async def view(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await fallback_async(request, *args, **kwargs)
+
+        viewset = viewset_class(action_map=actions, **initkwargs)
+        viewset.args, viewset.kwargs = args, kwargs
+        drf_request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.request = drf_request
+        viewset.headers = viewset.default_response_headers
+        try:
+            queryset = await sync_to_async(prepare)(viewset, drf_request)
+            if drf_request.accepted_renderer.format == 'api':
+                viewset.release_admission()
+                return await fallback_async(request, *args, **kwargs)
+            if getattr(viewset, 'cached_response', None) is not None:
+                response = viewset.cached_content()
+            else:
+                response = await read(viewset, drf_request, queryset)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return rendered(viewset.finalize_response(drf_request, response, *args, **kwargs))
+
+    view.csrf_exempt = True
+    return view
+
+# Run the viewset's synchronous checks and return its filtered queryset (None for viewsets without one).
+def prepare(viewset, request):
+    viewset.initial(request)
+    if viewset.action == 'available':
+        return viewset.available_queryset(request)
+    if not hasattr(viewset, 'get_queryset'):
+        return None
+    return viewset.filter_queryset(viewset.get_queryset())
+
+# Render the response here, so that the handler doesn't render it in a thread. Its headers and cookies are copied
+# to a plain response, which the handler sends as it is.
+def rendered(response):
+    if not hasattr(response, 'render'):
+        return response
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    plain.cookies = response.cookies
+    return plain
+
+# Same as GenericAPIView.get_object().
+async def aget_object(viewset, queryset):
+    lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+    try:
+        instance = await queryset.aget(**{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]})
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404('No {} matches the given query.'.format(queryset.model._meta.object_name))
+    viewset.check_object_permissions(viewset.request, instance)
+    return instance
+
+async def retrieve(viewset, request, queryset):
+    instance = await aget_object(viewset, queryset)
+    return Response(viewset.get_serializer(instance).data)
+
+async def paginated_list(viewset, request, queryset):
+    row_serializer = viewset.fast_row_serializer(request)
+    if row_serializer is not None:
+        page = await viewset.paginator.apaginate_queryset(row_serializer.rows(queryset), request, view=viewset)
+        return viewset.fast_response(row_serializer, page)
+    page = await viewset.paginator.apaginate_queryset(queryset, request, view=viewset)
+    return viewset.get_paginated_response(viewset.get_serializer(page, many=True).data)
+
+async def calendar(viewset, request, queryset):
+    reserved_property = await aget_object(viewset, queryset)
+    first_night, last_night = viewset.calendar_time_frame(request)
+    headers = calendar_headers(reserved_property, first_night, last_night, request.accepted_renderer.format)
+    not_modified = viewset.calendar_not_modified(request, reserved_property, headers)
+    if not_modified is not None:
+        return not_modified
+    return Response(await aproperty_calendar(reserved_property, first_night, last_night), headers=headers)
+
+# Answer the change feed (see khanto/changes.py). JSON requests with `?wait=<seconds>` are answered as soon as
+# there are changes after the cursor, or with an empty page once that time is up (long polling), and event streams
+# stay open, sending each page of changes as an event, for up to CHANGE_FEED_STREAM_TIMEOUT seconds. The feed is
+# checked every CHANGE_FEED_POLL_INTERVAL seconds, without holding a thread in between.
+async def change_feed(viewset, request, queryset):
+    query = await sync_to_async(viewset.feed_query)(request)
+    if request.accepted_renderer.format == 'event-stream':
+        response = StreamingHttpResponse(event_stream(query), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    return Response(await wait_for_changes(query['since'], query, query['wait']))
+
+# Return the first page of changes after the cursor, or the empty page read once `timeout` seconds are up.
+async def wait_for_changes(since, query, timeout):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        page = await sync_to_async(changes.read)(since, query['limit'], query.get('model'))
+        remaining = deadline - loop.time()
+        if page['changes'] or page['has_more'] or remaining <= 0:
+            return page
+        since = page['next']
+        await asyncio.sleep(min(getattr(settings, 'CHANGE_FEED_POLL_INTERVAL', 1), remaining))
+
+# Send the pages of changes as they are made, and a comment after 15 seconds without any so that proxies keep the
+# connection open.
+async def event_stream(query):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'CHANGE_FEED_STREAM_TIMEOUT', 300)
+    since = query['since']
+    while loop.time() < deadline:
+        page = await wait_for_changes(since, query, min(15, deadline - loop.time()))
+        if page['changes']:
+            yield changes.event(page)
+        elif not page['has_more']:
+            yield b': keepalive\n\n'
+        since = page['next']
+
+property_detail = async_read_view(PropertiesViewSet, {'get': 'retrieve', 'put': 'update', 'delete': 'destroy'},
+    retrieve, basename='property', detail=True)
+property_available = async_read_view(PropertiesViewSet, {'get': 'available'}, paginated_list,
+    basename='property', detail=False)
+property_calendar = async_read_view(PropertiesViewSet, {'get': 'calendar'}, calendar,
+    basename='property', detail=True)
+reservation_list = async_read_view(ReservationsViewSet, {'get': 'list', 'post': 'create'}, paginated_list,
+    basename='reservation', detail=False)
+change_list = async_read_view(ChangesViewSet, {'get': 'list'}, change_feed, basename='change', detail=False)
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, quote_etag
+import hashlib
+from .models import PropertyNightOccupancy, stay_nights
+
+"""
+This file currently provides the availability calendar of a property (GET /properties/{id}/calendar/), the
+number of vacancies left on each night of a time frame.
+
+Calendars are read from the occupancy ledger and cached. A property's calendar only changes when one of its
+reservations is created or deleted, or when the property itself is edited, which is tracked by the property's
+`reservations_update_date` and `update_date`. Those dates are part of the cache key, so a cached calendar is
+never served after such a change, and they also provide the ETag and Last-Modified headers, so clients and CDNs
+can revalidate a calendar without it being computed again.
+"""
+
+# Date and time the property's calendar last changed.
+def last_modified(reserved_property):
+    if reserved_property.reservations_update_date is None:
+        return reserved_property.update_date
+    return max(reserved_property.update_date, reserved_property.reservations_update_date)
+
+# Identifies one version of a calendar, in one rendered format.
+def calendar_version(reserved_property, first_night, last_night, rendered_format):
+    return '{}:{}:{}:{}:{}:{}'.format(reserved_property.id, first_night, last_night, rendered_format,
+        reserved_property.update_date.isoformat(),
+        reserved_property.reservations_update_date.isoformat()
+            if reserved_property.reservations_update_date is not None else '')
+
+def calendar_etag(reserved_property, first_night, last_night, rendered_format):
+    version = calendar_version(reserved_property, first_night, last_night, rendered_format)
+    return quote_etag(hashlib.sha1(version.encode()).hexdigest())
+
+# Caching headers of a calendar: clients and CDNs may store it, but must revalidate it before every use.
+def calendar_headers(reserved_property, first_night, last_night, rendered_format):
+    return {
+        'ETag': calendar_etag(reserved_property, first_night, last_night, rendered_format),
+        'Last-Modified': http_date(last_modified(reserved_property).timestamp()),
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept',
+    }
+
+# Return the remaining vacancies of the property on each night from `first_night` to `last_night`.
+def property_calendar(reserved_property, first_night, last_night):
+    key = calendar_key(reserved_property, first_night, last_night)
+    calendar = cache.get(key)
+    if calendar is None:
+        occupied = PropertyNightOccupancy.objects.for_stay(reserved_property.id, first_night, last_night)
+        calendar = build_calendar(reserved_property, first_night, last_night, occupied)
+        cache.set(key, calendar, getattr(settings, 'CALENDAR_CACHE_TIMEOUT', 3600))
+    return calendar
+
+# Same as property_calendar(), with the async cache and ORM interfaces (see khanto/async_views.py).
+async def aproperty_calendar(reserved_property, first_night, last_night):
+    key = calendar_key(reserved_property, first_night, last_night)
+    calendar = await cache.aget(key)
+    if calendar is None:
+        occupied = await PropertyNightOccupancy.objects.afor_stay(reserved_property.id, first_night, last_night)
+        calendar = build_calendar(reserved_property, first_night, last_night, occupied)
+        await cache.aset(key, calendar, getattr(settings, 'CALENDAR_CACHE_TIMEOUT', 3600))
+    return calendar
+
+def calendar_key(reserved_property, first_night, last_night):
+    return 'calendar:' + calendar_version(reserved_property, first_night, last_night, '')
+
+def build_calendar(reserved_property, first_night, last_night, occupied):
+    return {
+        'property': reserved_property.id,
+        'from': first_night.isoformat(),
+        'to': last_night.isoformat(),
+        'nights': [{
+            'date': night.isoformat(),
+            'vacancies': max(reserved_property.guest_vacancies - occupied.get(night, 0), 0),
+        } for night in stay_nights(first_night, last_night)],
+    }
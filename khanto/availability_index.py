@@ -0,0 +1,299 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from itertools import accumulate
+import logging
+import threading
+import time
+
+"""
+This file currently provides the optional in-process availability index (AVAILABILITY_INDEX setting), which
+answers the availability search (GET /properties/available/) from memory instead of the occupancy ledger. The
+vacancy checks of Reservation.clean() keep reading the ledger, which is the only one to see every process' writes.
+
+Each property's reservations are kept as a sorted array of the days on which its number of guests changes, with
+the change and the resulting number of guests (its prefix sum) on that day, in compact `array` storage (about 48
+bytes per reservation). The largest number of guests over a stay is found by bisecting to its first night and
+scanning the changes up to its last night, which takes microseconds.
+
+The index is loaded from the database by the first request (or at startup, see warm()) and kept current by the
+reservation signals (see khanto/signals.py) and the bulk import. New stays are added straight away, within the
+transaction that creates them, while stays are only removed once their deletion is committed: until then both
+count, so the index may report too many guests but never too few. Only a transaction rolled back after creating a
+reservation leaves a stay behind, which verify() repairs along with any other drift from the database.
+
+The index lives in each server process and only sees the writes of its own process, so with several server
+processes writing reservations the search may list properties booked by another process until the next verify().
+Such reservations are still rejected by Reservation.clean().
+"""
+
+logger = logging.getLogger(__name__)
+
+# Reservations of a property: the days (as ordinals) on which its number of guests changes, the change on each of
+# those days, and the number of guests from each of those days on.
+class PropertyStays:
+    __slots__ = ('days', 'deltas', 'levels')
+
+    def __init__(self, days=(), deltas=()):
+        self.days = array('l', days)
+        self.deltas = array('l', deltas)
+        self.levels = array('l', accumulate(self.deltas))
+
+    # Build the reservations of a property from (first night, last night, guests) stays, nights as ordinals.
+    @classmethod
+    def from_stays(cls, stays):
+        deltas = defaultdict(int)
+        for first, last, guests in stays:
+            deltas[first] += guests
+            deltas[last + 1] -= guests
+        days = sorted(day for day, delta in deltas.items() if delta)
+        return cls(days, (deltas[day] for day in days))
+
+    def __eq__(self, other):
+        return isinstance(other, PropertyStays) and self.days == other.days and self.deltas == other.deltas
+
+    def __bool__(self):
+        return bool(self.days)
+
+    # Add the guests of a stay to every night from `first` to `last` (both included), or remove them when negative.
+    def add(self, first, last, guests):
+        self.change(first, guests)
+        self.change(last + 1, -guests)
+
+    def change(self, day, delta):
+        position = bisect_left(self.days, day)
+        if position < len(self.days) and self.days[position] == day:
+            self.deltas[position] += delta
+            if not self.deltas[position]:
+                del self.days[position]
+                del self.deltas[position]
+                del self.levels[position]
+        else:
+            self.days.insert(position, day)
+            self.deltas.insert(position, delta)
+            self.levels.insert(position, 0)
+
+        # Only the prefix sums from the changed day on move.
+        level = self.levels[position - 1] if position else 0
+        self.levels[position:] = array('l', accumulate(self.deltas[position:], initial=level))[1:]
+
+    # Largest number of guests on any night from `first` to `last` (both included).
+    def peak(self, first, last):
+        if first > last:
+            return 0
+        start = bisect_right(self.days, first) - 1
+        end = bisect_right(self.days, last)
+        level = self.levels[start] if start >= 0 else 0
+        if end > start + 1:
+            level = max(level, max(self.levels[start + 1:end]))
+        return level
+
+    def nbytes(self):
+        return sum(values.buffer_info()[1] * values.itemsize for values in (self.days, self.deltas, self.levels))
+
+class AvailabilityIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+        # {property ID: PropertyStays} of the properties with reservations, None until loaded.
+        self.properties = None
+
+        # {property ID: guest vacancies} of every property.
+        self.capacities = {}
+
+        # Number of changes made to each property, and the properties found drifting by the last verify() along
+        # with their number of changes then.
+        self.versions = defaultdict(int)
+        self.suspects = {}
+
+    def enabled(self):
+        return getattr(settings, 'AVAILABILITY_INDEX', False)
+
+    def loaded(self):
+        return self.properties is not None
+
+    # Read every reservation, archived ones included like in the occupancy ledger (see khanto/archive.py), and
+    # every property from the database.
+    def read(self):
+        from .models import Property, ReservationRecord
+        stays = defaultdict(list)
+        for property_id, checkin_date, checkout_date, guests in ReservationRecord.objects.values_list(
+                'advertisement__property_id', 'checkin_date', 'checkout_date', 'guests').iterator(chunk_size=10000):
+            stays[property_id].append((checkin_date.toordinal(), checkout_date.toordinal(), guests))
+        properties = {property_id: PropertyStays.from_stays(property_stays)
+            for property_id, property_stays in stays.items()}
+        return {property_id: stays for property_id, stays in properties.items() if stays}, \
+            dict(Property.objects.values_list('id', 'guest_vacancies'))
+
+    def load(self):
+        properties, capacities = self.read()
+        with self.lock:
+            self.properties, self.capacities = properties, capacities
+            self.versions.clear()
+            self.suspects.clear()
+
+    def ensure_loaded(self):
+        if self.properties is None:
+            with self.lock:
+                if self.properties is None:
+                    self.load()
+
+    # Forget everything, so that the index is loaded again by its next use.
+    def reset(self):
+        with self.lock:
+            self.properties = None
+            self.capacities = {}
+            self.versions.clear()
+            self.suspects.clear()
+
+    # Add the guests of a stay to its property, or remove them when `guests` is negative. Changes made before the
+    # index is loaded are ignored, as loading reads them from the database.
+    def add_stay(self, property_id, checkin_date, checkout_date, guests):
+        with self.lock:
+            if self.properties is None:
+                return
+            stays = self.properties.get(property_id)
+            if stays is None:
+
+                # The property was deleted (see remove_property()) before the removal of its stays was committed.
+                if guests < 0:
+                    return
+                stays = self.properties[property_id] = PropertyStays()
+            stays.add(checkin_date.toordinal(), checkout_date.toordinal(), guests)
+            if not stays:
+                del self.properties[property_id]
+            self.versions[property_id] += 1
+
+    def add_stays(self, stays):
+        with self.lock:
+            for property_id, checkin_date, checkout_date, guests in stays:
+                self.add_stay(property_id, checkin_date, checkout_date, guests)
+
+    def remove_stay(self, property_id, checkin_date, checkout_date, guests):
+        self.add_stay(property_id, checkin_date, checkout_date, -guests)
+
+    def set_capacity(self, property_id, guest_vacancies):
+        with self.lock:
+            if self.properties is not None:
+                self.capacities[property_id] = guest_vacancies
+
+    def remove_property(self, property_id):
+        with self.lock:
+            if self.properties is not None:
+                self.properties.pop(property_id, None)
+                self.capacities.pop(property_id, None)
+                self.versions[property_id] += 1
+
+    # Largest number of guests of the property on any night from the first to the last one.
+    def peak(self, property_id, first_night, last_night):
+        self.ensure_loaded()
+        with self.lock:
+            stays = self.properties.get(property_id)
+            return stays.peak(first_night.toordinal(), last_night.toordinal()) if stays is not None else 0
+
+    # IDs of the properties whose remaining vacancies on some night from the check-in to the check-out date are
+    # fewer than `guests`.
+    def full_properties(self, checkin_date, checkout_date, guests):
+        self.ensure_loaded()
+        checkin, checkout = checkin_date.toordinal(), checkout_date.toordinal()
+        with self.lock:
+            return [property_id for property_id, stays in self.properties.items()
+                if stays.peak(checkin, checkout) > self.capacities.get(property_id, 0) - guests]
+
+    # Compare the index against the database and return the IDs of the properties that drifted. Properties changed
+    # while the database was read are skipped. A property that just drifted may have a reservation whose
+    # transaction isn't committed yet, so with `repair` a property is only read again from the database when it
+    # already drifted, without changing since, on the previous call.
+    def verify(self, repair=False):
+        self.ensure_loaded()
+        with self.lock:
+            versions = dict(self.versions)
+        properties, capacities = self.read()
+
+        with self.lock:
+            drifted = []
+            suspects = {}
+            for property_id in set(self.properties) | set(properties) | set(self.capacities) | set(capacities):
+                if self.versions[property_id] != versions.get(property_id, 0):
+                    continue
+                if self.properties.get(property_id) == properties.get(property_id) \
+                        and self.capacities.get(property_id) == capacities.get(property_id):
+                    continue
+                drifted.append(property_id)
+                suspects[property_id] = self.versions[property_id]
+                if repair and self.suspects.get(property_id) == self.versions[property_id]:
+                    self.replace(property_id, properties.get(property_id), capacities.get(property_id))
+                    del suspects[property_id]
+            self.suspects = suspects
+        return sorted(drifted)
+
+    def replace(self, property_id, stays, guest_vacancies):
+        if stays is None:
+            self.properties.pop(property_id, None)
+        else:
+            self.properties[property_id] = stays
+        if guest_vacancies is None:
+            self.capacities.pop(property_id, None)
+        else:
+            self.capacities[property_id] = guest_vacancies
+        self.versions[property_id] += 1
+
+    # Memory used by the arrays of the index, in bytes.
+    def nbytes(self):
+        with self.lock:
+            return sum(stays.nbytes() for stays in (self.properties or {}).values())
+
+index = AvailabilityIndex()
+
+def enabled():
+    return index.enabled()
+
+# Whether writes must be recorded in the index, which is only the case once it was loaded.
+def tracking():
+    return enabled() and index.loaded()
+
+# Load the index when the server starts, and verify it every AVAILABILITY_INDEX_VERIFY_INTERVAL seconds (when
+# set) from a background thread, repairing the properties that keep drifting.
+def warm():
+    if not enabled():
+        return
+    index.load()
+    interval = getattr(settings, 'AVAILABILITY_INDEX_VERIFY_INTERVAL', 0)
+    if interval:
+        threading.Thread(target=verify_periodically, args=(interval,), daemon=True).start()
+
+def verify_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            drifted = index.verify(repair=True)
+        except Exception:
+            logger.exception('The availability index could not be verified.')
+            continue
+        if drifted:
+            logger.warning('The availability index drifted from the database on properties %s.', drifted)
+
+# Record new stays straight away and the removal of old ones once committed (see the top of this file). Stays are
+# (property ID, check-in date, check-out date, guests) tuples.
+def stays_created(stays):
+    if tracking():
+        index.add_stays(stays)
+
+def stay_saved(stay, previous=None):
+    index.add_stay(*stay)
+    if previous is not None:
+        transaction.on_commit(lambda: index.remove_stay(*previous))
+
+def stay_deleted(stay):
+    transaction.on_commit(lambda: index.remove_stay(*stay))
+
+def property_saved(property_id, guest_vacancies):
+    if enabled():
+        index.set_capacity(property_id, guest_vacancies)
+
+def property_deleted(property_id):
+    if tracking():
+        transaction.on_commit(lambda: index.remove_property(property_id))
@@ -0,0 +1,186 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from . import availability_index, changes
+from .codes import reservation_codes
+from .quotes import checked_total_cost, price_stays, pricing_enabled
+from .models import Advertisement, ArchivedReservation, Reservation, ReservationRollup, PropertyNightOccupancy
+from .models import exclusive_property_id
+from .models import lock_properties
+from .models import stay_nights
+from .models import mark_reservations_changed
+from .serializers import ReservationImportSerializer
+
+"""
+This file currently provides the bulk import of reservations, used by POST /reservations/bulk/ and the
+"import_reservations" management command. Instead of validating and saving every reservation on its own, a
+batch is validated with a handful of set-based queries:
+- the advertisements of the whole batch are loaded at once, and the reservations are grouped by property;
+- when the RESERVATION_PRICING setting is on, the total costs are computed or checked by the quote engine for the
+  whole batch at once (see khanto/quotes.py);
+- the codes sent are checked for uniqueness for the whole batch at once;
+- the properties are locked and their occupied nights over the batch's time frame are read from the occupancy
+  ledger, then each reservation is checked (and added) against that in-memory occupancy in order;
+- the missing codes are reserved at once before the import's transaction, and the accepted reservations and their
+  ledger updates are written with bulk_create() and bulk_update(), then added to the availability index (see
+  khanto/availability_index.py) and logged in the change feed (see khanto/changes.py).
+
+Each item gets its own result, so a batch may be partially imported:
+{"index": 0, "status": "created", "id": 1, "code": 123456} or {"index": 1, "status": "error", "errors": {...}}
+"""
+
+INSUFFICIENT_VACANCIES = 'Insufficient vacancies for reservation.'
+
+def import_reservations(items):
+    results = [None] * len(items)
+    valid = []
+
+    # Validate every item's fields on their own, without touching the database. A single serializer validates
+    # every item so that its fields are only built once.
+    serializer = ReservationImportSerializer()
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except serializers.ValidationError as error:
+            results[index] = error_result(index, error.detail)
+
+    # Codes are reserved before the import's transaction, so that the code counter isn't held for the rest of the
+    # import (see khanto/codes.py). The codes of the items rejected later on are simply never used.
+    codes = reservation_codes.next_codes(sum(1 for index, data in valid if 'code' not in data))
+
+    batch_size = getattr(settings, 'BULK_IMPORT_BATCH_SIZE', 1000)
+    with transaction.atomic():
+        accepted = check_references(valid, results)
+        accepted = check_prices(accepted, results)
+        accepted = check_codes(accepted, results)
+        property_ids = {index: property_id for index, data, property_id in accepted}
+        accepted = check_vacancies(accepted, results)
+        generate_codes(accepted, codes)
+
+        reservations = Reservation.objects.bulk_create([Reservation(**data) for index, data in accepted],
+            batch_size=batch_size)
+        ReservationRollup.objects.record_later(reservations)
+        availability_index.stays_created((property_ids[index], data['checkin_date'], data['checkout_date'],
+            data['guests']) for index, data in accepted)
+        changes.record_many('reservation', [reservation.id for reservation in reservations], 'created')
+        for (index, data), reservation in zip(accepted, reservations):
+            results[index] = {'index': index, 'status': 'created', 'id': reservation.id, 'code': reservation.code}
+    return results
+
+def error_result(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+# Resolve the advertisements of every item with a single query, rejecting the items whose advertisement
+# doesn't exist. The accepted items get their advertisement ID and property ID filled in.
+def check_references(valid, results):
+    advertisement_ids = {data['advertisement'] for index, data in valid}
+    properties = dict(Advertisement.objects.filter(pk__in=advertisement_ids).values_list('id', 'property_id'))
+
+    accepted = []
+    for index, data in valid:
+        advertisement_id = data.pop('advertisement')
+        if advertisement_id not in properties:
+            results[index] = error_result(index, {'advertisement':
+                ['Invalid pk "{}" - object does not exist.'.format(advertisement_id)]})
+            continue
+        data['advertisement_id'] = advertisement_id
+        accepted.append((index, data, properties[advertisement_id]))
+    return accepted
+
+# Compute or check the total cost of every item with the quote engine, when enabled (see khanto/quotes.py).
+def check_prices(accepted, results):
+    if not pricing_enabled() or not accepted:
+        return accepted
+    advertisements = Advertisement.objects.select_related('property').in_bulk(
+        {data['advertisement_id'] for index, data, property_id in accepted})
+    prices = price_stays([(advertisements[data['advertisement_id']], data['checkin_date'], data['checkout_date'])
+        for index, data, property_id in accepted])
+
+    priced = []
+    for (index, data, property_id), price in zip(accepted, prices):
+        total_cost, errors = checked_total_cost(data.get('total_cost'), price)
+        if errors is not None:
+            results[index] = error_result(index, errors)
+            continue
+        data['total_cost'] = total_cost
+        priced.append((index, data, property_id))
+    return priced
+
+# Check the vacancies of every item against the ledger and the items accepted before it, then record the
+# accepted items in the ledger.
+def check_vacancies(accepted, results):
+    if not accepted:
+        return []
+
+    # Lock the properties involved and read their occupied nights over the batch's time frame at once.
+    by_property = defaultdict(list)
+    for index, data, property_id in accepted:
+        by_property[property_id].append((index, data))
+    properties = lock_properties(*by_property)
+    mark_reservations_changed(*by_property)
+    first_night = min(data['checkin_date'] for index, data, property_id in accepted)
+    last_night = max(data['checkout_date'] for index, data, property_id in accepted)
+    ledger = {(occupancy.property_id, occupancy.night): occupancy for occupancy in
+        PropertyNightOccupancy.objects.filter(property_id__in=by_property, night__range=(first_night, last_night))}
+
+    checked = []
+    changed = {}
+    for property_id, items in by_property.items():
+        vacancies = properties[property_id].guest_vacancies
+        for index, data in items:
+            nights = list(stay_nights(data['checkin_date'], data['checkout_date']))
+            if data['guests'] > vacancies:
+                results[index] = error_result(index, {'guests': [INSUFFICIENT_VACANCIES]})
+                continue
+
+            full = [night for night in nights if (property_id, night) in ledger
+                and ledger[(property_id, night)].guests + data['guests'] > vacancies]
+            if full:
+                field = 'checkout_date' if full == [data['checkout_date']] and len(nights) > 1 else 'checkin_date'
+                results[index] = error_result(index, {field: [INSUFFICIENT_VACANCIES]})
+                continue
+
+            for night in nights:
+                occupancy = ledger.get((property_id, night))
+                if occupancy is None:
+                    occupancy = ledger[(property_id, night)] = PropertyNightOccupancy(
+                        property_id=property_id, night=night, guests=0)
+                occupancy.guests += data['guests']
+                changed[(property_id, night)] = occupancy
+            data['exclusive_property_id'] = exclusive_property_id(properties[property_id])
+            checked.append((index, data))
+
+    # Write the ledger's new nights and update the ones that were already occupied.
+    batch_size = getattr(settings, 'BULK_IMPORT_BATCH_SIZE', 1000)
+    new_nights = [occupancy for occupancy in changed.values() if occupancy.pk is None]
+    occupied_nights = [occupancy for occupancy in changed.values() if occupancy.pk is not None]
+    PropertyNightOccupancy.objects.bulk_create(new_nights, batch_size=batch_size)
+    PropertyNightOccupancy.objects.bulk_update(occupied_nights, ['guests'], batch_size=batch_size)
+
+    # Keep the items in the order they were sent in.
+    return sorted(checked, key=lambda item: item[0])
+
+# Reject the items whose code is already used, by another reservation (archived ones included) or by an earlier
+# item.
+def check_codes(accepted, results):
+    requested = [data['code'] for index, data, property_id in accepted if 'code' in data]
+    used = set(Reservation.objects.filter(code__in=requested).values_list('code', flat=True))
+    used.update(ArchivedReservation.objects.filter(code__in=requested).values_list('code', flat=True))
+
+    unique = []
+    for index, data, property_id in accepted:
+        if 'code' in data:
+            if data['code'] in used:
+                results[index] = error_result(index, {'code': ['reservation with this code already exists.']})
+                continue
+            used.add(data['code'])
+        unique.append((index, data, property_id))
+    return unique
+
+# Give the accepted items that were sent without a code one of the codes reserved beforehand.
+def generate_codes(accepted, codes):
+    generated = iter(codes)
+    for index, data in accepted:
+        if 'code' not in data:
+            data['code'] = next(generated)
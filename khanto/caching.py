@@ -0,0 +1,136 @@
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+import hashlib
+import threading
+import time
+
+"""
+This file currently provides a read-through cache for API responses and for the model instances looked up while
+validating requests, on top of Django's cache framework (see CACHES in khanto/settings.py: a local memory cache by
+default, or a Redis compatible server).
+
+Cached entries are never invalidated one by one. Instead, every model has a version number kept in the cache,
+which is part of the key of every entry depending on that model, and the version is bumped by the post_save and
+post_delete signals of the model (see khanto/signals.py). Entries from older versions are simply never read again
+and expire on their own, so a list can't be served stale after any of the instances it holds changed.
+
+Hits and misses are counted per kind of entry, see cache_statistics().
+"""
+
+statistics = Counter()
+statistics_lock = threading.Lock()
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+def record(kind, hit):
+    with statistics_lock:
+        statistics[(kind, 'hit' if hit else 'miss')] += 1
+
+# Return the hit and miss counts of each kind of entry, e.g. {'responses': {'hit': 10, 'miss': 2}}.
+def cache_statistics():
+    with statistics_lock:
+        counts = dict(statistics)
+    result = {}
+    for (kind, outcome), count in counts.items():
+        result.setdefault(kind, {'hit': 0, 'miss': 0})[outcome] = count
+    return result
+
+def version_key(model):
+    return 'version:' + model._meta.label_lower
+
+# Return the current version of each model, starting the missing ones from the current time so that a version
+# evicted from the cache never comes back with a number older entries were stored under.
+def model_versions(*models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+# Bump the version of a model, making every cached entry that depends on it unreachable. The version is bumped
+# again once the current transaction commits, in case another request cached the old data in the meantime.
+def bump_model_version(model):
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(version_key(model))
+        except ValueError:
+            cache.add(version_key(model), time.time_ns())
+    bump()
+    transaction.on_commit(bump)
+
+def hashed(value):
+    return hashlib.sha1(value.encode()).hexdigest()
+
+# Return a model instance by primary key from the cache, calling `load` to fetch it on a miss.
+def cached_instance(model, pk, load):
+    version, = model_versions(model)
+    key = 'instance:{}:{}:{}'.format(model._meta.label_lower, version, hashed(str(pk)))
+    cache = get_cache()
+    instance = cache.get(key)
+    record('instances', instance is not None)
+    if instance is None:
+        instance = load()
+        cache.set(key, instance, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+    return instance
+
+class CachedResponseViewSetMixin:
+
+    # Models whose changes invalidate the cached responses of the viewset (the viewset's own model is always one).
+    cache_dependencies = ()
+
+    # Actions whose responses are cached.
+    cached_actions = ('list', 'retrieve')
+
+    def response_cache_key(self, request):
+
+        # The browsable API renders per-user HTML, so only the other formats are cached.
+        if self.action not in self.cached_actions or request.accepted_renderer.format == 'api':
+            return None
+        models = [self.get_queryset().model] + list(self.cache_dependencies)
+        versions = ':'.join(str(version) for version in model_versions(*models))
+        return 'response:{}:{}:{}'.format(self.basename, versions,
+            hashed(request.accepted_renderer.format + ' ' + request.build_absolute_uri()))
+
+    # Serve the response from the cache when possible, before any database query is made.
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.cache_key = self.response_cache_key(request)
+        self.cached_response = None
+        if self.cache_key is not None:
+            self.cached_response = get_cache().get(self.cache_key)
+            record('responses', self.cached_response is not None)
+
+    def list(self, request, *args, **kwargs):
+        if self.cached_response is not None:
+            return self.cached_content()
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.cached_response is not None:
+            return self.cached_content()
+        return super().retrieve(request, *args, **kwargs)
+
+    def cached_content(self):
+        content, content_type = self.cached_response
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    # Store successful responses once rendered.
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'cache_key', None) is not None and self.cached_response is None \
+                and response.status_code == 200 and hasattr(response, 'render'):
+            response.render()
+            get_cache().set(self.cache_key, (response.content, response['Content-Type']),
+                getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            response['X-Cache'] = 'MISS'
+        return response
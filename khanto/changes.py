@@ -0,0 +1,168 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+from .fastpath import RowSerializer, render_json
+from .serializers import PropertySerializer, AdvertisementSerializer, ReservationSerializer
+import datetime
+
+"""
+This file currently provides the change feed (CHANGE_FEED setting), which lets the clients keeping a copy of the
+properties, advertisements and reservations (e.g. the external platforms) fetch what changed since their last sync
+instead of listing every collection again. Every create, update and delete of these models is logged as a row of
+the Change table (by the signal receivers in khanto/signals.py, and by the code writing rows in bulk), whose ID
+only ever grows and is the feed's cursor. GET /changes/?since=<cursor> answers a page of the changes made after
+that cursor:
+{"changes": [{"cursor": 12, "model": "reservation", "action": "updated", "id": 3, "data": {...}}, ...],
+ "next": 12, "has_more": false}
+- only the latest change of each object within a page is sent, along with the object's current state (in the same
+  format as the API, read with the fast row serializer), and deleted objects come without their data. An object
+  created and deleted within the same page is left out, and "created" and "updated" are best applied as upserts,
+  since the compaction below may drop the entry of a creation followed by an update;
+- change IDs are handed out before the transactions writing them commit, so a change may become visible after
+  later ones. A page stops before a gap in the IDs that is younger than CHANGE_FEED_SETTLE_SECONDS, so that the
+  cursor never moves past a change still being committed;
+- `python3 manage.py compact_changes` deletes the entries superseded by a later change of the same object, which
+  every client reads anyway, and the entries older than CHANGE_FEED_RETENTION_DAYS. Clients whose cursor is older
+  than the deleted entries get 410 Gone, along with the latest cursor, and have to list the collections again.
+
+The feed is also served as Server-Sent Events to the clients accepting text/event-stream (e.g. EventSource), each
+page being an event whose ID is its `next` cursor, which clients resume from with the Last-Event-ID header. Under
+WSGI, each request answers a single event and the client reconnects after CHANGE_FEED_POLL_INTERVAL seconds. Under
+ASGI, the stream stays open and sends the changes as they are made, and JSON requests may wait up to `?wait=`
+seconds for changes instead of being answered an empty page (see khanto/async_views.py).
+"""
+
+# Models logged in the feed, and the serializer their current state is sent with, by name.
+SERIALIZERS = {
+    'property': PropertySerializer,
+    'advertisement': AdvertisementSerializer,
+    'reservation': ReservationSerializer,
+}
+
+# Models the current state of each object is read from, archived reservations included (see khanto/archive.py).
+SOURCES = {
+    'property': 'Property',
+    'advertisement': 'Advertisement',
+    'reservation': 'ReservationRecord',
+}
+
+def enabled():
+    return getattr(settings, 'CHANGE_FEED', False)
+
+# Log the change of a single object, within the transaction writing it.
+def record(instance, action):
+    if enabled():
+        record_many(instance._meta.model_name, [instance.pk], action)
+
+# Log the same change of many objects of a model at once, e.g. after bulk_create().
+def record_many(model, ids, action):
+    if not enabled():
+        return
+    Change = apps.get_model('khanto', 'Change')
+    Change.objects.bulk_create([Change(model=model, object_id=object_id, action=action) for object_id in ids],
+        batch_size=getattr(settings, 'BULK_IMPORT_BATCH_SIZE', 1000))
+
+# ID of the latest entry deleted by the retention, whose cursor and older ones can't be resumed from.
+def horizon():
+    ChangeFeedHorizon = apps.get_model('khanto', 'ChangeFeedHorizon')
+    return ChangeFeedHorizon.objects.values_list('change_id', flat=True).first() or 0
+
+def latest():
+    Change = apps.get_model('khanto', 'Change')
+    return Change.objects.aggregate(Max('id'))['id__max'] or 0
+
+# Return the page of at most `limit` entries following the `since` cursor, only sending the changes of the given
+# models when `models` is set.
+def read(since, limit, models=None):
+    Change = apps.get_model('khanto', 'Change')
+    fetched = list(Change.objects.filter(id__gt=since).order_by('id').values_list('id', 'model', 'object_id',
+        'action', 'creation_date')[:limit])
+    entries = settled(since, fetched)
+
+    # Keep the first and the latest change of each object, in the order of their latest one.
+    objects = {}
+    for cursor, model, object_id, action, creation_date in entries:
+        if models and model not in models:
+            continue
+        first_action = objects.pop((model, object_id), (None, action, None))[1]
+        objects[(model, object_id)] = (cursor, first_action, action)
+
+    current = current_state([key for key, (cursor, first_action, action) in objects.items() if action != 'deleted'])
+    changes = []
+    for (model, object_id), (cursor, first_action, action) in objects.items():
+        if action != 'deleted' and (model, object_id) not in current:
+            action = 'deleted'
+        if action == 'deleted':
+            if first_action != 'created':
+                changes.append({'cursor': cursor, 'model': model, 'action': action, 'id': object_id})
+            continue
+        changes.append({'cursor': cursor, 'model': model, 'action': first_action if first_action == 'created'
+            else action, 'id': object_id, 'data': current[(model, object_id)]})
+    return {
+        'changes': changes,
+        'next': entries[-1][0] if entries else since,
+        'has_more': len(fetched) == limit and len(entries) == len(fetched),
+    }
+
+# Return the entries up to the first gap in their IDs followed by an entry younger than the settle window.
+def settled(since, entries):
+    threshold = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'CHANGE_FEED_SETTLE_SECONDS', 2))
+    previous = since
+    for position, entry in enumerate(entries):
+        if entry[0] != previous + 1 and entry[4] > threshold:
+            return entries[:position]
+        previous = entry[0]
+    return entries
+
+# Return the representation of the objects that still exist among the given (model, ID) pairs.
+def current_state(keys):
+    ids = {}
+    for model, object_id in keys:
+        ids.setdefault(model, []).append(object_id)
+    current = {}
+    for model, object_ids in ids.items():
+        row_serializer = RowSerializer.of(SERIALIZERS[model])
+        rows = list(row_serializer.rows(apps.get_model('khanto', SOURCES[model]).objects.filter(pk__in=object_ids)))
+        for row, data in zip(rows, row_serializer.data(rows)):
+            current[(model, row.id)] = data
+    return current
+
+# Delete the entries superseded by a later change of the same object, and the ones older than `retention_days`,
+# returning the number of entries deleted.
+def compact(retention_days=None):
+    Change = apps.get_model('khanto', 'Change')
+    ChangeFeedHorizon = apps.get_model('khanto', 'ChangeFeedHorizon')
+    superseded = Change.objects.filter(Exists(Change.objects.filter(model=OuterRef('model'),
+        object_id=OuterRef('object_id'), id__gt=OuterRef('id'))))
+    deleted = superseded.delete()[0]
+
+    if retention_days is None:
+        retention_days = getattr(settings, 'CHANGE_FEED_RETENTION_DAYS', 30)
+    cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+    expired = Change.objects.filter(creation_date__lt=cutoff).aggregate(Max('id'))['id__max']
+    if expired is not None:
+        with transaction.atomic():
+            stored = ChangeFeedHorizon.objects.select_for_update().get_or_create(pk=1)[0]
+            stored.change_id = max(stored.change_id, expired)
+            stored.save()
+            deleted += Change.objects.filter(id__lte=expired).delete()[0]
+    return deleted
+
+# Format a page (or an error) as a Server-Sent Event.
+def event(data):
+    lines = [b'retry: %d' % (getattr(settings, 'CHANGE_FEED_POLL_INTERVAL', 1) * 1000)]
+    if 'next' in data:
+        lines.append(b'id: %d' % data['next'])
+    lines.append(b'data: ' + render_json(data))
+    return b'\n'.join(lines) + b'\n\n'
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return event(data)
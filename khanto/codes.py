@@ -0,0 +1,109 @@
+from collections import deque
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+import threading
+
+"""
+This file currently provides the collision-free generation of reservation codes. Codes are drawn from a
+counter kept in the database (see the CodeSequence model), which is never handed out twice, and the counter
+is scrambled with a Feistel network, a permutation of the 40 bit numbers, so that consecutive reservations
+don't get consecutive looking codes. Generating a code therefore never loops nor checks for collisions, and
+each process reserves blocks of counter values at once so most codes don't cost a query at all.
+
+On PostgreSQL the counter is a database sequence instead (see migration 0009): its values are handed out outside
+of any transaction and never given back, so reserving codes never holds a lock until the caller's transaction
+commits and reservations for different properties are never serialized by it. Codes reserved by transactions that
+roll back are simply skipped. SQLite has no sequences, but it already serializes every write transaction, so the
+CodeSequence row it updates within the caller's transaction doesn't make writers wait any longer.
+"""
+
+# Codes generated before the counter existed were random numbers up to 99999, new codes are placed after them.
+LEGACY_CODE_LIMIT = 99999
+
+# Size of the code space, which allows for about a trillion reservations.
+CODE_BITS = 40
+HALF_BITS = CODE_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+
+# Round keys of the Feistel network. Changing them changes which code each counter value maps to, so they
+# must never change once codes were handed out.
+ROUND_KEYS = (0x5bd1e, 0x1b873, 0xcc9e2, 0x3c6ef)
+
+# Largest code that may ever be generated.
+MAX_CODE = LEGACY_CODE_LIMIT + (1 << CODE_BITS)
+
+
+# Scramble half of a counter value with one of the round keys.
+def round_function(value, key):
+    value = ((value ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+    return (value ^ (value >> 15)) & HALF_MASK
+
+
+# Map a counter value to a unique, non-sequential looking number of the same size (a bijection of the
+# 40 bit numbers, so distinct counter values always give distinct results).
+def permute(value):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for key in ROUND_KEYS:
+        left, right = right, left ^ round_function(right, key)
+    return (left << HALF_BITS) | right
+
+
+# Name of the database sequence counter values are drawn from on PostgreSQL.
+def sequence_name(name):
+    return 'khanto_{}_code_seq'.format(name)
+
+def uses_sequence():
+    return connection.vendor == 'postgresql'
+
+class CodeAllocator:
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+
+        # Counter values reserved by the process and not handed out yet.
+        self.values = deque()
+
+    # Return a new reservation code.
+    def next_code(self):
+        return LEGACY_CODE_LIMIT + 1 + permute(self.next_counter_value())
+
+    # Return `count` new reservation codes, reserved from the database with a single query.
+    def next_codes(self, count):
+        if count == 0:
+            return []
+        return [LEGACY_CODE_LIMIT + 1 + permute(value) for value in self.reserve(count)]
+
+    def next_counter_value(self):
+
+        # Counter values reserved from the CodeSequence table inside a transaction are given back if it rolls
+        # back, so they can't be kept for later and are reserved one at a time instead.
+        if not uses_sequence() and transaction.get_connection().in_atomic_block:
+            return self.reserve(1)[0]
+
+        with self.lock:
+            if not self.values:
+                self.values.extend(self.reserve(getattr(settings, 'RESERVATION_CODE_BLOCK_SIZE', 100)))
+            return self.values.popleft()
+
+    # Reserve a number of counter values in the database and return them, in increasing order.
+    def reserve(self, count):
+        if uses_sequence():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [sequence_name(self.name), count])
+                values = sorted(row[0] for row in cursor.fetchall())
+        else:
+            CodeSequence = apps.get_model('khanto', 'CodeSequence')
+            with transaction.atomic():
+                CodeSequence.objects.get_or_create(name=self.name)
+                CodeSequence.objects.filter(name=self.name).update(next_value=F('next_value') + count)
+                first_value = CodeSequence.objects.values_list('next_value', flat=True).get(name=self.name) - count
+            values = range(first_value, first_value + count)
+        if values[-1] >= 1 << CODE_BITS:
+            raise OverflowError('The reservation code space is exhausted.')
+        return list(values)
+
+
+reservation_codes = CodeAllocator('reservation')
@@ -0,0 +1,185 @@
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+from .metrics import timed
+from .serializers import requested_expansions
+import datetime
+import decimal
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+This file currently provides the fast path of the list endpoints and the exports. ModelSerializers spend most of
+the time of large lists building model instances, looking up every field's attribute and calling its
+to_representation() one by one, then the JSON renderer walks the result again. Instead, RowSerializer reads the
+serializer's fields once and compiles a converter per field, then formats rows fetched with `.values_list()`
+straight into dictionaries, which are rendered with orjson (when installed, see requirements-optional.txt, with the
+standard library otherwise).
+
+The output is byte for byte the same as the serializer's rendered by DRF's JSONRenderer, so the fast path is
+only taken when nothing can make them differ: in the JSON format, without `?expand=`, without an indented media
+type and with decimals formatted as strings (COERCE_DECIMAL_TO_STRING). Every other request goes through the
+serializer.
+"""
+
+# Return a function formatting a database value the same way the serializer field does, or None when the value
+# already is formatted. Datetimes are formatted by datetime_converter() instead, see RowSerializer.data().
+def compile_converter(serializer_field):
+
+    # Relations are formatted as IDs, which is what .values_list() already returns for them.
+    if isinstance(serializer_field, (RelatedField, serializers.IntegerField, serializers.BooleanField,
+            serializers.CharField)):
+        return None
+    if isinstance(serializer_field, serializers.DecimalField) \
+            and getattr(serializer_field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) \
+            and serializer_field.decimal_places is not None \
+            and not serializer_field.localize and not serializer_field.normalize_output:
+        return decimal_converter(serializer_field)
+    if isinstance(serializer_field, serializers.DateField) \
+            and is_iso_format(serializer_field, api_settings.DATE_FORMAT):
+        return datetime.date.isoformat
+    return serializer_field.to_representation
+
+def is_iso_format(serializer_field, default):
+    return str(getattr(serializer_field, 'format', default)).lower() == ISO_8601
+
+def is_iso_datetime(serializer_field):
+    return isinstance(serializer_field, serializers.DateTimeField) \
+        and is_iso_format(serializer_field, api_settings.DATETIME_FORMAT)
+
+# Same as DecimalField.to_representation(), with the quantization context built once.
+def decimal_converter(serializer_field):
+    quantum = decimal.Decimal('.1') ** serializer_field.decimal_places
+    context = decimal.getcontext().copy()
+    if serializer_field.max_digits is not None:
+        context.prec = serializer_field.max_digits
+    rounding = serializer_field.rounding
+
+    def convert(value):
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return convert
+
+# Same as DateTimeField.to_representation() in the ISO 8601 format, for the aware datetimes read from the database
+# (or naive ones when USE_TZ is off), with the field's timezone looked up once.
+def datetime_converter(serializer_field):
+    field_timezone = serializer_field.timezone if hasattr(serializer_field, 'timezone') \
+        else serializer_field.default_timezone()
+    enforce_timezone = serializer_field.enforce_timezone
+
+    def convert(value):
+        if field_timezone is not None and value.tzinfo is not None:
+            value = value.astimezone(field_timezone).isoformat()
+        else:
+            value = enforce_timezone(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+class RowSerializer:
+
+    # Instances built so far, one per serializer class (see of()).
+    compiled = {}
+
+    def __init__(self, serializer_class):
+        serializer_fields = serializer_class().fields
+        self.field_names = list(serializer_fields.keys())
+
+        # Relations are read through their "<name>_id" column instead of joining the related table.
+        self.columns = [serializer_fields[name].source + '_id' if isinstance(serializer_fields[name], RelatedField)
+            else serializer_fields[name].source for name in self.field_names]
+        self.converters = []
+        self.datetime_fields = []
+        for index, name in enumerate(self.field_names):
+            if is_iso_datetime(serializer_fields[name]):
+                self.datetime_fields.append((index, serializer_fields[name]))
+                continue
+            converter = compile_converter(serializer_fields[name])
+            if converter is not None:
+                self.converters.append((index, converter))
+
+    @classmethod
+    def of(cls, serializer_class):
+        if serializer_class not in cls.compiled:
+            cls.compiled[serializer_class] = cls(serializer_class)
+        return cls.compiled[serializer_class]
+
+    # Return the queryset's rows, as named tuples whose attributes are the model fields' attribute names (which the
+    # pagination cursors are read from).
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def to_representation(self, row, converters=None):
+        values = list(row)
+        for index, converter in converters or self.bound_converters():
+            if values[index] is not None:
+                values[index] = converter(values[index])
+        return dict(zip(self.field_names, values))
+
+    # Return the converter of each field, the datetime ones formatting to the current timezone.
+    def bound_converters(self):
+        return self.converters + [(index, datetime_converter(serializer_field))
+            for index, serializer_field in self.datetime_fields]
+
+    def data(self, rows):
+        with timed('serializer'):
+            converters = self.bound_converters()
+            return [self.to_representation(row, converters) for row in rows]
+
+# Encode the decimals left by the serializer fields when COERCE_DECIMAL_TO_STRING is off as numbers, like DRF's
+# JSONEncoder does.
+def encode_decimal(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+# Render data made of dictionaries, lists, strings, numbers, booleans and None like DRF's JSONRenderer does with
+# its default settings.
+def render_json(data):
+    if orjson is not None:
+        content = orjson.dumps(data, default=encode_decimal)
+    else:
+        content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':'),
+            default=encode_decimal).encode()
+
+    # JSONRenderer escapes the line and paragraph separators, which are valid JSON but not valid JavaScript.
+    return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+class FastListViewSetMixin:
+
+    # Return the row serializer answering the request, or None when the request needs the serializer.
+    def fast_row_serializer(self, request):
+        if request.accepted_renderer.format != 'json' or 'indent' in request.accepted_media_type \
+                or requested_expansions(request) or not api_settings.UNICODE_JSON or not api_settings.COMPACT_JSON \
+                or not api_settings.COERCE_DECIMAL_TO_STRING:
+            return None
+        return RowSerializer.of(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        return self.paginated_list(request, self.filter_queryset(self.get_queryset()))
+
+    # Answer with a page of the queryset, through the fast path when possible.
+    def paginated_list(self, request, queryset):
+        row_serializer = self.fast_row_serializer(request)
+        if row_serializer is None:
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        page = self.paginate_queryset(row_serializer.rows(queryset))
+        return self.fast_response(row_serializer, page)
+
+    def fast_response(self, row_serializer, page):
+        return FastJSONResponse(self.paginator.get_paginated_response(row_serializer.data(page)).data)
+
+# Response rendered by render_json() instead of the accepted renderer, which is always DRF's JSONRenderer when the
+# fast path is taken.
+class FastJSONResponse(Response):
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return render_json(self.data)
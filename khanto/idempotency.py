@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .models import IdempotencyKey
+import datetime
+import hashlib
+import json
+
+"""
+This file currently provides idempotency keys for the create endpoints (POST /properties/, /advertisements/ and
+/reservations/). A client may send an `Idempotency-Key` header, any unique string of up to 255 characters, and
+safely retry the same request with the same key after a timeout:
+- the first request claims the key by inserting an in-progress row, committed straight away, and stores its
+  response in that row in the same transaction as the instance it creates, so a key never ends up with an
+  instance but no response;
+- repeats get the stored response back, headers such as Location included, with an `Idempotent-Replayed: true`
+  header, without validating anything again;
+- repeats arriving while the first request is still in progress get 409 Conflict with a Retry-After header
+  straight away, rather than holding a server thread while they wait for its response;
+- failed requests release the key, so that they may be retried;
+- reusing a key with a different request is rejected with 422 Unprocessable Entity.
+
+Keys belong to the user who sent them and expire after IDEMPOTENCY_KEY_TTL seconds. In-progress keys whose
+request died with its process are taken over after IDEMPOTENCY_LOCK_TIMEOUT seconds. Expired keys are removed by
+`python3 manage.py clear_idempotency_keys`.
+"""
+
+HEADER = 'Idempotency-Key'
+
+def digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+# Digest of the request's path and data, so that a key can't be reused for another request.
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    return digest(request.method + ' ' + request.path + ' ' + json.dumps(data, sort_keys=True, default=str))
+
+# Claim the key for the request. Return the claimed row, or the response to send instead: the stored response of
+# a completed repeat, or an error.
+def claim(key, fingerprint):
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(key=key, fingerprint=fingerprint, expiration_date=now
+                    + datetime.timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))), None
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(key=key).first()
+        if record is None:
+            continue
+        abandoned = record.status_code is None and record.creation_date <= now - datetime.timedelta(
+            seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+        if record.expiration_date <= now or abandoned:
+            release(record)
+            continue
+        if record.fingerprint != fingerprint:
+            return None, Response({'detail': 'This {} was already used with another request.'.format(HEADER)},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is not None:
+            return None, Response(record.response, status=record.status_code,
+                headers=dict(record.headers or {}, **{'Idempotent-Replayed': 'true'}))
+        return None, Response({'detail': 'A request with this {} is still in progress.'.format(HEADER)},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+# Delete the key's row, unless another request claimed the key again in the meantime.
+def release(record):
+    IdempotencyKey.objects.filter(key=record.key, creation_date=record.creation_date).delete()
+
+class IdempotentCreateViewSetMixin:
+
+    def create(self, request, *args, **kwargs):
+        sent_key = request.headers.get(HEADER)
+        if sent_key is None:
+            return super().create(request, *args, **kwargs)
+        if not sent_key or len(sent_key) > 255:
+            raise ValidationError({HEADER: ['Expected a key of 1 to 255 characters.']})
+
+        record, response = claim(digest('{}:{}'.format(request.user.pk, sent_key)), request_fingerprint(request))
+        if response is not None:
+            return response
+
+        # Same as CreateModelMixin.create(), where only the write and the storage of its response share a
+        # transaction, so that a key never ends up with an instance but no response. Validating the request and
+        # building the response don't hold the locks taken by the write.
+        try:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                self.perform_create(serializer)
+                data = serializer.data
+                headers = self.get_success_headers(data)
+                IdempotencyKey.objects.filter(key=record.key).update(status_code=status.HTTP_201_CREATED,
+                    response=data, headers=headers)
+        except BaseException:
+            release(record)
+            raise
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
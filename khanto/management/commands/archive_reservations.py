@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from khanto import archive
+import datetime
+
+"""
+This file currently provides the "archive_reservations" management command, which moves the past reservations
+out of the Reservation table into the archive (see khanto/archive.py). Usage, e.g. from a daily cron job:
+- `python3 manage.py archive_reservations` archives the reservations whose check-out date is older than
+  RESERVATION_ARCHIVE_DAYS days;
+- `python3 manage.py archive_reservations --days 90` archives the ones older than 90 days;
+- `python3 manage.py archive_reservations --before 2023-01-01` archives the ones checked out before 2023.
+"""
+
+class Command(BaseCommand):
+    help = 'Move the past reservations to the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+            help='Archive the reservations checked out more than this number of days ago '
+                '(RESERVATION_ARCHIVE_DAYS by default).')
+        parser.add_argument('--before', type=datetime.date.fromisoformat, default=None,
+            help='Archive the reservations checked out before this date (YYYY-MM-DD) instead.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+            help='Number of reservations moved per transaction.')
+
+    def handle(self, *args, **options):
+        before = options['before'] or archive.horizon(options['days'])
+        archived = archive.archive_reservations(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Archived {} reservations checked out before {}.'.format(archived,
+            before)))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from khanto.models import IdempotencyKey
+
+"""
+This file currently provides the "clear_idempotency_keys" management command, which removes the expired
+idempotency keys (see khanto/idempotency.py). Usage, e.g. from a daily cron job:
+- `python3 manage.py clear_idempotency_keys`
+"""
+
+class Command(BaseCommand):
+    help = 'Remove the expired idempotency keys.'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expiration_date__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS('Removed {} expired idempotency keys.'.format(deleted)))
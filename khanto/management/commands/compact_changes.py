@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from khanto import changes
+
+"""
+This file currently provides the "compact_changes" management command, which deletes the entries of the change
+feed superseded by a later change of the same object, and the ones older than the retention (see
+khanto/changes.py). Usage, e.g. from a daily cron job:
+- `python3 manage.py compact_changes` keeps the entries of the last CHANGE_FEED_RETENTION_DAYS days;
+- `python3 manage.py compact_changes --retention-days 7` keeps the entries of the last 7 days.
+"""
+
+class Command(BaseCommand):
+    help = 'Delete the superseded and expired entries of the change feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+            help='Number of days the entries are kept (CHANGE_FEED_RETENTION_DAYS by default).')
+
+    def handle(self, *args, **options):
+        deleted = changes.compact(options['retention_days'])
+        self.stdout.write(self.style.SUCCESS('Deleted {} change feed entries.'.format(deleted)))
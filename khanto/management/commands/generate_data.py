@@ -0,0 +1,149 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from khanto import availability_index, changes
+from khanto.caching import bump_model_version
+from khanto.codes import reservation_codes
+from khanto.models import Property, Advertisement, Reservation, ReservationRollup, PropertyNightOccupancy
+from khanto.models import exclusive_property_id, stay_nights
+from decimal import Decimal
+import datetime
+import random
+
+"""
+This file currently provides the "generate_data" management command, which fills the database with a synthetic
+but realistic dataset for development and benchmarks (see benchmarks/run_suite.py). Usage:
+- `python3 manage.py generate_data --properties 1000 --advertisements 2 --occupancy 0.6 --seed 1`
+
+Properties get between 1 and 8 vacancies, and each one is listed on a number of platforms, each advertisement
+with its own nightly rate. Every property is then booked over the time frame until its nights reach the requested
+occupancy, one stay after the other, with stay lengths and party sizes drawn from distributions close to those of
+holiday rentals. Stays never overlap, so the dataset is always valid, total costs match the quotes (see
+khanto/quotes.py), and the occupancy ledger (and the analytics rollup and change feed, when enabled) is written
+along with the reservations. The same seed always generates the same dataset.
+"""
+
+PLATFORMS = ['Airbnb', 'Booking.com', 'Vrbo', 'Expedia', 'Direct']
+
+# Relative frequency of each stay length, in nights after the check-in date.
+STAY_LENGTHS = {1: 10, 2: 22, 3: 20, 4: 14, 5: 10, 6: 7, 7: 10, 10: 3, 14: 4}
+
+# Relative frequency of each number of vacancies of a property.
+VACANCIES = {1: 8, 2: 30, 3: 12, 4: 25, 5: 5, 6: 12, 8: 8}
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset of properties, advertisements and reservations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=100, help='Number of properties.')
+        parser.add_argument('--advertisements', type=int, default=2, help='Number of advertisements per property.')
+        parser.add_argument('--occupancy', type=float, default=0.6,
+            help='Share of each property\'s nights that are booked, from 0 to 1.')
+        parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date(2030, 1, 1),
+            help='First night of the time frame (YYYY-MM-DD).')
+        parser.add_argument('--days', type=int, default=365, help='Number of nights in the time frame.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of rows written per query.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['occupancy'] < 1:
+            raise CommandError('The occupancy must be between 0 and 1 (excluded).')
+        if options['advertisements'] < 1:
+            raise CommandError('Every property needs at least one advertisement.')
+        self.generator = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            properties = self.create_properties(options['properties'])
+            advertisements = self.create_advertisements(properties, options['advertisements'])
+            reservations = self.create_reservations(properties, advertisements, options['occupancy'],
+                options['start'], options['start'] + datetime.timedelta(days=options['days'] - 1))
+
+            # Rows written in bulk don't send the signals invalidating cached responses (see khanto/signals.py).
+            bump_model_version(Property)
+            bump_model_version(Advertisement)
+
+        # Nor the ones keeping the availability index current, which is loaded again instead.
+        availability_index.index.reset()
+
+        self.stdout.write(self.style.SUCCESS('Generated {} properties, {} advertisements and {} reservations.'.format(
+            len(properties), sum(len(listed) for listed in advertisements.values()), reservations)))
+
+    def weighted(self, frequencies):
+        return self.generator.choices(list(frequencies), weights=list(frequencies.values()))[0]
+
+    def create_properties(self, count):
+        first_code = (Property.objects.aggregate(Max('code'))['code__max'] or 0) + 1
+        properties = [Property(
+            code=first_code + index,
+            guest_vacancies=self.weighted(VACANCIES),
+            bathrooms=self.generator.randint(1, 3),
+            pets_allowed=self.generator.random() < 0.3,
+            cleaning_cost=Decimal(self.generator.randrange(2000, 15000)) / 100) for index in range(count)]
+        properties = Property.objects.bulk_create(properties, batch_size=self.batch_size)
+        changes.record_many('property', [reserved_property.id for reserved_property in properties], 'created')
+        return properties
+
+    # Return the advertisements of each property by property ID.
+    def create_advertisements(self, properties, per_property):
+        advertisements = []
+        for reserved_property in properties:
+            for index in range(per_property):
+                platform = PLATFORMS[index % len(PLATFORMS)]
+                if index >= len(PLATFORMS):
+                    platform += ' {}'.format(index // len(PLATFORMS) + 1)
+                advertisements.append(Advertisement(property=reserved_property, platform=platform,
+                    platform_tax=Decimal(self.generator.randrange(300, 2000)) / 100,
+                    nightly_rate=Decimal(self.generator.randrange(4000, 40000)) / 100))
+        by_property = {}
+        for advertisement in Advertisement.objects.bulk_create(advertisements, batch_size=self.batch_size):
+            by_property.setdefault(advertisement.property_id, []).append(advertisement)
+        changes.record_many('advertisement', [advertisement.id for advertisement in advertisements], 'created')
+        return by_property
+
+    # Book each property one stay after the other, leaving gaps sized so that the requested share of the nights
+    # ends up booked, and write the reservations and their ledger nights in batches.
+    def create_reservations(self, properties, advertisements, occupancy, first_night, last_night):
+        mean_stay = sum((length + 1) * weight for length, weight in STAY_LENGTHS.items()) / sum(
+            STAY_LENGTHS.values())
+        mean_gap = mean_stay * (1 - occupancy) / occupancy
+
+        created = 0
+        reservations, nights = [], []
+        for reserved_property in properties:
+            night = first_night + datetime.timedelta(days=round(self.generator.expovariate(1 / mean_gap)))
+            while True:
+                checkin_date = night
+                checkout_date = checkin_date + datetime.timedelta(days=self.weighted(STAY_LENGTHS))
+                if checkout_date > last_night:
+                    break
+                guests = self.generator.randint(1, reserved_property.guest_vacancies)
+                advertisement = self.generator.choice(advertisements[reserved_property.id])
+                reservations.append(Reservation(
+                    advertisement=advertisement,
+                    checkin_date=checkin_date,
+                    checkout_date=checkout_date,
+                    total_cost=advertisement.nightly_rate * (checkout_date - checkin_date).days
+                        + reserved_property.cleaning_cost + advertisement.platform_tax,
+                    comment='Generated',
+                    guests=guests,
+                    exclusive_property_id=exclusive_property_id(reserved_property)))
+                nights.extend(PropertyNightOccupancy(property=reserved_property, night=stay_night, guests=guests)
+                    for stay_night in stay_nights(checkin_date, checkout_date))
+
+                # The next stay starts after this one's check-out date, which is occupied too.
+                night = checkout_date + datetime.timedelta(days=1 + round(self.generator.expovariate(1 / mean_gap)))
+
+            if len(reservations) >= self.batch_size:
+                created += self.write_reservations(reservations, nights)
+                reservations, nights = [], []
+        return created + self.write_reservations(reservations, nights)
+
+    def write_reservations(self, reservations, nights):
+        for reservation, code in zip(reservations, reservation_codes.next_codes(len(reservations))):
+            reservation.code = code
+        Reservation.objects.bulk_create(reservations, batch_size=self.batch_size)
+        changes.record_many('reservation', [reservation.id for reservation in reservations], 'created')
+        PropertyNightOccupancy.objects.bulk_create(nights, batch_size=self.batch_size)
+        ReservationRollup.objects.record(reservations)
+        return len(reservations)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from khanto.bulk import import_reservations
+import json
+
+"""
+This file currently provides the "import_reservations" management command, which imports reservations in
+batches through the same set-based validation as POST /reservations/bulk/ (see khanto/bulk.py). Usage:
+- `python3 manage.py import_reservations reservations.json` for a file holding a JSON list of reservations;
+- `python3 manage.py import_reservations reservations.ndjson` for a file holding one reservation per line.
+"""
+
+class Command(BaseCommand):
+    help = 'Import reservations in batches from a JSON or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON file holding a list of reservations, or NDJSON file.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of reservations validated and inserted together.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path']) as file:
+                content = file.read()
+        except OSError as error:
+            raise CommandError(error)
+
+        try:
+            if content.lstrip().startswith('['):
+                items = json.loads(content)
+            else:
+                items = [json.loads(line) for line in content.splitlines() if line.strip()]
+        except ValueError as error:
+            raise CommandError('Invalid JSON: {}'.format(error))
+
+        batch_size = options['batch_size']
+        created = 0
+        errors = 0
+        for start in range(0, len(items), batch_size):
+            for result in import_reservations(items[start:start + batch_size]):
+                if result['status'] == 'created':
+                    created += 1
+                    continue
+                errors += 1
+                self.stdout.write('Reservation {}: {}'.format(start + result['index'], json.dumps(result['errors'])))
+
+        message = 'Imported {} reservations, {} failed.'.format(created, errors)
+        self.stdout.write(self.style.SUCCESS(message) if not errors else self.style.WARNING(message))
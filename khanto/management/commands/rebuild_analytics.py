@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from khanto.models import ReservationRecord, ReservationRollup
+
+"""
+This file currently provides the "rebuild_analytics" management command, which recomputes the analytics rollup
+(ReservationRollup, see khanto/analytics.py) from the reservations, archived ones included. Usage:
+- `python3 manage.py rebuild_analytics`
+
+It has to be run once after turning the ANALYTICS_ROLLUP setting on, since reservation writes only keep the
+rollup up to date from then on.
+"""
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly analytics rollup from the reservations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of reservations read and added to the rollup at once.')
+
+    def handle(self, *args, **options):
+        if not ReservationRollup.objects.enabled():
+            raise CommandError('The analytics rollup is disabled, see the ANALYTICS_ROLLUP setting.')
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            ReservationRollup.objects.all().delete()
+            reservations = ReservationRecord.objects.only(
+                'advertisement_id', 'checkin_date', 'checkout_date', 'guests', 'total_cost')
+            batch = []
+            for reservation in reservations.iterator(chunk_size=batch_size):
+                batch.append(reservation)
+                if len(batch) >= batch_size:
+                    ReservationRollup.objects.record(batch)
+                    batch = []
+            ReservationRollup.objects.record(batch)
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt the analytics rollup with {} rows.'.format(
+            ReservationRollup.objects.count())))
@@ -0,0 +1,72 @@
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from khanto.models import ReservationRecord, PropertyNightOccupancy, stay_nights
+
+"""
+This file currently provides the "rebuild_occupancy" management command, which recomputes the
+occupancy ledger (PropertyNightOccupancy) from the reservations, archived ones included. Usage:
+- `python3 manage.py rebuild_occupancy` rebuilds the ledger;
+- `python3 manage.py rebuild_occupancy --check` only reports drift between the ledger and the
+  reservations, failing if there is any.
+"""
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-night occupancy ledger from the reservations, or check it for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift between the ledger and the reservations, without rebuilding it.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of reservations read and ledger rows written per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Add up the guests of every reservation per property and night.
+        expected = Counter()
+        reservations = ReservationRecord.objects.values_list(
+            'advertisement__property_id', 'checkin_date', 'checkout_date', 'guests')
+        for property_id, checkin_date, checkout_date, guests in reservations.iterator(chunk_size=batch_size):
+            for night in stay_nights(checkin_date, checkout_date):
+                expected[(property_id, night)] += guests
+
+        if options['check']:
+            self.check_drift(expected, batch_size)
+            return
+
+        with transaction.atomic():
+            PropertyNightOccupancy.objects.all().delete()
+            PropertyNightOccupancy.objects.bulk_create(
+                (PropertyNightOccupancy(property_id=property_id, night=night, guests=guests)
+                    for (property_id, night), guests in expected.items()),
+                batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt the occupancy ledger with {} nights.'.format(len(expected))))
+
+    # Compare the current ledger against the expected occupancy and report every difference.
+    def check_drift(self, expected, batch_size):
+        drifted = 0
+        ledger = PropertyNightOccupancy.objects.values_list('property_id', 'night', 'guests')
+        for property_id, night, guests in ledger.iterator(chunk_size=batch_size):
+            expected_guests = expected.pop((property_id, night), 0)
+            if guests != expected_guests:
+                drifted += 1
+                self.stdout.write('Property {} on {}: ledger has {} guests, reservations have {}.'.format(
+                    property_id, night, guests, expected_guests))
+
+        # Whatever is left was never recorded in the ledger.
+        for (property_id, night), expected_guests in sorted(expected.items()):
+            drifted += 1
+            self.stdout.write('Property {} on {}: ledger has 0 guests, reservations have {}.'.format(
+                property_id, night, expected_guests))
+
+        if drifted:
+            raise CommandError('The occupancy ledger drifted on {} nights.'.format(drifted))
+        self.stdout.write(self.style.SUCCESS('The occupancy ledger matches the reservations.'))
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from khanto import tasks
+from khanto.metrics import metrics_token_sent, registry
+import threading
+import time
+
+"""
+This file currently provides the "run_tasks" management command, the worker of the background task queue (see
+khanto/tasks.py). Usage:
+- `python3 manage.py run_tasks` runs the due tasks until stopped, checking for new ones every second;
+- `python3 manage.py run_tasks --once` runs the due tasks, then exits;
+- `python3 manage.py run_tasks --metrics-port 9100` also serves the worker's task metrics, in the Prometheus
+  format, at http://<host>:9100/metrics, only to the requests sending METRICS_TOKEN (when set) in an
+  "Authorization: Bearer" header.
+Any number of workers may run at once.
+"""
+
+class Command(BaseCommand):
+    help = 'Run the tasks of the background task queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help='Exit once no task is due, instead of waiting for new ones.')
+        parser.add_argument('--batch-size', type=int, default=None,
+            help='Largest number of tasks of the same name run at once (TASK_BATCH_SIZE by default).')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+            help='Seconds to wait before checking again for due tasks when none is left.')
+        parser.add_argument('--metrics-port', type=int, default=None,
+            help='Port to serve the task metrics on.')
+
+    def handle(self, *args, **options):
+        if options['metrics_port'] is not None:
+            server = ThreadingHTTPServer(('', options['metrics_port']), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        total = 0
+        while True:
+            close_old_connections()
+            count = tasks.run_batch(options['batch_size'])
+            total += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Ran {} tasks.'.format(total)))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        if getattr(settings, 'METRICS_TOKEN', '') and not metrics_token_sent(self.headers.get('Authorization', '')):
+            self.send_error(403)
+            return
+        content = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
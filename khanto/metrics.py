@@ -0,0 +1,239 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+import contextvars
+import hmac
+import threading
+import time
+
+"""
+This file currently provides the request metrics recorded by khanto.middleware.RequestMetricsMiddleware when the
+METRICS_ENABLED setting is on. For every request it records the number of queries and the time spent running
+them, the time spent serializing and validating data, the response size and the total duration, and adds them
+up per view and method. The figures of each request are sent back in its Server-Timing header, and the totals
+are exposed in the Prometheus text format by GET /metrics to staff users and to the holders of METRICS_TOKEN (see
+metrics_view()).
+
+The background task worker (see khanto/tasks.py) records the batches of tasks it runs in the same registry, and
+the rate limits and the admission control (see khanto/throttling.py) the requests they let through, throttle and
+shed.
+
+Timers overlap: the validation of a reservation includes the queries it makes, for example, which are also
+counted in the database time. Totals are kept per process, so each process of a deployment has to be scraped.
+"""
+
+# Upper bounds, in seconds, of the request duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Metrics of the request being handled in the current context, None when metrics are disabled.
+current_request = contextvars.ContextVar('current_request_metrics', default=None)
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.timers = defaultdict(float)
+        self.depth = defaultdict(int)
+
+    # Database execute wrapper (see connection.execute_wrapper()) counting the queries and their duration.
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+    # Server-Timing header value, with durations in milliseconds.
+    def server_timing(self, duration):
+        metrics = ['total;dur={:.1f}'.format(duration * 1000),
+            'db;dur={:.1f};desc="{} queries"'.format(self.db_seconds * 1000, self.queries)]
+        metrics.extend('{};dur={:.1f}'.format(name, seconds * 1000) for name, seconds in self.timers.items())
+        return ', '.join(metrics)
+
+# Add the time spent in the block to the current request's `name` timer. Nested blocks with the same name (e.g.
+# serializers embedding other serializers) are only counted once. Does nothing when metrics are disabled.
+@contextmanager
+def timed(name):
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    metrics.depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth[name] -= 1
+        if not metrics.depth[name]:
+            metrics.timers[name] += time.perf_counter() - start
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(lambda: {
+            'count': 0,
+            'duration': 0.0,
+            'buckets': [0] * len(DURATION_BUCKETS),
+            'queries': 0,
+            'db': 0.0,
+            'timers': defaultdict(float),
+            'bytes': 0,
+        })
+        self.tasks = defaultdict(lambda: {
+            'batches': defaultdict(int),
+            'tasks': defaultdict(int),
+            'duration': 0.0,
+            'delay': 0.0,
+        })
+        self.throttles = defaultdict(lambda: {
+            'requests': defaultdict(int),
+            'tokens': defaultdict(int),
+        })
+        self.shed = defaultdict(int)
+
+    def record(self, view, method, duration, metrics, response_size):
+        with self.lock:
+            totals = self.requests[(view, method)]
+            totals['count'] += 1
+            totals['duration'] += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    totals['buckets'][index] += 1
+            totals['queries'] += metrics.queries
+            totals['db'] += metrics.db_seconds
+            for name, seconds in metrics.timers.items():
+                totals['timers'][name] += seconds
+            totals['bytes'] += response_size
+
+    # Record a batch of background tasks (see khanto/tasks.py): its size, the time its handler took, and the total
+    # time its tasks waited in the queue.
+    def record_tasks(self, name, size, duration, delay, failed=False):
+        outcome = 'failed' if failed else 'done'
+        with self.lock:
+            totals = self.tasks[name]
+            totals['batches'][outcome] += 1
+            totals['tasks'][outcome] += size
+            totals['duration'] += duration
+            totals['delay'] += delay
+
+    # Record a request checked against the token buckets of a throttle scope (see khanto/throttling.py), and the
+    # tokens it cost.
+    def record_throttle(self, scope, cost, throttled=False):
+        outcome = 'throttled' if throttled else 'allowed'
+        with self.lock:
+            totals = self.throttles[scope]
+            totals['requests'][outcome] += 1
+            totals['tokens'][outcome] += cost
+
+    # Record a request shed by the admission control.
+    def record_shed(self, scope):
+        with self.lock:
+            self.shed[scope] += 1
+
+    # Render the totals in the Prometheus text exposition format.
+    def render(self):
+        from .caching import cache_statistics
+        from .throttling import limiter
+
+        with self.lock:
+            requests = {key: {**totals, 'buckets': list(totals['buckets']), 'timers': dict(totals['timers'])}
+                for key, totals in self.requests.items()}
+            tasks = {name: {**totals, 'batches': dict(totals['batches']), 'tasks': dict(totals['tasks'])}
+                for name, totals in self.tasks.items()}
+            throttles = {scope: {'requests': dict(totals['requests']), 'tokens': dict(totals['tokens'])}
+                for scope, totals in self.throttles.items()}
+            shed = dict(self.shed)
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for suffix, labels, value in samples:
+                rendered_labels = ','.join('{}="{}"'.format(label, escape(value)) for label, value in labels)
+                lines.append('{}{}{{{}}} {}'.format(name, suffix, rendered_labels, value))
+
+        def labels(key):
+            return [('view', key[0]), ('method', key[1])]
+
+        duration_samples = []
+        for key, totals in sorted(requests.items()):
+            for bound, count in zip(DURATION_BUCKETS, totals['buckets']):
+                duration_samples.append(('_bucket', labels(key) + [('le', str(bound))], count))
+            duration_samples.append(('_bucket', labels(key) + [('le', '+Inf')], totals['count']))
+            duration_samples.append(('_sum', labels(key), totals['duration']))
+            duration_samples.append(('_count', labels(key), totals['count']))
+        family('khanto_request_duration_seconds', 'histogram', 'Duration of the requests.', duration_samples)
+        family('khanto_request_queries_total', 'counter', 'Database queries run by the requests.',
+            [('', labels(key), totals['queries']) for key, totals in sorted(requests.items())])
+        family('khanto_request_db_seconds_total', 'counter', 'Time the requests spent running queries.',
+            [('', labels(key), totals['db']) for key, totals in sorted(requests.items())])
+        family('khanto_request_timer_seconds_total', 'counter',
+            'Time the requests spent serializing and validating data.',
+            [('', labels(key) + [('timer', name)], seconds) for key, totals in sorted(requests.items())
+                for name, seconds in sorted(totals['timers'].items())])
+        family('khanto_response_bytes_total', 'counter', 'Size of the response bodies.',
+            [('', labels(key), totals['bytes']) for key, totals in sorted(requests.items())])
+        family('khanto_cache_requests_total', 'counter', 'Read-through cache lookups (see khanto/caching.py).',
+            [('', [('kind', kind), ('outcome', outcome)], count)
+                for kind, counts in sorted(cache_statistics().items()) for outcome, count in sorted(counts.items())])
+        family('khanto_task_batches_total', 'counter', 'Batches of background tasks run (see khanto/tasks.py).',
+            [('', [('task', name), ('outcome', outcome)], count) for name, totals in sorted(tasks.items())
+                for outcome, count in sorted(totals['batches'].items())])
+        family('khanto_tasks_total', 'counter', 'Background tasks run.',
+            [('', [('task', name), ('outcome', outcome)], count) for name, totals in sorted(tasks.items())
+                for outcome, count in sorted(totals['tasks'].items())])
+        family('khanto_task_duration_seconds_total', 'counter', 'Time spent running batches of background tasks.',
+            [('', [('task', name)], totals['duration']) for name, totals in sorted(tasks.items())])
+        family('khanto_task_delay_seconds_total', 'counter', 'Time background tasks waited in the queue.',
+            [('', [('task', name)], totals['delay']) for name, totals in sorted(tasks.items())])
+        family('khanto_throttle_requests_total', 'counter',
+            'Requests checked against the rate limits (see khanto/throttling.py).',
+            [('', [('scope', scope), ('outcome', outcome)], count) for scope, totals in sorted(throttles.items())
+                for outcome, count in sorted(totals['requests'].items())])
+        family('khanto_throttle_tokens_total', 'counter',
+            'Tokens costed by the requests checked against the rate limits.',
+            [('', [('scope', scope), ('outcome', outcome)], count) for scope, totals in sorted(throttles.items())
+                for outcome, count in sorted(totals['tokens'].items())])
+        family('khanto_admission_shed_total', 'counter', 'Requests shed by the admission control.',
+            [('', [('scope', scope)], count) for scope, count in sorted(shed.items())])
+        family('khanto_admission_work_in_flight', 'gauge', 'Tokens worth of requests running in the process.',
+            [('', [], limiter.in_flight)])
+        return '\n'.join(lines) + '\n'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = MetricsRegistry()
+
+# Whether an Authorization header carries the METRICS_TOKEN as a bearer token (e.g. sent by the Prometheus
+# scraper). Never the case while no token is set.
+def metrics_token_sent(authorization):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token or not authorization.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(authorization[len('Bearer '):].encode(), token.encode())
+
+# Whether the request may read the metrics: it carries the METRICS_TOKEN, or comes from a logged-in staff user.
+def metrics_allowed(request):
+    if metrics_token_sent(request.headers.get('Authorization', '')):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+# GET /metrics, served only when metrics are enabled, to the requests allowed by metrics_allowed().
+def metrics_view(request):
+    if not metrics_enabled():
+        raise Http404
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
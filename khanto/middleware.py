@@ -0,0 +1,96 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from pathlib import Path
+from .metrics import RequestMetrics, current_request, metrics_enabled, registry
+import cProfile
+import random
+import time
+
+"""
+This file currently provides the middleware recording the metrics of every request (see khanto/metrics.py). It
+removes itself from the middleware chain when the METRICS_ENABLED setting is off, so it costs nothing then.
+
+It can also profile a sample of the requests (METRICS_PROFILE_SAMPLE_RATE, from 0 to 1) with cProfile and dump
+the statistics of the sampled requests slower than METRICS_PROFILE_SLOW_MS to METRICS_PROFILE_DIR, one
+"<time>-<view>-<method>.prof" file per request, to be read with `python3 -m pstats` or snakeviz. Only synchronous
+requests are profiled, since a profiler running on the event loop would record every request in flight.
+"""
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.profile_sample_rate = getattr(settings, 'METRICS_PROFILE_SAMPLE_RATE', 0)
+        self.profile_slow_seconds = getattr(settings, 'METRICS_PROFILE_SLOW_MS', 500) / 1000
+        self.profile_dir = Path(getattr(settings, 'METRICS_PROFILE_DIR', 'profiles'))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token, start = self.start()
+        profiler = None
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            profiler = cProfile.Profile()
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            duration = self.finish(metrics, token, start)
+        if profiler is not None and duration >= self.profile_slow_seconds:
+            self.dump_profile(profiler, request)
+        return self.record(request, response, metrics, duration)
+
+    async def __acall__(self, request):
+        metrics, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration = self.finish(metrics, token, start)
+        return self.record(request, response, metrics, duration)
+
+    # Start recording the request's metrics, counting the queries of every database.
+    def start(self):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        for alias in settings.DATABASES:
+            connections[alias].execute_wrappers.append(metrics)
+        return metrics, token, time.perf_counter()
+
+    def finish(self, metrics, token, start):
+        duration = time.perf_counter() - start
+        for alias in settings.DATABASES:
+            wrappers = connections[alias].execute_wrappers
+            if metrics in wrappers:
+                wrappers.remove(metrics)
+        current_request.reset(token)
+        return duration
+
+    def record(self, request, response, metrics, duration):
+        response['Server-Timing'] = metrics.server_timing(duration)
+
+        # The size of streamed responses isn't known until they were sent.
+        response_size = 0 if response.streaming else len(response.content)
+        registry.record(view_name(request), request.method, duration, metrics, response_size)
+        return response
+
+    def dump_profile(self, profiler, request):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.profile_dir / '{:.0f}-{}-{}.prof'.format(
+            time.time() * 1000, view_name(request).replace('/', '_'), request.method))
+
+# Name of the view that handled the request, such as "reservation-list", which keeps the number of label values
+# bounded unlike the request's path.
+def view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.view_name if resolver_match is not None else 'unresolved'
@@ -0,0 +1,115 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:21
+
+import django.core.validators
+import django.db.models.deletion
+import khanto.models
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Property',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.IntegerField(unique=True, validators=[django.core.validators.MinValueValidator(1)])),
+                ('guest_vacancies', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('bathrooms', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('pets_allowed', models.BooleanField()),
+                ('cleaning_cost', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('activation_date', models.DateField(auto_now_add=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('update_date', models.DateTimeField(auto_now=True)),
+                ('reservations_update_date', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'properties',
+                'indexes': [models.Index(fields=['creation_date', 'id'], name='property_creation_idx'), models.Index(fields=['guest_vacancies'], name='property_vacancies_idx'), models.Index(condition=models.Q(('pets_allowed', True)), fields=['guest_vacancies'], name='property_pets_vacancies_idx'), models.Index(fields=['update_date'], name='property_update_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Advertisement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(max_length=50)),
+                ('platform_tax', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('update_date', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='khanto.property')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PropertyNightOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('guests', models.IntegerField()),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='khanto.property')),
+            ],
+            options={
+                'verbose_name_plural': 'property night occupancies',
+            },
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.BigIntegerField(default=khanto.models.random_unique_code, unique=True, validators=[django.core.validators.MinValueValidator(1)])),
+                ('checkin_date', models.DateField()),
+                ('checkout_date', models.DateField()),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('comment', models.CharField(max_length=1000)),
+                ('guests', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('update_date', models.DateTimeField(auto_now=True)),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='khanto.advertisement')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['creation_date', 'id'], name='advertisement_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['platform', 'creation_date', 'id'], name='advertisement_platform_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='propertynightoccupancy',
+            constraint=models.UniqueConstraint(fields=('property', 'night'), name='occupancy_property_night_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['advertisement', 'checkin_date', 'checkout_date'], name='reservation_ad_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['checkin_date', 'id'], name='reservation_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['checkout_date'], name='reservation_checkout_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['creation_date'], name='reservation_creation_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(condition=models.Q(('checkin_date__lte', models.F('checkout_date'))), name='reservation_checkin_before_checkout', violation_error_message='Check-out date must be later than check-in date.'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('reservations', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('stay_nights', models.IntegerField(default=0)),
+                ('guest_nights', models.IntegerField(default=0)),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='khanto.advertisement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='rollup_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('advertisement', 'month'), name='rollup_advertisement_month_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:33
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0002_reservationrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='nightly_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.CreateModel(
+            name='NightlyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='khanto.advertisement')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('advertisement', 'night'), name='nightly_rate_night_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0003_nightly_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('expiration_date', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expiration_date'], name='idempotency_expiration_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Columns of the khanto_reservation_record view (see the ReservationRecord model).
+COLUMNS = 'id, advertisement_id, code, checkin_date, checkout_date, total_cost, comment, guests, creation_date, ' \
+    'update_date'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('code', models.BigIntegerField()),
+                ('checkin_date', models.DateField()),
+                ('checkout_date', models.DateField()),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('comment', models.CharField(max_length=1000)),
+                ('guests', models.IntegerField()),
+                ('creation_date', models.DateTimeField()),
+                ('update_date', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'khanto_reservation_record',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('code', models.BigIntegerField(unique=True)),
+                ('checkin_date', models.DateField()),
+                ('checkout_date', models.DateField()),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('comment', models.CharField(max_length=1000)),
+                ('guests', models.IntegerField()),
+                ('creation_date', models.DateTimeField()),
+                ('update_date', models.DateTimeField()),
+                ('archive_date', models.DateTimeField(auto_now_add=True)),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reservations', to='khanto.advertisement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['checkin_date', 'id'], name='archive_checkin_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            'CREATE VIEW khanto_reservation_record AS SELECT {0} FROM khanto_reservation '
+            'UNION ALL SELECT {0} FROM khanto_archivedreservation'.format(COLUMNS),
+            'DROP VIEW khanto_reservation_record'),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+"""
+Database sequence the reservation codes are drawn from on PostgreSQL (see khanto/codes.py), starting where the
+CodeSequence counter stopped. Sequence values are handed out outside of transactions, so reserving codes no
+longer holds the CodeSequence row lock until the reservation's transaction commits. SQLite has no sequences and
+keeps using the CodeSequence table, which is why the operations only run on PostgreSQL; the database engine of a
+given database never changes, so its schema stays consistent with the code reading it.
+
+The CodeSequence table itself was created by 0001_initial, since migrations were only committed from there on.
+"""
+
+SEQUENCE = 'khanto_reservation_code_seq'
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    CodeSequence = apps.get_model('khanto', 'CodeSequence')
+    start = CodeSequence.objects.filter(name='reservation').values_list('next_value', flat=True).first() or 0
+    schema_editor.execute('CREATE SEQUENCE {} MINVALUE 0 START WITH {}'.format(SEQUENCE, int(start)))
+
+# Hand the sequence's next value back to the CodeSequence counter, so that no code is generated twice.
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    CodeSequence = apps.get_model('khanto', 'CodeSequence')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SEQUENCE])
+        next_value, = cursor.fetchone()
+    CodeSequence.objects.update_or_create(name='reservation', defaults={'next_value': next_value})
+    schema_editor.execute('DROP SEQUENCE {}'.format(SEQUENCE))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0007_reservation_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:32
+
+from django.db import migrations, models
+
+# Name of the CodeSequence row the horizon of the change feed was kept in before.
+HORIZON = 'change_feed_horizon'
+
+# Move the horizon out of the reservation code counters' table.
+def move_horizon(apps, schema_editor):
+    CodeSequence = apps.get_model('khanto', 'CodeSequence')
+    ChangeFeedHorizon = apps.get_model('khanto', 'ChangeFeedHorizon')
+    change_id = CodeSequence.objects.filter(name=HORIZON).values_list('next_value', flat=True).first()
+    if change_id is not None:
+        ChangeFeedHorizon.objects.create(pk=1, change_id=change_id)
+        CodeSequence.objects.filter(name=HORIZON).delete()
+
+def restore_horizon(apps, schema_editor):
+    CodeSequence = apps.get_model('khanto', 'CodeSequence')
+    ChangeFeedHorizon = apps.get_model('khanto', 'ChangeFeedHorizon')
+    change_id = ChangeFeedHorizon.objects.values_list('change_id', flat=True).first()
+    if change_id is not None:
+        CodeSequence.objects.create(name=HORIZON, next_value=change_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0008_reservation_code_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change_id', models.BigIntegerField(default=0)),
+                ('update_date', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(move_horizon, restore_horizon),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+"""
+Exclusion constraint keeping the stays of the properties hosting a single guest from overlapping, in the database
+itself, so that even writes bypassing the occupancy ledger can't overbook them. It is keyed on the reservation's
+exclusive_property, the property of the reservation when it hosts a single guest (see Reservation in
+khanto/models.py), and only covers those reservations: a constraint can neither read the guest limit of another
+table nor add up guests, so the ledger remains the check for larger properties. Stays cover their check-out date,
+like in the ledger, hence the '[]' ranges.
+
+The constraint only exists on PostgreSQL, and requires the btree_gist extension; SQLite has no exclusion
+constraints, and already runs write transactions one after the other.
+"""
+
+CONSTRAINT = 'reservation_exclusive_property_excl'
+
+# Columns of the ReservationRecord view (see 0007_reservation_archive). SQLite can't rebuild the reservation table
+# to remove the column while the view reads it, so the view is dropped and created again around that.
+COLUMNS = 'id, advertisement_id, code, checkin_date, checkout_date, total_cost, comment, guests, creation_date, ' \
+    'update_date'
+
+# SQL only run on PostgreSQL.
+class PostgreSQLRunSQL(migrations.RunSQL):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+def fill_exclusive_properties(apps, schema_editor):
+    Advertisement = apps.get_model('khanto', 'Advertisement')
+    Reservation = apps.get_model('khanto', 'Reservation')
+    Reservation.objects.filter(advertisement__property__guest_vacancies=1).update(
+        exclusive_property=models.Subquery(Advertisement.objects.filter(pk=models.OuterRef('advertisement_id'))
+            .values('property_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('khanto', '0009_change_feed_horizon'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop,
+            'CREATE VIEW khanto_reservation_record AS SELECT {0} FROM khanto_reservation '
+            'UNION ALL SELECT {0} FROM khanto_archivedreservation'.format(COLUMNS)),
+        migrations.AddField(
+            model_name='reservation',
+            name='exclusive_property',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='khanto.property'),
+        ),
+        migrations.RunSQL(migrations.RunSQL.noop, 'DROP VIEW khanto_reservation_record'),
+        migrations.RunPython(fill_exclusive_properties, migrations.RunPython.noop),
+
+        # btree_gist lets the GiST index behind the constraint compare the property IDs for equality. The extension
+        # is left installed when migrating backwards, as other tables may use it.
+        PostgreSQLRunSQL('CREATE EXTENSION IF NOT EXISTS btree_gist', migrations.RunSQL.noop),
+        PostgreSQLRunSQL(
+            "ALTER TABLE khanto_reservation ADD CONSTRAINT {} EXCLUDE USING gist (exclusive_property_id WITH =, "
+            "daterange(checkin_date, checkout_date, '[]') WITH &&) WHERE (exclusive_property_id IS NOT NULL)".format(
+                CONSTRAINT),
+            'ALTER TABLE khanto_reservation DROP CONSTRAINT {}'.format(CONSTRAINT)),
+    ]
@@ -1,32 +1,101 @@
+from collections import defaultdict, namedtuple
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from decimal import Decimal
-import random
+from . import availability_index, codes, tasks
+from .metrics import timed
+import datetime
+import django
 
 """
 This file currently provides ModelViewSets for the following models:
 - RealEstateProperty
 - PropertyAdvertisement
 - PropertyReservation
+- ArchivedReservation, the past reservations moved out of the Reservation table (see khanto/archive.py), and
+  ReservationRecord, the view reading both
+- PropertyNightOccupancy, the per-night guest count of each property kept up to date by reservations
+- CodeSequence, the counters reservation codes are generated from
+- NightlyRate, the nightly rate of an advertisement on a given night, overriding its usual one (see khanto/quotes.py)
+- IdempotencyKey, the responses of the create requests sent with an Idempotency-Key header (see khanto/idempotency.py)
+- Task, the queue of side effects run in the background by the task worker (see khanto/tasks.py)
+- Change, the log of the objects created, updated and deleted, read by the change feed (see khanto/changes.py), and
+  ChangeFeedHorizon, the latest entry deleted by its retention
+- ReservationRollup, the optional monthly totals of each advertisement's reservations (see khanto/analytics.py)
 """
 
-# Function to generate a unique random code for each reservation
+# Function to generate a unique random looking code for each reservation, without ever looping or checking the
+# existing codes for collisions (see khanto/codes.py).
 def random_unique_code():
-    not_unique = True
-    while not_unique:
-        unique_code = random.randint(1, 99999)
+    return codes.reservation_codes.next_code()
 
-        # Check the randomly generated code against the existing codes to see if its unique
-        if not Reservation.objects.filter(code=unique_code):
-            not_unique = False
-    return unique_code
+# Build a check constraint, whose condition argument was renamed in Django 5.1.
+def check_constraint(condition, **kwargs):
+    if django.VERSION >= (5, 1):
+        return models.CheckConstraint(condition=condition, **kwargs)
+    return models.CheckConstraint(check=condition, **kwargs)
+
+class CodeSequence(models.Model):
+
+    # Name of the counter;
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        null=False,
+        blank=False)
+
+    # Next value to be handed out.
+    next_value = models.BigIntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Code sequence " + self.name
+
+class PropertyQuerySet(models.QuerySet):
+
+    # Properties able to host `guests` more guests every night from the check-in to the check-out date: a single
+    # query that skips every property with a night in that time frame (read from the occupancy ledger through its
+    # (property, night) index) on which fewer vacancies are left.
+    def available(self, checkin_date, checkout_date, guests):
+
+        # The in-memory availability index already knows which properties are full (see
+        # khanto/availability_index.py).
+        if availability_index.enabled():
+            return self.filter(guest_vacancies__gte=guests).exclude(
+                pk__in=availability_index.index.full_properties(checkin_date, checkout_date, guests))
+        full_nights = PropertyNightOccupancy.objects.filter(
+            property=models.OuterRef('pk'),
+            night__range=(checkin_date, checkout_date),
+            guests__gt=models.OuterRef('guest_vacancies') - guests)
+        return self.filter(guest_vacancies__gte=guests).exclude(models.Exists(full_nights))
 
 class Property(models.Model):
 
+    objects = PropertyQuerySet.as_manager()
+
     # Fix plural on admin panel
     class Meta:
         verbose_name_plural = "properties"
+        indexes = [
+            # Backs the keyset pagination of property lists (see khanto/pagination.py).
+            models.Index(fields=['creation_date', 'id'], name='property_creation_idx'),
+
+            # Back the guest_vacancies filter and the availability search (see PropertyQuerySet.available()), and
+            # the same among properties allowing pets, which alone is too common a value to be worth an index.
+            models.Index(fields=['guest_vacancies'], name='property_vacancies_idx'),
+            models.Index(fields=['guest_vacancies'], condition=models.Q(pets_allowed=True),
+                name='property_pets_vacancies_idx'),
+
+            # Backs the update_date filter, used to fetch the properties changed since a given time.
+            models.Index(fields=['update_date'], name='property_update_idx'),
+        ]
 
     # Fields per specification: Property code;
     code = models.IntegerField(
@@ -72,17 +141,63 @@ class Property(models.Model):
         null=False,
         blank=False)
 
-    # Update date and time.
+    # Update date and time;
     update_date = models.DateTimeField(
         auto_now=True,
         null=False,
         blank=False)
 
+    # Date and time a reservation for the property was last created or deleted (set automatically).
+    reservations_update_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False)
+
     def __str__(self):
         return "Property " + str(self.id)
 
+    # Whether two of the property's reservations share a night, check-out dates included like in the ledger.
+    def has_overlapping_stays(self):
+        reservations = Reservation.objects.filter(advertisement__property_id=self.pk)
+        return reservations.filter(models.Exists(reservations.exclude(pk=models.OuterRef('pk')).filter(
+            checkin_date__lte=models.OuterRef('checkout_date'),
+            checkout_date__gte=models.OuterRef('checkin_date')))).exists()
+
+    # The stays of a property hosting a single guest can't overlap (see the exclusion constraint of
+    # 0010_reservation_exclusive_property), so its guest limit is only lowered to 1 once they don't.
+    def clean(self):
+        if not self._state.adding and self.guest_vacancies == 1 and self.has_overlapping_stays():
+            raise ValidationError({'guest_vacancies':'Overlapping reservations need more vacancies.'})
+
+    # Override save() method to keep the exclusive_property of the property's reservations in step with its guest
+    # limit (see Reservation.exclusive_property). The property is locked first, so that no reservation is added
+    # between the check of clean() and the update.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            if not adding and self.guest_vacancies == 1:
+                lock_properties(self.pk)
+                self.clean()
+            super().save(*args, **kwargs)
+            if adding:
+                return
+            if self.guest_vacancies == 1:
+                Reservation.objects.filter(advertisement__property=self, exclusive_property__isnull=True).update(
+                    exclusive_property=self)
+            else:
+                Reservation.objects.filter(exclusive_property=self).update(exclusive_property=None)
+
 class Advertisement(models.Model):
 
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of advertisement lists (see khanto/pagination.py).
+            models.Index(fields=['creation_date', 'id'], name='advertisement_creation_idx'),
+
+            # Backs the platform filter, along with the pagination of the filtered list.
+            models.Index(fields=['platform', 'creation_date', 'id'], name='advertisement_platform_idx'),
+        ]
+
     # Per specification, a property may have multiple advertisements, but an advertisement may only refer to one property.
     property = models.ForeignKey(
         Property,
@@ -104,6 +219,15 @@ class Advertisement(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))])
 
+    # Usual nightly rate, from which quotes are computed (see khanto/quotes.py). Advertisements without one can't
+    # be quoted;
+    nightly_rate = models.DecimalField(
+        null=True,
+        blank=True,
+        max_digits=15,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))])
+
     # Creation date and time (set automatically);
     creation_date = models.DateTimeField(
         auto_now_add=True,
@@ -119,8 +243,72 @@ class Advertisement(models.Model):
     def __str__(self):
         return "Advertisement " + str(self.id)
 
+    # Override save() method to keep the exclusive_property of the advertisement's reservations in step with its
+    # property (see Reservation.exclusive_property).
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if not adding:
+                Reservation.objects.filter(advertisement=self).update(exclusive_property=models.Subquery(
+                    Property.objects.filter(pk=self.property_id, guest_vacancies=1).values('pk')[:1]))
+
+class NightlyRate(models.Model):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['advertisement', 'night'], name='nightly_rate_night_unique'),
+        ]
+
+    # The advertisement whose nightly rate is overridden;
+    advertisement = models.ForeignKey(
+        Advertisement,
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE)
+
+    # Night the rate applies to;
+    night = models.DateField(
+        null=False,
+        blank=False)
+
+    # Rate of the night.
+    rate = models.DecimalField(
+        null=False,
+        blank=False,
+        max_digits=15,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))])
+
+    def __str__(self):
+        return "Advertisement " + str(self.advertisement_id) + " on " + str(self.night)
+
 class Reservation(models.Model):
 
+    class Meta:
+        indexes = [
+            # Backs the date range lookups used when checking a property's vacancies (see clean() below).
+            models.Index(
+                fields=['advertisement', 'checkin_date', 'checkout_date'],
+                name='reservation_ad_dates_idx'),
+
+            # Backs the keyset pagination of reservation lists (see khanto/pagination.py), and the checkin_date
+            # filter.
+            models.Index(fields=['checkin_date', 'id'], name='reservation_checkin_idx'),
+
+            # Back the checkout_date and creation_date filters. The remaining filters either have an index already
+            # (code, advertisement) or are too rarely used on their own to be worth slowing down every insert.
+            models.Index(fields=['checkout_date'], name='reservation_checkout_idx'),
+            models.Index(fields=['creation_date'], name='reservation_creation_idx'),
+        ]
+        constraints = [
+            # Validate that the check-out date is never earlier than the check-in date (the stay covers both).
+            check_constraint(
+                models.Q(checkin_date__lte=models.F('checkout_date')),
+                name='reservation_checkin_before_checkout',
+                violation_error_message='Check-out date must be later than check-in date.'),
+        ]
+
     # Per specification, an announcement may have multiple reservations, but a reservation may only refer to one advertisement.
     advertisement = models.ForeignKey(
         Advertisement,
@@ -129,7 +317,7 @@ class Reservation(models.Model):
         on_delete=models.CASCADE)
 
     # Further fields per specification: Reservation code (randomly generated, see random_unique_code() above);
-    code = models.IntegerField(
+    code = models.BigIntegerField(
         unique=True,
         default=random_unique_code,
         null=False,
@@ -172,54 +360,580 @@ class Reservation(models.Model):
         null=False,
         blank=False)
 
-    # Update date and time (set automatically).
+    # Update date and time (set automatically);
     update_date = models.DateTimeField(
         auto_now=True,
         null=False,
         blank=False)
 
+    # Property of the reservation when it hosts a single guest, null otherwise (set automatically). On PostgreSQL,
+    # the reservation_exclusive_property_excl constraint keeps the stays of each such property from overlapping in
+    # the database itself (see khanto/migrations/0010_reservation_exclusive_property.py).
+    exclusive_property = models.ForeignKey(
+        Property,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        on_delete=models.CASCADE)
+
     def __str__(self):
         return "Reservation " + str(self.id)
 
+    # Codes stay unique across the live and archived reservations (see khanto/archive.py). Generated codes never
+    # repeat, so only the codes sent by clients may be taken by an archived reservation.
+    def validate_unique(self, exclude=None):
+        super().validate_unique(exclude)
+        if (exclude is None or 'code' not in exclude) and ArchivedReservation.objects.filter(code=self.code).exists():
+            raise ValidationError({'code':'Reservation with this Code already exists.'})
+
+    # The check-out date is validated against the check-in date by the reservation_checkin_before_checkout
+    # constraint, in full_clean() and by the database.
     def clean(self):
 
-        # Validate that the check-out date is always later than the check-in date.
-        if self.checkin_date > self.checkout_date:
-            raise ValidationError({'checkin_date':'Check-out date must be later than check-in date.'})
+        # Load the reservation's property only once, every check below refers to it.
+        reserved_property = self.advertisement.property
 
         # Validate that there's enough vacancies for the reservation to be valid on its own.
-        if self.advertisement.property.guest_vacancies < self.guests:
+        if reserved_property.guest_vacancies < self.guests:
             raise ValidationError({'guests':'Insufficient vacancies for reservation.'})
 
+        # A reservation being edited should not count against itself.
+        previous = None
+        if self.pk is not None:
+            previous = Reservation.objects.filter(pk=self.pk).values(
+                'advertisement__property_id', 'checkin_date', 'checkout_date', 'guests').first()
+            if previous is not None and previous['advertisement__property_id'] != reserved_property.id:
+                previous = None
+
         # Validate that there's enough vacancies for the reservation to be valid alongside other reservations.
-        occupied_checkin = 0
-        occupied_checkout = 0
-        for i in Reservation.objects.all():
+        # The guests already checked-in are read from the occupancy ledger, one row per night of the stay, so
+        # every kind of overlap is caught no matter how many reservations the property already has. The ledger is
+        # read even when the availability index is enabled, as the index of this process misses the reservations
+        # written by the others.
+        occupied = PropertyNightOccupancy.objects.for_stay(
+            reserved_property.id, self.checkin_date, self.checkout_date)
+        if previous is not None:
+            for night in stay_nights(previous['checkin_date'], previous['checkout_date']):
+                if night in occupied:
+                    occupied[night] -= previous['guests']
+
+        for night in sorted(occupied):
+            if occupied[night] + self.guests > reserved_property.guest_vacancies:
+
+                # Report the conflict on the check-out date when it is the only night without vacancies.
+                if night == self.checkout_date and night != self.checkin_date:
+                    raise ValidationError({'checkout_date':'Insufficient vacancies for reservation.'})
+                raise ValidationError({'checkin_date':'Insufficient vacancies for reservation.'})
+
+    # Override save() method to make sure clean() is called and the occupancy ledger is kept up to date.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+
+            # Lock the reserved property until the transaction ends, so that concurrent reservations for the same
+            # property are validated one after the other while other properties are still booked in parallel. An
+            # edited reservation is read again once its previous property is locked too, so that concurrent edits
+            # each release the stay the other one left.
+            previous = None
+            if self.advertisement_id is not None:
+                locked, previous = lock_reservation(self.pk, self.advertisement.property_id)
+                if self.advertisement.property_id in locked:
+                    self.advertisement.property = locked[self.advertisement.property_id]
+                mark_reservations_changed(*locked)
+
+            with timed('validation'):
+                self.full_clean()
+
+            # Remove the previous time frame from the ledger and the rollups when an existing reservation is edited.
+            if previous is not None:
+                PropertyNightOccupancy.objects.remove_stay(previous.advertisement.property_id,
+                    previous.checkin_date, previous.checkout_date, previous.guests)
+                ReservationRollup.objects.record_later([previous], sign=-1)
+
+            self.exclusive_property_id = exclusive_property_id(self.advertisement.property)
+            result = super().save(*args, **kwargs)
+            PropertyNightOccupancy.objects.add_stay(self.advertisement.property_id,
+                self.checkin_date, self.checkout_date, self.guests)
+            ReservationRollup.objects.record_later([self])
+        return result
+
+    # Override delete() method to release the stored reservation's nights from the occupancy ledger.
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+
+            # The stay released is the one stored once the property is locked, which a concurrent edit may have
+            # changed. A reservation already deleted by a concurrent request is left alone.
+            locked, stored = lock_reservation(self.pk)
+            if stored is None:
+                return 0, {}
+            self.advertisement = stored.advertisement
+            self.checkin_date, self.checkout_date, self.guests = stored.checkin_date, stored.checkout_date, \
+                stored.guests
+
+            # The stay is released from the ledger and the rollup by the pre_delete signal (see khanto/signals.py).
+            return super().delete(*args, **kwargs)
+
+class ArchivedReservation(models.Model):
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of the reservation lists including the archived ones (see
+            # ReservationRecord below), and the checkin_date filter.
+            models.Index(fields=['checkin_date', 'id'], name='archive_checkin_idx'),
+        ]
+
+    # Same fields as the Reservation the row was moved from, ID included, which is never handed out again;
+    id = models.BigIntegerField(
+        primary_key=True)
+    advertisement = models.ForeignKey(
+        Advertisement,
+        null=False,
+        blank=False,
+        related_name='archived_reservations',
+        on_delete=models.CASCADE)
+    code = models.BigIntegerField(
+        unique=True,
+        null=False,
+        blank=False)
+    checkin_date = models.DateField(
+        null=False,
+        blank=False)
+    checkout_date = models.DateField(
+        null=False,
+        blank=False)
+    total_cost = models.DecimalField(
+        null=False,
+        blank=False,
+        max_digits=15,
+        decimal_places=2)
+    comment = models.CharField(
+        max_length=1000,
+        null=False,
+        blank=False)
+    guests = models.IntegerField(
+        null=False,
+        blank=False)
+    creation_date = models.DateTimeField(
+        null=False,
+        blank=False)
+    update_date = models.DateTimeField(
+        null=False,
+        blank=False)
 
-            # Iterate through all reservations that are for the same property.
-            if self.advertisement.property == i.advertisement.property:
+    # Date and time the reservation was archived (set automatically).
+    archive_date = models.DateTimeField(
+        auto_now_add=True,
+        null=False,
+        blank=False)
 
-                # Check for vacancy conflicts when the check-in date is within another reservation's time frame.
-                if (self.checkin_date >= i.checkin_date and self.checkin_date <= i.checkout_date):
-                    
-                    # Add up all the guests that are already supposed to be checked-in during the time frame.
-                    occupied_checkin += i.guests
+    def __str__(self):
+        return "Archived reservation " + str(self.id)
 
-                    # If there's not enough remaining vacancies for the current reservation, raise an error.
-                    if occupied_checkin + self.guests > self.advertisement.property.guest_vacancies:
-                        raise ValidationError({'checkin_date':'Insufficient vacancies for reservation.'})
+# Every reservation, live or archived, read from a database view joining the Reservation and ArchivedReservation
+# tables (see the 0007_reservation_archive migration). Read-only.
+class ReservationRecord(models.Model):
 
-                # Check for vacancy conflicts when the check-out date is within another reservation's time frame.
-                if (self.checkout_date >= i.checkin_date and self.checkout_date <= i.checkout_date):
+    class Meta:
+        managed = False
+        db_table = 'khanto_reservation_record'
 
-                    # Add up all the guests that are already supposed to be checked-in during the time frame.
-                    occupied_checkout += i.guests
+    id = models.BigIntegerField(
+        primary_key=True)
+    advertisement = models.ForeignKey(
+        Advertisement,
+        related_name='+',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING)
+    code = models.BigIntegerField()
+    checkin_date = models.DateField()
+    checkout_date = models.DateField()
+    total_cost = models.DecimalField(
+        max_digits=15,
+        decimal_places=2)
+    comment = models.CharField(
+        max_length=1000)
+    guests = models.IntegerField()
+    creation_date = models.DateTimeField()
+    update_date = models.DateTimeField()
 
-                    # If there's not enough remaining vacancies for the current reservation, raise an error.
-                    if occupied_checkout + self.guests > self.advertisement.property.guest_vacancies:
-                        raise ValidationError({'checkout_date':'Insufficient vacancies for reservation.'})
+    def __str__(self):
+        return "Reservation " + str(self.id)
 
-    # Override save() method to make sure clean() is called.
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        return super().save(*args, **kwargs)
+# Lock the rows of the given properties (SELECT ... FOR UPDATE) until the current transaction ends and return them
+# by id. Rows are always locked in id order so that transactions locking several properties can't deadlock. Databases
+# without row locks, such as SQLite, already serialize every write transaction.
+def lock_properties(*property_ids):
+    property_ids = sorted(set(property_id for property_id in property_ids if property_id is not None))
+    return {locked.id: locked for locked in
+        Property.objects.select_for_update().filter(pk__in=property_ids).order_by('pk')}
+
+# Lock the given properties along with the property of the stored reservation `pk`, then its row, and return the
+# locked properties by id and the stored reservation, read once locked (None when there is none). A concurrent edit
+# may move the reservation to another property in between, which is then locked too.
+def lock_reservation(pk, *property_ids):
+    if pk is None:
+        return lock_properties(*property_ids), None
+    stored_property_id = Reservation.objects.filter(pk=pk).values_list('advertisement__property_id',
+        flat=True).first()
+    while True:
+        locked = lock_properties(*property_ids, stored_property_id)
+        stored = Reservation.objects.select_for_update(of=('self',)).select_related('advertisement').filter(
+            pk=pk).first()
+        if stored is None or stored.advertisement.property_id in locked:
+            return locked, stored
+        stored_property_id = stored.advertisement.property_id
+
+# Value of Reservation.exclusive_property for the reservations of a property: its ID when it hosts a single guest.
+def exclusive_property_id(reserved_property):
+    return reserved_property.id if reserved_property.guest_vacancies == 1 else None
+
+# Record that the reservations of the given properties changed, which invalidates their cached availability
+# calendars (see khanto/availability.py).
+def mark_reservations_changed(*property_ids):
+    Property.objects.filter(pk__in=property_ids).update(reservations_update_date=timezone.now())
+
+# Every night occupied by a stay, check-in and check-out dates included.
+def stay_nights(checkin_date, checkout_date):
+    for offset in range((checkout_date - checkin_date).days + 1):
+        yield checkin_date + datetime.timedelta(days=offset)
+
+class PropertyNightOccupancyManager(models.Manager):
+
+    # Return the occupied nights of a property within a stay as a {night: guests} dictionary.
+    def for_stay(self, property_id, checkin_date, checkout_date):
+        return dict(self.filter(
+            property_id=property_id,
+            night__range=(checkin_date, checkout_date)).values_list('night', 'guests'))
+
+    # Same as for_stay(), reading the nights with the async ORM (see khanto/async_views.py).
+    async def afor_stay(self, property_id, checkin_date, checkout_date):
+        return {night: guests async for night, guests in self.filter(
+            property_id=property_id,
+            night__range=(checkin_date, checkout_date)).values_list('night', 'guests')}
+
+    # Add the guests of a stay to each of its nights, creating the nights that weren't occupied yet.
+    def add_stay(self, property_id, checkin_date, checkout_date, guests):
+        nights = self.filter(property_id=property_id, night__range=(checkin_date, checkout_date))
+        occupied_nights = set(nights.values_list('night', flat=True))
+        if occupied_nights:
+            nights.update(guests=F('guests') + guests)
+        self.bulk_create([
+            self.model(property_id=property_id, night=night, guests=guests)
+            for night in stay_nights(checkin_date, checkout_date)
+            if night not in occupied_nights])
+
+    # Remove the guests of a stay from each of its nights, dropping the nights that become empty.
+    def remove_stay(self, property_id, checkin_date, checkout_date, guests):
+        nights = self.filter(property_id=property_id, night__range=(checkin_date, checkout_date))
+        nights.update(guests=F('guests') - guests)
+        nights.filter(guests__lte=0).delete()
+
+class PropertyNightOccupancy(models.Model):
+
+    objects = PropertyNightOccupancyManager()
+
+    class Meta:
+        verbose_name_plural = "property night occupancies"
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'night'], name='occupancy_property_night_unique'),
+        ]
+
+    # The occupied property;
+    property = models.ForeignKey(
+        Property,
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE)
+
+    # Occupied night;
+    night = models.DateField(
+        null=False,
+        blank=False)
+
+    # Number of guests checked-in during the night, across all of the property's reservations.
+    guests = models.IntegerField(
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Property " + str(self.property_id) + " on " + str(self.night)
+
+class ReservationRollupManager(models.Manager):
+
+    # Whether the rollup is kept up to date by reservation writes (see the ANALYTICS_ROLLUP setting).
+    def enabled(self):
+        return getattr(settings, 'ANALYTICS_ROLLUP', False)
+
+    # Add the given reservations to the rollup, or remove them with sign=-1. The rows involved are read at once,
+    # then updated and created in bulk. Callers hold the lock of the reservations' properties (see
+    # lock_properties()), so no other transaction changes those rows in the meantime.
+    def record(self, reservations, sign=1):
+        if not self.enabled():
+            return
+        deltas = defaultdict(lambda: {'reservations': 0, 'revenue': Decimal(0), 'stay_nights': 0, 'guest_nights': 0})
+        for reservation in reservations:
+            delta = deltas[(reservation.advertisement_id, reservation.checkin_date.replace(day=1))]
+            delta['reservations'] += sign
+            delta['revenue'] += sign * Decimal(reservation.total_cost)
+            delta['stay_nights'] += sign * (reservation.checkout_date - reservation.checkin_date).days
+            for night in stay_nights(reservation.checkin_date, reservation.checkout_date):
+                deltas[(reservation.advertisement_id, night.replace(day=1))]['guest_nights'] += sign * reservation.guests
+        if not deltas:
+            return
+
+        rows = {(row.advertisement_id, row.month): row for row in self.filter(
+            advertisement_id__in={advertisement_id for advertisement_id, month in deltas},
+            month__in={month for advertisement_id, month in deltas})}
+        new_rows = []
+        for key, delta in deltas.items():
+            row = rows.get(key)
+            if row is None:
+                new_rows.append(self.model(advertisement_id=key[0], month=key[1], **delta))
+                continue
+            for field, value in delta.items():
+                setattr(row, field, getattr(row, field) + value)
+        self.bulk_update([rows[key] for key in deltas if key in rows], list(ROLLUP_TOTALS))
+        self.bulk_create(new_rows)
+
+    # Same as record(), left to the background task queue when enabled (see khanto/tasks.py) so that reservation
+    # writes don't wait for it.
+    def record_later(self, reservations, sign=1):
+        if not self.enabled():
+            return
+        if not tasks.enabled():
+            self.record(reservations, sign)
+            return
+        tasks.enqueue('analytics.rollup', ({
+            'advertisement_id': reservation.advertisement_id,
+            'checkin_date': reservation.checkin_date,
+            'checkout_date': reservation.checkout_date,
+            'total_cost': reservation.total_cost,
+            'guests': reservation.guests,
+            'sign': sign,
+        } for reservation in reservations))
+
+# Totals kept by the rollup for each advertisement and month.
+ROLLUP_TOTALS = ('reservations', 'revenue', 'stay_nights', 'guest_nights')
+
+# Fields of a reservation read by ReservationRollupManager.record(). Queued reservations are rebuilt as plain tuples
+# rather than Reservation instances, whose code default would draw a reservation code for nothing.
+RollupStay = namedtuple('RollupStay', ['advertisement_id', 'checkin_date', 'checkout_date', 'total_cost', 'guests'])
+
+# Record a batch of reservations queued by ReservationRollupManager.record_later() in the rollup, holding the lock
+# of their properties like reservation writes do.
+@tasks.handler('analytics.rollup')
+def record_rollup(payloads):
+    reservations = {1: [], -1: []}
+    for payload in payloads:
+        reservations[payload['sign']].append(RollupStay(payload['advertisement_id'],
+            datetime.date.fromisoformat(payload['checkin_date']),
+            datetime.date.fromisoformat(payload['checkout_date']), Decimal(payload['total_cost']), payload['guests']))
+    lock_properties(*Advertisement.objects.filter(pk__in={payload['advertisement_id'] for payload in payloads})
+        .values_list('property_id', flat=True))
+    for sign, signed in reservations.items():
+        ReservationRollup.objects.record(signed, sign)
+
+class ReservationRollup(models.Model):
+
+    objects = ReservationRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['advertisement', 'month'], name='rollup_advertisement_month_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='rollup_month_idx'),
+        ]
+
+    # The advertisement the reservations were made through;
+    advertisement = models.ForeignKey(
+        Advertisement,
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE)
+
+    # First day of the month;
+    month = models.DateField(
+        null=False,
+        blank=False)
+
+    # Number of reservations checking in during the month;
+    reservations = models.IntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    # Total cost of the reservations checking in during the month;
+    revenue = models.DecimalField(
+        default=0,
+        null=False,
+        blank=False,
+        max_digits=17,
+        decimal_places=2)
+
+    # Length, in nights after the check-in date, of the stays checking in during the month;
+    stay_nights = models.IntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    # Guests checked-in on each night of the month, added up across the nights (as in the occupancy ledger).
+    guest_nights = models.IntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Advertisement " + str(self.advertisement_id) + " in " + self.month.strftime('%Y-%m')
+
+class IdempotencyKey(models.Model):
+
+    class Meta:
+        indexes = [
+            # Backs the removal of expired keys.
+            models.Index(fields=['expiration_date'], name='idempotency_expiration_idx'),
+        ]
+
+    # SHA-256 digest of the user's ID and the key they sent;
+    key = models.CharField(
+        max_length=64,
+        primary_key=True)
+
+    # SHA-256 digest of the request's path and data, which repeats must match;
+    fingerprint = models.CharField(
+        max_length=64,
+        null=False,
+        blank=False)
+
+    # Status code, data and headers (such as Location) of the response, empty while the request is in progress;
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True)
+    response = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder)
+    headers = models.JSONField(
+        null=True,
+        blank=True)
+
+    # Creation date and time (set automatically);
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        null=False,
+        blank=False)
+
+    # Date and time after which the key may be reused.
+    expiration_date = models.DateTimeField(
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Idempotency key " + self.key
+
+class Task(models.Model):
+
+    class Meta:
+        indexes = [
+            # Backs the lookup of the tasks due to run (see khanto/tasks.py).
+            models.Index(fields=['failed', 'run_after', 'id'], name='task_due_idx'),
+        ]
+
+    # Name of the handler running the task;
+    name = models.CharField(
+        max_length=100,
+        null=False,
+        blank=False)
+
+    # Data handed to the handler;
+    payload = models.JSONField(
+        encoder=DjangoJSONEncoder)
+
+    # Number of times the task was started;
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    # Date and time before which the task may not run: it is pushed back while a worker runs the task, and after
+    # each failure;
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        null=False,
+        blank=False)
+
+    # Whether the task failed too many times to be retried, and the error of its last attempt;
+    failed = models.BooleanField(
+        default=False,
+        null=False,
+        blank=False)
+    last_error = models.TextField(
+        default='',
+        null=False,
+        blank=True)
+
+    # Creation date and time (set automatically).
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Task " + str(self.id) + " (" + self.name + ")"
+
+class Change(models.Model):
+
+    class Meta:
+        indexes = [
+            # Backs the compaction of the entries superseded by a later change of the same object (see
+            # khanto/changes.py).
+            models.Index(fields=['model', 'object_id', 'id'], name='change_object_idx'),
+            models.Index(fields=['creation_date'], name='change_creation_idx'),
+        ]
+
+    # Position of the change in the change feed, which only ever grows;
+    id = models.BigAutoField(
+        primary_key=True)
+
+    # Model and ID of the changed object;
+    model = models.CharField(
+        max_length=20,
+        null=False,
+        blank=False)
+    object_id = models.BigIntegerField(
+        null=False,
+        blank=False)
+
+    # Whether the object was created, updated or deleted;
+    action = models.CharField(
+        max_length=7,
+        choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')],
+        null=False,
+        blank=False)
+
+    # Creation date and time (set automatically).
+    creation_date = models.DateTimeField(
+        auto_now_add=True,
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Change " + str(self.id) + " (" + self.action + " " + self.model + " " + str(self.object_id) + ")"
+
+class ChangeFeedHorizon(models.Model):
+
+    # ID of the latest entry deleted by the retention of the change feed, whose cursor and older ones can't be
+    # resumed from (see khanto/changes.py). The table holds a single row, written by the compaction only;
+    change_id = models.BigIntegerField(
+        default=0,
+        null=False,
+        blank=False)
+
+    # Update date and time (set automatically).
+    update_date = models.DateTimeField(
+        auto_now=True,
+        null=False,
+        blank=False)
+
+    def __str__(self):
+        return "Change feed horizon " + str(self.change_id)
@@ -0,0 +1,143 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+import json
+
+"""
+This file currently provides keyset (cursor) pagination for the viewsets. Each viewset declares the indexed
+fields its lists are ordered by in `keyset_ordering`, always ending with a unique field such as `id`, and the
+cursor of each page holds the values of those fields for the last (or first) instance on the previous page.
+Fetching a page is then a range scan starting right after those values, so deep pages cost the same as the
+first one, and filtered lists stay consistent across pages even when instances are added in between.
+
+Responses have the following format:
+{"next": <url or null>, "previous": <url or null>, "results": [...]}
+"""
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # Ordering used by viewsets that don't declare their own `keyset_ordering`.
+    ordering = ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    # Same as paginate_queryset(), fetching the page with the async ORM (see khanto/async_views.py).
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([instance async for instance in self.page_queryset(queryset, request, view)])
+
+    # Return the queryset of the requested page, holding one more instance than needed to know whether there's
+    # another page in the same direction.
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+        # The cursor holds the position to start from and whether to move backwards from it.
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = [self.reverse_name(name) if self.reverse else name for name in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.after_position(self.position, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    # Keep the page's instances from the results of page_queryset().
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # Build a condition matching the instances that come after `position` in the ordering (or before it, when
+    # moving backwards): (a > x) or (a = x and b > y) or ... The leading (a >= x) lets the database start an index
+    # range scan at the position instead of evaluating the whole condition for every row.
+    def after_position(self, position, reverse):
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            field_name = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            lookup = '__lt' if descending else '__gt'
+            condition |= equal & Q(**{field_name + lookup: value})
+            equal &= Q(**{field_name: value})
+        first_name = self.ordering[0].lstrip('-')
+        first_lookup = '__lte' if self.ordering[0].startswith('-') != reverse else '__gte'
+        return Q(**{first_name + first_lookup: position[0]}) & condition
+
+    def reverse_name(self, name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    def encode_cursor(self, instance, reverse):
+        position = [field.value_to_string(instance) for field in self.fields]
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii'), validate=True).decode('ascii'))
+            if len(cursor['p']) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, cursor['p'])]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(cursor.get('r'))
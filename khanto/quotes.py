@@ -0,0 +1,158 @@
+from collections import defaultdict
+from django.conf import settings
+from rest_framework import serializers
+from .models import Advertisement, NightlyRate
+from .serializers import QuoteSerializer
+from decimal import Decimal
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+This file currently provides the quote engine, which prices stays from the nightly rates of an advertisement (its
+usual nightly_rate, overridden on some nights by NightlyRate rows), the cleaning cost of its property and its
+platform tax:
+    total_cost = the rates of the nights from the check-in date to the night before the check-out date
+                 + cleaning_cost + platform_tax
+
+It is used by POST /quotes/, which prices a list of stays at once, and by reservation creation when the
+RESERVATION_PRICING setting is on: the total_cost of a new reservation may then be left out to have it computed,
+and is rejected when it doesn't match the quote.
+
+A batch is priced with two queries, one for the advertisements and one for the nightly rates overridden over the
+batch's time frame. The cost of every night an advertisement is quoted for is laid out in an array of cents, once
+per batch, whose cumulative sums give the cost of any stay with a single subtraction, so pricing a batch takes
+time proportional to its number of stays plus the nights it spans, no matter how long the stays are. The arrays
+are handled by NumPy when it is installed, and by plain lists otherwise.
+"""
+
+NO_NIGHTLY_RATE = 'This advertisement has no nightly rate.'
+
+def pricing_enabled():
+    return getattr(settings, 'RESERVATION_PRICING', False)
+
+def cents(amount):
+    return int(amount * 100)
+
+def money(amount_cents):
+    return Decimal(amount_cents).scaleb(-2)
+
+# Cost in cents of each night of a time frame, given the usual rate and the overridden ones by offset.
+def nightly_costs(rate, nights, overrides):
+    if numpy is not None:
+        costs = numpy.full(nights, rate, dtype=numpy.int64)
+        if overrides:
+            costs[list(overrides)] = list(overrides.values())
+        return costs
+    costs = [rate] * nights
+    for offset, override in overrides.items():
+        costs[offset] = override
+    return costs
+
+# Cost in cents of the nights from each start offset to the matching end offset (excluded).
+def stay_costs(costs, starts, ends):
+    if numpy is not None:
+        cumulated = numpy.zeros(len(costs) + 1, dtype=numpy.int64)
+        numpy.cumsum(costs, out=cumulated[1:])
+        return (cumulated[numpy.asarray(ends)] - cumulated[numpy.asarray(starts)]).tolist()
+    cumulated = [0, *itertools.accumulate(costs)]
+    return [cumulated[end] - cumulated[start] for start, end in zip(starts, ends)]
+
+# Price each stay, given as an (advertisement, checkin_date, checkout_date) tuple with the advertisement's property
+# loaded. Return the price of each stay as a dictionary of Decimal amounts, or None for the stays whose
+# advertisement has no nightly rate.
+def price_stays(stays):
+    positions = defaultdict(list)
+    for position, (advertisement, checkin_date, checkout_date) in enumerate(stays):
+        if advertisement.nightly_rate is not None:
+            positions[advertisement.pk].append(position)
+    prices = [None] * len(stays)
+    if not positions:
+        return prices
+
+    # Time frame over which each advertisement is quoted, from the first check-in date to the last night.
+    time_frames = {advertisement_id: (min(stays[position][1] for position in advertisement_positions),
+        max(stays[position][2] for position in advertisement_positions))
+        for advertisement_id, advertisement_positions in positions.items()}
+    overrides = defaultdict(dict)
+    rates = NightlyRate.objects.filter(advertisement__in=list(positions),
+        night__gte=min(first_night for first_night, end in time_frames.values()),
+        night__lt=max(end for first_night, end in time_frames.values())).values_list('advertisement', 'night', 'rate')
+    for advertisement_id, night, rate in rates:
+        first_night, end = time_frames[advertisement_id]
+        if first_night <= night < end:
+            overrides[advertisement_id][(night - first_night).days] = cents(rate)
+
+    for advertisement_id, advertisement_positions in positions.items():
+        advertisement = stays[advertisement_positions[0]][0]
+        first_night, end = time_frames[advertisement_id]
+        costs = nightly_costs(cents(advertisement.nightly_rate), (end - first_night).days,
+            overrides[advertisement_id])
+        totals = stay_costs(costs,
+            [(stays[position][1] - first_night).days for position in advertisement_positions],
+            [(stays[position][2] - first_night).days for position in advertisement_positions])
+        cleaning_cost = cents(advertisement.property.cleaning_cost)
+        platform_tax = cents(advertisement.platform_tax)
+        for position, nightly_cost in zip(advertisement_positions, totals):
+            prices[position] = {
+                'nights': (stays[position][2] - stays[position][1]).days,
+                'nightly_cost': money(nightly_cost),
+                'cleaning_cost': money(cleaning_cost),
+                'platform_tax': money(platform_tax),
+                'total_cost': money(nightly_cost + cleaning_cost + platform_tax),
+            }
+    return prices
+
+# Price a list of stays sent to POST /quotes/. Each stay gets its own result, like the bulk import (see
+# khanto/bulk.py): {"index": 0, "status": "quoted", "nights": 2, ..., "total_cost": "230.00"} or
+# {"index": 1, "status": "error", "errors": {...}}. Stays aren't checked against the existing reservations.
+def quote_stays(items):
+    results = [None] * len(items)
+    valid = []
+
+    # A single serializer validates every item so that its fields are only built once.
+    serializer = QuoteSerializer()
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except serializers.ValidationError as error:
+            results[index] = {'index': index, 'status': 'error', 'errors': error.detail}
+
+    advertisements = Advertisement.objects.select_related('property').in_bulk(
+        {data['advertisement'] for index, data in valid})
+    quoted = []
+    for index, data in valid:
+        advertisement = advertisements.get(data['advertisement'])
+        errors = None
+        if advertisement is None:
+            errors = {'advertisement': ['Invalid pk "{}" - object does not exist.'.format(data['advertisement'])]}
+        elif advertisement.nightly_rate is None:
+            errors = {'advertisement': [NO_NIGHTLY_RATE]}
+        elif data['guests'] > advertisement.property.guest_vacancies:
+            errors = {'guests': ['The property may host at most {} guests.'.format(
+                advertisement.property.guest_vacancies)]}
+        if errors is not None:
+            results[index] = {'index': index, 'status': 'error', 'errors': errors}
+            continue
+        quoted.append((index, (advertisement, data['checkin_date'], data['checkout_date'])))
+
+    prices = price_stays([stay for index, stay in quoted])
+    for (index, stay), price in zip(quoted, prices):
+        results[index] = {'index': index, 'status': 'quoted',
+            **{name: str(value) if isinstance(value, Decimal) else value for name, value in price.items()}}
+    return results
+
+# Return the total cost a new reservation should have, computed when the client left it out and checked against
+# the quote otherwise, or the errors preventing it. The total cost sent for an advertisement without a nightly rate
+# is accepted as is.
+def checked_total_cost(total_cost, price):
+    if price is None:
+        if total_cost is None:
+            return None, {'total_cost': ['This field is required, since the advertisement has no nightly rate.']}
+        return total_cost, None
+    if total_cost is not None and total_cost != price['total_cost']:
+        return None, {'total_cost': ['The total cost of this stay is {}.'.format(price['total_cost'])]}
+    return price['total_cost'], None
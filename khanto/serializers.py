@@ -1,9 +1,101 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Property, Advertisement, Reservation
+from rest_framework.validators import UniqueValidator
+import calendar
+import datetime
+from .caching import cached_instance
+from .codes import LEGACY_CODE_LIMIT
+from .metrics import timed
+from .models import Property, Advertisement, Reservation, ArchivedReservation
 
-class PropertySerializer(serializers.ModelSerializer):
+"""
+This file currently provides ModelSerializers for the Property, Advertisement and Reservation models.
+
+The Advertisement and Reservation serializers can embed their related objects instead of their IDs when the
+request asks for it with the `expand` query parameter, for example `/reservations/?expand=advertisement.property`
+(which also expands the advertisement). The matching viewsets join the related tables in the same query.
+"""
+
+# Return the set of relations to expand requested by `?expand=`, including the parents of nested relations.
+def requested_expansions(request):
+    expansions = set()
+    if request is None:
+        return expansions
+    for value in request.query_params.getlist('expand'):
+        for path in value.split(','):
+            parts = path.strip().split('.')
+            for depth in range(1, len(parts) + 1):
+                if all(parts[:depth]):
+                    expansions.add('.'.join(parts[:depth]))
+    return expansions
+
+class ExpandableSerializerMixin:
+
+    # Maps each expandable relation to the serializer class used to embed it. The relation stays a writable ID
+    # field, it is only embedded in responses.
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expansions = kwargs.get('context', {}).get('expand')
+        if self.expansions is None:
+            self.expansions = requested_expansions(kwargs.get('context', {}).get('request'))
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        for field_name, serializer_class in self.expandable_fields.items():
+            if field_name not in self.expansions:
+                continue
+
+            # Nested relations (e.g. "advertisement.property") are handed down without their prefix.
+            prefix = field_name + '.'
+            nested_expansions = {path[len(prefix):] for path in self.expansions if path.startswith(prefix)}
+            representation[field_name] = serializer_class(getattr(instance, field_name),
+                context={**self.context, 'expand': nested_expansions}).data
+        return representation
+
+    # Return the select_related() lookups needed to embed the relations in `expansions` without extra queries.
+    @classmethod
+    def related_lookups(cls, expansions, prefix=''):
+        lookups = []
+        for field_name, serializer_class in cls.expandable_fields.items():
+            if prefix + field_name not in expansions:
+                continue
+            lookups.append((prefix + field_name).replace('.', '__'))
+            if issubclass(serializer_class, ExpandableSerializerMixin):
+                lookups.extend(serializer_class.related_lookups(expansions, prefix + field_name + '.'))
+        return lookups
+
+# Resolves related IDs through the read-through cache (see khanto/caching.py), so that validating a write doesn't
+# query the related instance every time.
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            return super().to_internal_value(data)
+        return cached_instance(self.get_queryset().model, data, lambda: super(
+            CachedPrimaryKeyRelatedField, self).to_internal_value(data))
+
+# Count the time spent serializing and validating data in the request's metrics (see khanto/metrics.py).
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
+
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
+
+    def is_valid(self, *args, **kwargs):
+        with timed('serializer'):
+            return super().is_valid(*args, **kwargs)
+
+class PropertySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Property
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'code',
@@ -16,21 +108,50 @@ class PropertySerializer(serializers.ModelSerializer):
             'update_date'
         ]
 
-class AdvertisementSerializer(serializers.ModelSerializer):
+    # Validate that the guest limit isn't lowered to 1 while the property has overlapping reservations (see
+    # Property.clean()).
+    def validate(self, data):
+        if self.instance is not None and data.get('guest_vacancies') == 1 and self.instance.has_overlapping_stays():
+            raise serializers.ValidationError({'guest_vacancies':'Overlapping reservations need more vacancies.'})
+        return data
+
+class AdvertisementSerializer(TimedSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'property': PropertySerializer}
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
     class Meta:
         model = Advertisement
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'property',
             'platform',
             'platform_tax',
+            'nightly_rate',
             'creation_date',
             'update_date'
         ]
 
-class ReservationSerializer(serializers.ModelSerializer):
+# Lets new reservations leave their total cost out when the quote engine computes it (see the RESERVATION_PRICING
+# setting and khanto/quotes.py).
+class OptionalTotalCostMixin:
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if getattr(settings, 'RESERVATION_PRICING', False):
+            fields['total_cost'].required = False
+        return fields
+
+CODE_OUT_OF_RANGE = 'Codes above {} are generated, leave the code out to get one.'.format(LEGACY_CODE_LIMIT)
+
+class ReservationSerializer(TimedSerializerMixin, ExpandableSerializerMixin, OptionalTotalCostMixin,
+        serializers.ModelSerializer):
+    expandable_fields = {'advertisement': AdvertisementSerializer}
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
     class Meta:
         model = Reservation
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'code',
@@ -43,3 +164,167 @@ class ReservationSerializer(serializers.ModelSerializer):
             'creation_date',
             'update_date'
         ]
+
+    # Codes stay unique across the live and archived reservations (see khanto/archive.py).
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['code'].validators.append(UniqueValidator(queryset=ArchivedReservation.objects.all(),
+            message='reservation with this code already exists.'))
+        return fields
+
+    # Codes above LEGACY_CODE_LIMIT are generated by the server (see khanto/codes.py), so clients may only send
+    # lower ones.
+    def validate_code(self, value):
+        if value > LEGACY_CODE_LIMIT:
+            raise serializers.ValidationError(CODE_OUT_OF_RANGE)
+        return value
+
+# Validates the reservations sent to the bulk import (see khanto/bulk.py) without querying the database: the
+# advertisements and the uniqueness of the codes are checked for the whole batch at once instead.
+class ReservationImportSerializer(OptionalTotalCostMixin, serializers.ModelSerializer):
+    advertisement = serializers.IntegerField()
+    code = serializers.IntegerField(required=False, min_value=1, max_value=LEGACY_CODE_LIMIT,
+        error_messages={'max_value': CODE_OUT_OF_RANGE})
+
+    class Meta:
+        model = Reservation
+        fields = [
+            'code',
+            'advertisement',
+            'checkin_date',
+            'checkout_date',
+            'total_cost',
+            'comment',
+            'guests'
+        ]
+
+    def validate(self, data):
+
+        # Validate that the check-out date is always later than the check-in date.
+        if data['checkin_date'] > data['checkout_date']:
+            raise serializers.ValidationError({'checkin_date':'Check-out date must be later than check-in date.'})
+        return data
+
+# Validates the stays sent to the quote engine (POST /quotes/, see khanto/quotes.py) without querying the database.
+class QuoteSerializer(serializers.Serializer):
+    advertisement = serializers.IntegerField()
+    checkin_date = serializers.DateField()
+    checkout_date = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1)
+
+    def validate(self, data):
+
+        # Validate that the check-out date is always later than the check-in date.
+        if data['checkin_date'] > data['checkout_date']:
+            raise serializers.ValidationError({'checkin_date':'Check-out date must be later than check-in date.'})
+        return data
+
+# Validates the query parameters of the property availability search (GET /properties/available/).
+class AvailabilitySerializer(serializers.Serializer):
+    checkin = serializers.DateField()
+    checkout = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1)
+
+    def validate(self, data):
+
+        # Validate that the check-out date is always later than the check-in date.
+        if data['checkin'] > data['checkout']:
+            raise serializers.ValidationError({'checkin':'Check-out date must be later than check-in date.'})
+        return data
+
+# Validates the query parameters of the availability calendar (GET /properties/{id}/calendar/), which covers a year
+# starting today by default.
+class CalendarSerializer(serializers.Serializer):
+
+    # Longest time frame a single calendar may cover.
+    max_nights = 2 * 366
+
+    # "from" is a reserved word, so the fields are declared here instead of as class attributes.
+    def get_fields(self):
+        return {
+            'from': serializers.DateField(required=False),
+            'to': serializers.DateField(required=False),
+        }
+
+    def validate(self, data):
+        first_night = data.get('from', datetime.date.today())
+        last_night = data.get('to', first_night + datetime.timedelta(days=364))
+        if first_night > last_night:
+            raise serializers.ValidationError({'from':'The calendar must end after it starts.'})
+        if (last_night - first_night).days >= self.max_nights:
+            raise serializers.ValidationError({'to':'The calendar may cover at most {} nights.'.format(self.max_nights)})
+        return {'from': first_night, 'to': last_night}
+
+# Validates the query parameters of the analytics endpoints (see khanto/analytics.py), which cover the last 12
+# months up to the end of the current one by default, e.g.
+# /analytics/revenue/?from=2023-01-01&to=2023-06-30&property=1&property=2&platform=Airbnb&by=platform
+class AnalyticsSerializer(serializers.Serializer):
+
+    # Longest time frame the figures may cover.
+    max_months = 120
+
+    # "from" is a reserved word, so the fields are declared here instead of as class attributes.
+    def get_fields(self):
+        return {
+            'from': serializers.DateField(required=False),
+            'to': serializers.DateField(required=False),
+            'property': serializers.ListField(child=serializers.IntegerField(min_value=1), required=False),
+            'platform': serializers.ListField(child=serializers.CharField(), required=False),
+            'by': serializers.ChoiceField(choices=['property', 'platform', 'advertisement'], default='property'),
+        }
+
+    def validate(self, data):
+        today = datetime.date.today()
+        last_day = data.get('to', today.replace(day=calendar.monthrange(today.year, today.month)[1]))
+
+        # By default, the time frame starts on the first day of the 11th month before the last one.
+        first_month = last_day.year * 12 + last_day.month - 12
+        first_day = data.get('from', datetime.date(first_month // 12, first_month % 12 + 1, 1))
+        if first_day > last_day:
+            raise serializers.ValidationError({'from':'The time frame must end after it starts.'})
+        if (last_day.year - first_day.year) * 12 + last_day.month - first_day.month >= self.max_months:
+            raise serializers.ValidationError({'to':'The time frame may cover at most {} months.'.format(self.max_months)})
+        return {**data, 'from': first_day, 'to': last_day}
+
+# The occupancy is computed per property, so it can't be filtered by platform.
+class OccupancyAnalyticsSerializer(AnalyticsSerializer):
+
+    def get_fields(self):
+        fields = super().get_fields()
+        del fields['platform'], fields['by']
+        return fields
+
+class RevenueSerializer(serializers.Serializer):
+    advertisement = serializers.IntegerField(required=False)
+    property = serializers.IntegerField(required=False)
+    platform = serializers.CharField(required=False)
+    reservations = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=17, decimal_places=2)
+    platform_taxes = serializers.DecimalField(max_digits=17, decimal_places=2)
+    net_revenue = serializers.DecimalField(max_digits=17, decimal_places=2)
+
+class StaysSerializer(serializers.Serializer):
+    advertisement = serializers.IntegerField(required=False)
+    property = serializers.IntegerField(required=False)
+    platform = serializers.CharField(required=False)
+    reservations = serializers.IntegerField()
+    nights = serializers.IntegerField()
+    average_stay = serializers.FloatField()
+
+# Validates the query parameters of the change feed (see khanto/changes.py), e.g.
+# /changes/?since=120&limit=1000&model=property&model=reservation&wait=30
+class ChangesSerializer(serializers.Serializer):
+
+    # Largest page the feed may answer.
+    max_limit = 5000
+
+    def get_fields(self):
+        return {
+            'since': serializers.IntegerField(min_value=0, default=0),
+            'limit': serializers.IntegerField(min_value=1, max_value=self.max_limit,
+                default=getattr(settings, 'CHANGE_FEED_PAGE_SIZE', 500)),
+            'model': serializers.ListField(child=serializers.ChoiceField(
+                choices=['property', 'advertisement', 'reservation']), required=False),
+            'wait': serializers.IntegerField(min_value=0, max_value=getattr(settings, 'CHANGE_FEED_MAX_WAIT', 60),
+                default=0),
+        }
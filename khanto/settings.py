@@ -10,7 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
+import django
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Records the metrics of every request when METRICS_ENABLED is on (see khanto/metrics.py).
+    'khanto.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,7 +57,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'khanto.urls'
+# The ASGI deployment routes the hot read endpoints to async views (see khanto/asgi.py).
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'khanto.urls')
 
 TEMPLATES = [
     {
@@ -76,14 +82,93 @@ WSGI_APPLICATION = 'khanto.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# The database is picked with the DATABASE_ENGINE environment variable:
+# - "sqlite" (default), for development and small deployments. Write transactions start with the write lock taken
+#   (on Django 5.1 or later) and the database uses write-ahead logging (see SQLITE_PRAGMAS), so reads go on while
+#   a reservation is written and concurrent writers wait for each other for up to DATABASE_BUSY_TIMEOUT seconds
+#   instead of failing.
+# - "postgresql", for production, configured with DATABASE_NAME, DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST
+#   and DATABASE_PORT. Connections are kept open for DATABASE_CONN_MAX_AGE seconds and checked before being
+#   reused. DATABASE_POOL may be set to "psycopg" to use a psycopg connection pool of DATABASE_POOL_MIN_SIZE to
+#   DATABASE_POOL_MAX_SIZE connections per process instead (needs Django 5.1 or later and "psycopg[pool]"), or
+#   to "pgbouncer" when connecting through PgBouncer in transaction mode, which can't keep the server-side
+#   cursors used by the exports open.
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'khanto'),
+            'USER': os.environ.get('DATABASE_USER', 'khanto'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
+    DATABASE_POOL = os.environ.get('DATABASE_POOL', '')
+    if DATABASE_POOL == 'psycopg':
+
+        # Pooled connections are returned to the pool after each request, so they mustn't be persistent too.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+        }
+    elif DATABASE_POOL == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DATABASE_POOL:
+        raise ImproperlyConfigured('Unsupported DATABASE_POOL "{}", expected psycopg or pgbouncer.'.format(
+            DATABASE_POOL))
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': float(os.environ.get('DATABASE_BUSY_TIMEOUT', 20)),
+            },
+        }
+    }
+    if django.VERSION >= (5, 1):
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+else:
+    raise ImproperlyConfigured('Unsupported DATABASE_ENGINE "{}", expected sqlite or postgresql.'.format(
+        DATABASE_ENGINE))
+
+# PRAGMA statements run on every new SQLite connection (see khanto/signals.py). Write-ahead logging lets readers
+# and a writer work at the same time, and with it a "NORMAL" synchronous mode is still safe from corruption.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The local memory cache is private to each process, so deployments running several processes should point
+# REDIS_URL to a Redis compatible server (which needs the "redis" package) for invalidations to reach all of them.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'khanto',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -126,5 +211,120 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+
+    # Lists are paginated with cursors over indexed keys (see khanto/pagination.py).
+    'DEFAULT_PAGINATION_CLASS': 'khanto.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+
+    # Token buckets of each user for the whole API ("user", or "anon" for anonymous requests) and for each endpoint
+    # (the viewsets' throttle_scope), in tokens per period, enforced when THROTTLING is on (see khanto/throttling.py).
+    'DEFAULT_THROTTLE_CLASSES': ['khanto.throttling.UserThrottle', 'khanto.throttling.EndpointThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '1200/min',
+        'anon': '120/min',
+        'properties': '600/min',
+        'advertisements': '600/min',
+        'reservations': '600/min',
+        'quotes': '300/min',
+        'analytics': '300/min',
+        'changes': '600/min',
+    },
+}
+
+# Number of reservation codes each process reserves from the database at once (see khanto/codes.py).
+RESERVATION_CODE_BLOCK_SIZE = 100
+
+# Number of rows read from the database per query, and written per response chunk, by the streaming exports.
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of rows written per query by the bulk reservation import (see khanto/bulk.py).
+BULK_IMPORT_BATCH_SIZE = 1000
+
+# Number of seconds availability calendars stay cached (see khanto/availability.py).
+CALENDAR_CACHE_TIMEOUT = 3600
+
+# Number of seconds API responses and the instances looked up by validation stay cached (see khanto/caching.py).
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Compute the total cost of new reservations that leave it out, and reject the ones that don't match, with the
+# quote engine (see khanto/quotes.py). QUOTE_BATCH_LIMIT is the number of stays POST /quotes/ prices at once.
+RESERVATION_PRICING = os.environ.get('RESERVATION_PRICING') == '1'
+QUOTE_BATCH_LIMIT = 10000
+
+# Idempotency keys sent with create requests (see khanto/idempotency.py): seconds a key and its response are kept,
+# and seconds after which a request in progress is considered dead.
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Answer the availability search from an index of the reservations kept in memory by each server process, instead
+# of the occupancy ledger (see khanto/availability_index.py). New reservations are still checked against the
+# ledger. The index only sees the writes of its own process, and is checked against the database every
+# AVAILABILITY_INDEX_VERIFY_INTERVAL seconds (0 to never check it).
+AVAILABILITY_INDEX = os.environ.get('AVAILABILITY_INDEX') == '1'
+AVAILABILITY_INDEX_VERIFY_INTERVAL = int(os.environ.get('AVAILABILITY_INDEX_VERIFY_INTERVAL', 300))
+
+# Run the side effects of reservation writes (the analytics rollup) in the background, from a queue of tasks kept
+# in the database and run by `python3 manage.py run_tasks`, instead of within the requests (see khanto/tasks.py).
+# The worker runs up to TASK_BATCH_SIZE tasks of the same kind at once, claims them for TASK_LEASE seconds, and
+# retries failed ones after TASK_RETRY_DELAY seconds (doubled after every attempt) up to TASK_MAX_ATTEMPTS times.
+TASK_QUEUE = os.environ.get('TASK_QUEUE') == '1'
+TASK_BATCH_SIZE = 100
+TASK_LEASE = 300
+TASK_RETRY_DELAY = 10
+TASK_MAX_ATTEMPTS = 5
+
+# Rate limit the requests of each user and shed load when the database is busy (see khanto/throttling.py). Requests
+# cost THROTTLE_COSTS tokens, taken from the token buckets of DEFAULT_THROTTLE_RATES (see REST_FRAMEWORK) kept in
+# the THROTTLE_CACHE_ALIAS cache, and each process runs up to ADMISSION_MAX_WORK tokens worth of requests at once,
+# answering the others 503 with a Retry-After header of ADMISSION_RETRY_AFTER seconds.
+THROTTLING = os.environ.get('THROTTLING') == '1'
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_COSTS = {
+    # Reads, most of them served from the response cache (see khanto/caching.py).
+    'read': 1,
+    # Other writes.
+    'write': 5,
+    # Reservation creations, validated by Reservation.clean().
+    'reservation': 20,
+    # Each reservation of a bulk import, validated with set-based queries (see khanto/bulk.py).
+    'bulk_reservation': 1,
+    # Exports, streaming a whole table.
+    'export': 100,
 }
+ADMISSION_MAX_WORK = int(os.environ.get('ADMISSION_MAX_WORK', 200))
+ADMISSION_RETRY_AFTER = 1
+
+# Number of days after their check-out date reservations are moved to the archive by
+# `python3 manage.py archive_reservations` (see khanto/archive.py).
+RESERVATION_ARCHIVE_DAYS = 365
+
+# Log every create, update and delete of the properties, advertisements and reservations, served at /changes/ for
+# incremental syncs (see khanto/changes.py). Pages hold CHANGE_FEED_PAGE_SIZE entries by default, a page stops
+# before a gap in the entries younger than CHANGE_FEED_SETTLE_SECONDS, and `python3 manage.py compact_changes`
+# deletes the entries older than CHANGE_FEED_RETENTION_DAYS. Under ASGI, requests may wait up to
+# CHANGE_FEED_MAX_WAIT seconds for changes, and event streams last up to CHANGE_FEED_STREAM_TIMEOUT seconds, both
+# checking for changes every CHANGE_FEED_POLL_INTERVAL seconds.
+CHANGE_FEED = os.environ.get('CHANGE_FEED') == '1'
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_SETTLE_SECONDS = 2
+CHANGE_FEED_RETENTION_DAYS = 30
+CHANGE_FEED_MAX_WAIT = 60
+CHANGE_FEED_STREAM_TIMEOUT = 300
+CHANGE_FEED_POLL_INTERVAL = 1
+
+# Keep monthly totals of the reservations up to date on every reservation write, which the analytics endpoints
+# read instead of aggregating the reservations when the requested time frame is made of whole months (see
+# khanto/analytics.py). Run `python3 manage.py rebuild_analytics` after turning it on.
+ANALYTICS_ROLLUP = os.environ.get('ANALYTICS_ROLLUP') == '1'
+
+# Record the query count, database time, serialization time and response size of every request, sent back in
+# Server-Timing headers and exposed at /metrics (see khanto/metrics.py). When METRICS_PROFILE_SAMPLE_RATE is set
+# (from 0 to 1), that share of the requests is profiled and the profiles of the ones slower than
+# METRICS_PROFILE_SLOW_MS are written to METRICS_PROFILE_DIR. /metrics is only served to logged-in staff users,
+# and to requests sending METRICS_TOKEN (when set) in an "Authorization: Bearer" header.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_PROFILE_SAMPLE_RATE = float(os.environ.get('METRICS_PROFILE_SAMPLE_RATE', 0))
+METRICS_PROFILE_SLOW_MS = float(os.environ.get('METRICS_PROFILE_SLOW_MS', 500))
+METRICS_PROFILE_DIR = BASE_DIR / 'profiles'
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from . import availability_index, changes
+from .caching import bump_model_version
+from .models import Property, Advertisement, Reservation, ArchivedReservation, PropertyNightOccupancy
+from .models import ReservationRollup
+from .models import lock_properties, mark_reservations_changed
+
+"""
+This file currently provides the following signal receivers:
+- invalidating the read-through cache (see khanto/caching.py) whenever a cached model is saved or deleted
+  through the ORM. Changes made with QuerySet.update(), bulk_create() or bulk_update() don't send these signals
+  and must bump the model's version themselves;
+- keeping the availability index (see khanto/availability_index.py) current when reservations and properties are
+  saved or deleted through the ORM, under the same conditions;
+- releasing the stays of deleted reservations from the occupancy ledger and the analytics rollup, whether they
+  are deleted one by one, with QuerySet.delete() (e.g. from the admin panel) or along with their advertisement;
+- logging the properties, advertisements and reservations saved or deleted through the ORM in the change feed (see
+  khanto/changes.py), under the same conditions;
+- tuning every new SQLite connection with the PRAGMA statements in the SQLITE_PRAGMAS setting.
+"""
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def invalidate_cached_model(sender, **kwargs):
+    bump_model_version(sender)
+
+def indexed_stay(reservation):
+    return (reservation.advertisement.property_id, reservation.checkin_date, reservation.checkout_date,
+        reservation.guests)
+
+# Remember the stay an edited reservation had, which the index drops once the edit is committed.
+@receiver(pre_save, sender=Reservation)
+def read_indexed_stay(sender, instance, raw=False, **kwargs):
+    instance.indexed_stay = None
+    if raw or instance.pk is None or not availability_index.tracking():
+        return
+    instance.indexed_stay = Reservation.objects.filter(pk=instance.pk).values_list(
+        'advertisement__property_id', 'checkin_date', 'checkout_date', 'guests').first()
+
+@receiver(post_save, sender=Reservation)
+def index_saved_reservation(sender, instance, raw=False, **kwargs):
+    if not raw and availability_index.tracking():
+        availability_index.stay_saved(indexed_stay(instance), getattr(instance, 'indexed_stay', None))
+
+@receiver(post_delete, sender=Reservation)
+def index_deleted_reservation(sender, instance, **kwargs):
+    if availability_index.tracking():
+        availability_index.stay_deleted(indexed_stay(instance))
+
+# Whether a deletion started from a model's instance or queryset, and cascaded from there.
+def deleted_along(origin, model):
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+# Archived reservations are still counted by the ledger, but they are only deleted along with their advertisement,
+# whose rollup rows are deleted too. Reservations deleted along with their property leave nothing to release, its
+# ledger being deleted as well.
+@receiver(pre_delete, sender=Reservation)
+@receiver(pre_delete, sender=ArchivedReservation)
+def release_deleted_stay(sender, instance, origin=None, **kwargs):
+    if deleted_along(origin, Property):
+        return
+    property_id = instance.advertisement.property_id
+    lock_properties(property_id)
+    mark_reservations_changed(property_id)
+    PropertyNightOccupancy.objects.remove_stay(property_id, instance.checkin_date, instance.checkout_date,
+        instance.guests)
+    if sender is Reservation and not deleted_along(origin, Advertisement):
+        ReservationRollup.objects.record_later([instance], sign=-1)
+
+@receiver(post_save, sender=Property)
+def index_saved_property(sender, instance, raw=False, **kwargs):
+    if not raw:
+        availability_index.property_saved(instance.id, instance.guest_vacancies)
+
+@receiver(post_delete, sender=Property)
+def index_deleted_property(sender, instance, **kwargs):
+    availability_index.property_deleted(instance.id)
+
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=Advertisement)
+@receiver(post_save, sender=Reservation)
+def log_saved_change(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        changes.record(instance, 'created' if created else 'updated')
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Advertisement)
+@receiver(post_delete, sender=Reservation)
+def log_deleted_change(sender, instance, **kwargs):
+    changes.record(instance, 'deleted')
+
+# Archived reservations are only deleted along with their advertisement, and are reservations to the feed.
+@receiver(post_delete, sender=ArchivedReservation)
+def log_deleted_archived_reservation(sender, instance, **kwargs):
+    changes.record_many('reservation', [instance.pk], 'deleted')
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
@@ -0,0 +1,104 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .metrics import registry
+import datetime
+import time
+import traceback
+
+"""
+This file currently provides the background task queue (TASK_QUEUE setting), which takes the side effects of
+reservation writes, such as the analytics rollup, out of the requests. Tasks are rows of the Task table, written
+by enqueue() within the transaction of the write they follow, so they only become visible to the worker once that
+transaction commits, and are never lost nor run for a write that was rolled back. They are run by
+`python3 manage.py run_tasks`, without any broker:
+- the worker claims the oldest due task along with up to TASK_BATCH_SIZE due tasks of the same name, and hands
+  all of their payloads to the task's handler at once, so that e.g. the rollup rows of a batch are written with
+  a few queries;
+- claiming a task pushes its `run_after` date back by TASK_LEASE seconds, so tasks of a worker that died are
+  claimed again once that time is up, while other workers skip them (with SELECT ... FOR UPDATE SKIP LOCKED when
+  the database supports it);
+- a batch that succeeds is deleted. A batch whose handler raises is retried after TASK_RETRY_DELAY seconds,
+  doubled after every attempt, and is kept as failed, with its last error, after TASK_MAX_ATTEMPTS attempts;
+- the number of tasks and batches run, their duration and the time they waited in the queue are recorded per
+  task name (see khanto/metrics.py).
+
+Handlers are registered with the @handler('name') decorator and must accept a list of payloads.
+"""
+
+handlers = {}
+
+def enabled():
+    return getattr(settings, 'TASK_QUEUE', False)
+
+# Register a function as the handler of the tasks with the given name.
+def handler(name):
+    def register(function):
+        handlers[name] = function
+        return function
+    return register
+
+# Queue tasks with the given name and JSON serializable payloads, run once the current transaction commits. When
+# the queue is disabled, their handler runs straight away instead.
+def enqueue(name, payloads):
+    payloads = list(payloads)
+    if not payloads:
+        return
+    if not enabled():
+        handlers[name](payloads)
+        return
+    Task = apps.get_model('khanto', 'Task')
+    Task.objects.bulk_create([Task(name=name, payload=payload) for payload in payloads])
+
+# Claim a batch of due tasks of the same name, returning them in the order they were queued.
+def claim(batch_size=None):
+    Task = apps.get_model('khanto', 'Task')
+    batch_size = batch_size or getattr(settings, 'TASK_BATCH_SIZE', 100)
+    now = timezone.now()
+    with transaction.atomic():
+        due = Task.objects.select_for_update(skip_locked=True).filter(failed=False, run_after__lte=now) \
+            .order_by('run_after', 'id')
+        first = due.values_list('name', flat=True).first()
+        if first is None:
+            return []
+        ids = list(due.filter(name=first).values_list('id', flat=True)[:batch_size])
+        Task.objects.filter(id__in=ids).update(attempts=F('attempts') + 1,
+            run_after=now + datetime.timedelta(seconds=getattr(settings, 'TASK_LEASE', 300)))
+    return list(Task.objects.filter(id__in=ids).order_by('id'))
+
+# Run a batch of due tasks, returning the number of tasks run (0 when none was due).
+def run_batch(batch_size=None):
+    tasks = claim(batch_size)
+    if not tasks:
+        return 0
+    Task = apps.get_model('khanto', 'Task')
+    name = tasks[0].name
+    ids = [task.id for task in tasks]
+    start = time.perf_counter()
+    delay = sum((timezone.now() - task.creation_date).total_seconds() for task in tasks)
+    try:
+        with transaction.atomic():
+            handlers[name]([task.payload for task in tasks])
+            Task.objects.filter(id__in=ids).delete()
+    except Exception:
+        registry.record_tasks(name, len(tasks), time.perf_counter() - start, delay, failed=True)
+        retry(tasks, traceback.format_exc())
+        return len(tasks)
+    registry.record_tasks(name, len(tasks), time.perf_counter() - start, delay)
+    return len(tasks)
+
+# Schedule the next attempt of failed tasks, or give up on the ones that ran out of attempts.
+def retry(tasks, error):
+    Task = apps.get_model('khanto', 'Task')
+    max_attempts = getattr(settings, 'TASK_MAX_ATTEMPTS', 5)
+    now = timezone.now()
+    for attempts in {task.attempts for task in tasks}:
+        ids = [task.id for task in tasks if task.attempts == attempts]
+        if attempts >= max_attempts:
+            Task.objects.filter(id__in=ids).update(failed=True, last_error=error)
+        else:
+            delay = getattr(settings, 'TASK_RETRY_DELAY', 10) * 2 ** (attempts - 1)
+            Task.objects.filter(id__in=ids).update(last_error=error,
+                run_after=now + datetime.timedelta(seconds=delay))
@@ -0,0 +1,167 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from khanto import analytics
+from khanto.models import Property, Advertisement, Reservation, ReservationRollup
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+import datetime
+
+"""
+This file currently tests for:
+1 - Reporting the revenue per property, platform and advertisement, filtered by time
+    frame, property and platform (success expected);
+2 - Reporting the occupancy rate of each month (success expected);
+3 - Reporting the number of reservations and the average stay length (success
+    expected);
+4 - Computing each figure with a constant number of queries (success expected);
+5 - Rejecting invalid time frames and filters (error expected);
+6 - Reading the same figures from the rollup when it is enabled, keeping it up to date
+    when reservations are created, changed, deleted or imported in bulk, and rebuilding
+    it with the management command (success expected);
+"""
+
+class AnalyticsTest(TestCase):
+
+    # Where the figures are expected to be read from.
+    source = 'reservations'
+
+    # Setup user authentication for permissions and 2 properties with 3 reservations over January and February
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.properties = [
+            Property.objects.create(code=1, guest_vacancies=3, bathrooms=1, pets_allowed=True, cleaning_cost='10.00'),
+            Property.objects.create(code=2, guest_vacancies=2, bathrooms=1, pets_allowed=True, cleaning_cost='10.00'),
+        ]
+        self.advertisements = [
+            Advertisement.objects.create(property=self.properties[0], platform='Airbnb', platform_tax='10.00'),
+            Advertisement.objects.create(property=self.properties[0], platform='Booking', platform_tax='5.00'),
+            Advertisement.objects.create(property=self.properties[1], platform='Airbnb', platform_tax='20.00'),
+        ]
+        self.reservations = [
+            self.reserve(self.advertisements[0], '2023-01-30', '2023-02-02', '300.00', 2),
+            self.reserve(self.advertisements[1], '2023-02-10', '2023-02-12', '200.00', 1),
+            self.reserve(self.advertisements[2], '2023-01-05', '2023-01-06', '150.00', 2),
+        ]
+
+    def reserve(self, advertisement, checkin_date, checkout_date, total_cost, guests):
+        return Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+            checkout_date=checkout_date, total_cost=total_cost, comment='Test', guests=guests)
+
+    def get(self, figure, **query):
+        response = self.client.get('/analytics/{}/'.format(figure), dict({'from': '2023-01-01', 'to': '2023-02-28'},
+            **query))
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response.data['source'], self.source)
+        return response.data['results']
+
+    def test_revenue(self):
+        self.assertEqual(self.get('revenue'), [
+            {'property': self.properties[0].id, 'reservations': 2, 'revenue': '500.00', 'platform_taxes': '15.00',
+                'net_revenue': '485.00'},
+            {'property': self.properties[1].id, 'reservations': 1, 'revenue': '150.00', 'platform_taxes': '20.00',
+                'net_revenue': '130.00'},
+        ])
+        self.assertEqual(self.get('revenue', by='platform'), [
+            {'platform': 'Airbnb', 'reservations': 2, 'revenue': '450.00', 'platform_taxes': '30.00',
+                'net_revenue': '420.00'},
+            {'platform': 'Booking', 'reservations': 1, 'revenue': '200.00', 'platform_taxes': '5.00',
+                'net_revenue': '195.00'},
+        ])
+        self.assertEqual(self.get('revenue', by='advertisement', property=self.properties[0].id, platform='Booking'), [
+            {'advertisement': self.advertisements[1].id, 'property': self.properties[0].id, 'platform': 'Booking',
+                'reservations': 1, 'revenue': '200.00', 'platform_taxes': '5.00', 'net_revenue': '195.00'},
+        ])
+
+        # Revenue is attributed to the month of the check-in date.
+        self.assertEqual([row['revenue'] for row in self.get('revenue', to='2023-01-31')], ['300.00', '150.00'])
+
+    def test_occupancy(self):
+        self.assertEqual(self.get('occupancy'), [
+            {'month': '2023-01', 'guest_nights': 8, 'capacity': 155, 'occupancy_rate': 0.0516},
+            {'month': '2023-02', 'guest_nights': 7, 'capacity': 140, 'occupancy_rate': 0.05},
+        ])
+        self.assertEqual(self.get('occupancy', property=self.properties[1].id), [
+            {'month': '2023-01', 'guest_nights': 4, 'capacity': 62, 'occupancy_rate': 0.0645},
+            {'month': '2023-02', 'guest_nights': 0, 'capacity': 56, 'occupancy_rate': 0.0},
+        ])
+
+    def test_stays(self):
+        self.assertEqual(self.get('stays'), [
+            {'property': self.properties[0].id, 'reservations': 2, 'nights': 5, 'average_stay': 2.5},
+            {'property': self.properties[1].id, 'reservations': 1, 'nights': 1, 'average_stay': 1.0},
+        ])
+        self.assertEqual(self.get('stays', by='platform', platform='Airbnb'), [
+            {'platform': 'Airbnb', 'reservations': 2, 'nights': 4, 'average_stay': 2.0},
+        ])
+
+    def test_query_count(self):
+        first_day, last_day = datetime.date(2023, 1, 1), datetime.date(2023, 2, 28)
+        with self.assertNumQueries(1):
+            analytics.revenue(first_day, last_day, by='advertisement')
+        with self.assertNumQueries(2):
+            analytics.occupancy(first_day, last_day)
+        with self.assertNumQueries(1):
+            analytics.stays(first_day, last_day)
+
+    def test_invalid_query(self):
+        for query in ({'from': '2023-02-01', 'to': '2023-01-31'}, {'from': '2013-01-01', 'to': '2023-01-31'},
+                {'by': 'guests'}, {'property': 'one'}):
+            response = self.client.get('/analytics/revenue/', query)
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        response = self.client.get('/analytics/occupancy/', {'platform': 'Airbnb'})
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertNotIn('platform', response.data)
+
+@override_settings(ANALYTICS_ROLLUP=True)
+class AnalyticsRollupTest(AnalyticsTest):
+    source = 'rollup'
+
+    # Figures of the time frame, read from the reservations and from the rollup.
+    def figures(self, first_day=datetime.date(2023, 1, 1), last_day=datetime.date(2023, 3, 31)):
+        with override_settings(ANALYTICS_ROLLUP=False):
+            expected = [analytics.revenue(first_day, last_day, by='advertisement')[1],
+                analytics.occupancy(first_day, last_day)[1],
+                analytics.stays(first_day, last_day, by='advertisement')[1]]
+        actual = [analytics.revenue(first_day, last_day, by='advertisement')[1],
+            analytics.occupancy(first_day, last_day)[1],
+            analytics.stays(first_day, last_day, by='advertisement')[1]]
+        return expected, actual
+
+    def test_rollup_updates(self):
+        reservation = self.reservations[0]
+        reservation.checkin_date = datetime.date(2023, 2, 20)
+        reservation.checkout_date = datetime.date(2023, 3, 2)
+        reservation.total_cost = '900.00'
+        reservation.save()
+        self.reservations[2].delete()
+        self.client.post('/reservations/bulk/', [{"advertisement": self.advertisements[2].id,
+            "checkin_date": "2023-03-30", "checkout_date": "2023-04-01", "total_cost": "100.00", "comment": "Test",
+            "guests": 1}], format='json')
+        expected, actual = self.figures()
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual[2], [
+            {'advertisement': self.advertisements[0].id, 'property': self.properties[0].id, 'platform': 'Airbnb',
+                'reservations': 1, 'nights': 10, 'average_stay': 10.0},
+            {'advertisement': self.advertisements[1].id, 'property': self.properties[0].id, 'platform': 'Booking',
+                'reservations': 1, 'nights': 2, 'average_stay': 2.0},
+            {'advertisement': self.advertisements[2].id, 'property': self.properties[1].id, 'platform': 'Airbnb',
+                'reservations': 1, 'nights': 2, 'average_stay': 2.0},
+        ])
+
+    def test_partial_months(self):
+        source, results = analytics.revenue(datetime.date(2023, 1, 15), datetime.date(2023, 2, 28))
+        self.assertEqual(source, 'reservations')
+
+    def test_rebuild(self):
+        ReservationRollup.objects.all().delete()
+        call_command('rebuild_analytics', stdout=StringIO())
+        expected, actual = self.figures()
+        self.assertEqual(actual, expected)
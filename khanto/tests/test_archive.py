@@ -0,0 +1,139 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from khanto import analytics
+from khanto.availability_index import index
+from khanto.models import Property, Advertisement, Reservation, ArchivedReservation, Change
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+import datetime
+import json
+
+"""
+This file currently tests for:
+1 - Archiving the reservations checked out before a date, and reading them with
+    ?include_archived=true only (success expected);
+2 - Using the code of an archived reservation for a new one, through the API, the bulk
+    import and the ORM (error expected);
+3 - Keeping the archived reservations in the occupancy ledger, the analytics, the
+    availability index of a running server and the change feed (success expected);
+4 - Sending an invalid include_archived parameter (error expected);
+"""
+
+class ArchiveTest(TestCase):
+
+    # Setup user authentication for permissions and a property with reservations in 2022 and 2023
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+        for checkin_date in ('2022-03-01', '2022-12-30', '2023-01-05'):
+            Reservation.objects.create(advertisement=self.advertisement, checkin_date=checkin_date,
+                checkout_date=datetime.date.fromisoformat(checkin_date) + datetime.timedelta(days=2),
+                total_cost='100.00', comment='Test', guests=2)
+
+    def archive(self):
+        call_command('archive_reservations', before=datetime.date(2023, 1, 1), stdout=StringIO())
+
+    def reserve(self, code):
+        return self.client.post('/reservations/', data=json.dumps({
+            "advertisement":self.advertisement.id,
+            "code":code,
+            "checkin_date":"2023-02-06",
+            "checkout_date":"2023-02-08",
+            "total_cost":"100.00",
+            "comment":"Test",
+            "guests":1
+        }), content_type='application/json')
+
+    def test_archive(self):
+        listed = self.client.get('/reservations/', HTTP_ACCEPT='application/json').data['results']
+        self.archive()
+        self.assertEqual(ArchivedReservation.objects.count(), 1)
+        self.assertEqual(list(Reservation.objects.order_by('checkin_date').values_list('checkin_date', flat=True)),
+            [datetime.date(2022, 12, 30), datetime.date(2023, 1, 5)])
+
+        # Archived reservations keep their ID and representation, and are only read when asked for.
+        response = self.client.get('/reservations/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.data['results'], listed[1:])
+        response = self.client.get('/reservations/?include_archived=true&page_size=2',
+            HTTP_ACCEPT='application/json')
+        self.assertEqual(response.data['results'], listed[:2])
+        self.assertEqual(self.client.get(response.data['next']).data['results'], listed[2:])
+        archived = listed[0]['id']
+        self.assertEqual(self.client.get('/reservations/{}/'.format(archived)).status_code,
+            HTTPStatus.NOT_FOUND._value_)
+        response = self.client.get('/reservations/{}/?include_archived=true&expand=advertisement'.format(archived))
+        self.assertEqual(response.data['advertisement']['id'], self.advertisement.id)
+        response = self.client.get('/reservations/?include_archived=true&checkout_date=2022-03-03',
+            HTTP_ACCEPT='application/json')
+        self.assertEqual([reservation['id'] for reservation in response.data['results']], [archived])
+        response = self.client.get('/reservations/export/?include_archived=1')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+        # They are read-only.
+        response = self.client.delete('/reservations/{}/?include_archived=true'.format(archived))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND._value_)
+
+    def test_unique_codes(self):
+        # A reservation with a legacy code, which clients may send.
+        code = 12345
+        Reservation.objects.filter(checkin_date='2022-03-01').update(code=code)
+        self.archive()
+        response = self.reserve(code)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertEqual(list(response.data), ['code'])
+        response = self.client.post('/reservations/bulk/', [{'advertisement': self.advertisement.id, 'code': code,
+            'checkin_date': '2023-02-06', 'checkout_date': '2023-02-08', 'total_cost': '100.00', 'comment': 'Test',
+            'guests': 1}], format='json')
+        self.assertEqual(list(response.data['results'][0]['errors']), ['code'])
+        with self.assertRaises(ValidationError) as error:
+            Reservation.objects.create(advertisement=self.advertisement, code=code, checkin_date='2023-02-06',
+                checkout_date='2023-02-08', total_cost='100.00', comment='Test', guests=1)
+        self.assertEqual(list(error.exception.message_dict), ['code'])
+        self.assertEqual(self.reserve(code + 1).status_code, HTTPStatus.CREATED._value_)
+
+    @override_settings(CHANGE_FEED=True, CHANGE_FEED_SETTLE_SECONDS=0)
+    def test_history_kept(self):
+        first_day, last_day = datetime.date(2022, 1, 1), datetime.date(2023, 12, 31)
+        revenue = analytics.revenue(first_day, last_day)
+        stays = analytics.stays(first_day, last_day)
+        reservation = Reservation.objects.get(checkin_date='2022-03-01')
+        reservation.comment = 'Edited'
+        reservation.save()
+        latest = Change.objects.latest('id').id
+        archived = reservation.id
+        index.load()
+        self.addCleanup(index.reset)
+        self.archive()
+
+        self.assertEqual(analytics.revenue(first_day, last_day), revenue)
+        self.assertEqual(analytics.stays(first_day, last_day), stays)
+        call_command('rebuild_occupancy', check=True, stdout=StringIO())
+        self.assertEqual(index.verify(), [])
+        self.assertEqual(index.peak(self.property.id, datetime.date(2022, 3, 1), datetime.date(2022, 3, 3)), 2)
+        self.assertFalse(Change.objects.filter(id__gt=latest).exists())
+        page = self.client.get('/changes/', HTTP_ACCEPT='application/json').data
+        self.assertEqual([(change['model'], change['action'], change['id'], change['data']['comment'])
+            for change in page['changes']], [('reservation', 'updated', archived, 'Edited')])
+
+        # Deleting the property deletes its archived reservations too.
+        self.property.delete()
+        self.assertFalse(ArchivedReservation.objects.exists())
+        self.assertIn(('reservation', archived, 'deleted'),
+            Change.objects.filter(id__gt=latest).values_list('model', 'object_id', 'action'))
+
+    def test_invalid_parameter(self):
+        response = self.client.get('/reservations/?include_archived=maybe')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertEqual(list(response.data), ['include_archived'])
@@ -0,0 +1,92 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import resolve
+from khanto import async_views
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+"""
+This file currently tests for:
+1 - Answering the property retrieve, availability, calendar and reservation list
+    endpoints with their async views exactly like the synchronous API (success
+    expected);
+2 - Retrieving a missing Property model instance through its async view (error
+    expected);
+3 - Reading the async endpoints without authentication (error expected);
+4 - Creating a Reservation model instance through the URL of an async view, which
+    hands it to the synchronous API (success expected);
+5 - Keeping the headers and cookies of the responses rendered by the async views
+    (success expected);
+"""
+
+class AsyncViewsTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a reservation
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client.force_login(self.user)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+        Reservation.objects.create(advertisement=self.advertisement, checkin_date='2023-01-02',
+            checkout_date='2023-01-03', total_cost='100.00', comment='Test', guests=2)
+
+    @override_settings(ROOT_URLCONF='khanto.async_urls')
+    def async_get(self, url, client=None):
+        return async_to_sync((client or self.async_client).get)(url, HTTP_ACCEPT='application/json')
+
+    def test_async_responses(self):
+        urls = {
+            '/properties/{}/'.format(self.property.id): async_views.property_detail,
+            '/properties/available/?checkin=2023-01-01&checkout=2023-01-02&guests=2': async_views.property_available,
+            '/properties/{}/calendar/?from=2023-01-01&to=2023-01-05'.format(self.property.id):
+                async_views.property_calendar,
+            '/reservations/?expand=advertisement.property&page_size=1': async_views.reservation_list,
+        }
+        for url, view in urls.items():
+            self.assertIs(resolve(url.split('?')[0], urlconf='khanto.async_urls').func, view)
+            cache.clear()
+            expected = self.client.get(url, HTTP_ACCEPT='application/json')
+            cache.clear()
+            response = self.async_get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+            self.assertEqual(response.content, expected.content)
+
+    def test_async_missing_instance(self):
+        response = self.async_get('/properties/0/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND._value_)
+
+    def test_async_unauthenticated(self):
+        response = self.async_get('/reservations/', client=AsyncClient())
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN._value_)
+
+    @override_settings(ROOT_URLCONF='khanto.async_urls')
+    def test_async_fallback(self):
+        response = async_to_sync(self.async_client.post)('/reservations/', {'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-05', 'checkout_date': '2023-01-06', 'total_cost': '100.00',
+            'comment': 'Test', 'guests': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_async_rendered_cookies(self):
+        response = Response({'id': 1}, headers={'Retry-After': '1'})
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = 'application/json'
+        response.renderer_context = {}
+        response.set_cookie('csrftoken', 'token')
+        plain = async_views.rendered(response)
+        self.assertEqual(plain.content, b'{"id":1}')
+        self.assertEqual(plain['Retry-After'], '1')
+        self.assertEqual(plain.cookies['csrftoken'].value, 'token')
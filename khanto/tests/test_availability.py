@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+
+"""
+This file currently tests for:
+1 - Searching the properties able to host a number of guests between two dates,
+    with a single query (success expected);
+2 - Searching available properties that allow pets (success expected);
+3 - Searching available properties with a check-in date later than the check-out
+    date (error expected);
+"""
+
+class AvailabilityTest(TestCase):
+
+    # Setup user authentication for permissions and four properties:
+    # 1 - 3 vacancies, 2 of them taken from 2023-01-06 to 2023-01-07;
+    # 2 - 5 vacancies, all of them taken from 2023-01-08 to 2023-01-08;
+    # 3 - 2 vacancies, no reservations, no pets allowed;
+    # 4 - 1 vacancy, no reservations.
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        reservations = {1: ('2023-01-06', '2023-01-07', 2), 2: ('2023-01-08', '2023-01-08', 5)}
+        for code, vacancies, pets_allowed in ((1, 3, True), (2, 5, True), (3, 2, False), (4, 1, True)):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=vacancies, bathrooms=1,
+                pets_allowed=pets_allowed, cleaning_cost='10.00')
+            advertisement = Advertisement.objects.create(property=reserved_property, platform='TestPlatform1',
+                platform_tax='10.00')
+            if code in reservations:
+                checkin_date, checkout_date, guests = reservations[code]
+                Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+                    checkout_date=checkout_date, total_cost='100.00', comment='Test', guests=guests)
+
+    def search(self, query):
+        response = self.client.get('/properties/available/?' + query)
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        return [result['code'] for result in response.data['results']]
+
+    def test_available(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search('checkin=2023-01-05&checkout=2023-01-09&guests=1'), [1, 3, 4])
+        self.assertEqual(self.search('checkin=2023-01-05&checkout=2023-01-09&guests=2'), [3])
+        self.assertEqual(self.search('checkin=2023-01-01&checkout=2023-01-05&guests=2'), [1, 2, 3])
+        self.assertEqual(self.search('checkin=2023-01-07&checkout=2023-01-07&guests=3'), [2])
+
+    def test_available_pets_allowed(self):
+        self.assertEqual(self.search('checkin=2023-01-05&checkout=2023-01-09&guests=1&pets_allowed=true'), [1, 4])
+
+    def test_available_invalid_dates(self):
+        response = self.client.get('/properties/available/?checkin=2023-01-09&checkout=2023-01-05&guests=1')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
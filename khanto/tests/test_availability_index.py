@@ -0,0 +1,172 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from khanto.availability_index import PropertyStays, index
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import datetime
+import json
+import random
+
+"""
+This file currently tests for:
+1 - Finding the largest number of guests over any time frame after stays are added
+    and removed in any order (success expected);
+2 - Rejecting new and edited reservations that exceed the vacancies of a property
+    against the occupancy ledger with the availability index enabled, even when the
+    index misses stays written by another process (error expected for the overbooked
+    ones, success expected for the others);
+3 - Keeping the index current when reservations are created, edited, deleted and
+    imported in bulk, removals only counting once committed (success expected);
+4 - Searching the available properties with the same results as the occupancy
+    ledger (success expected);
+5 - Reporting and repairing drift between the index and the database (success
+    expected);
+"""
+
+@override_settings(AVAILABILITY_INDEX=True)
+class AvailabilityIndexTest(TestCase):
+
+    # Setup user authentication for permissions and a property with 3 vacancies and a single advertisement
+    def setUp(self):
+        index.reset()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+
+        # Loaded when the server starts (see warm()).
+        index.load()
+
+    def tearDown(self):
+        index.reset()
+
+    def reserve(self, checkin_date, checkout_date, guests):
+        return self.client.post('/reservations/', data=json.dumps({
+            "advertisement":self.advertisement.id,
+            "checkin_date":checkin_date,
+            "checkout_date":checkout_date,
+            "total_cost":"100.00",
+            "comment":"Test",
+            "guests":guests
+        }), content_type='application/json')
+
+    def peak(self, first_night, last_night):
+        return index.peak(self.property.id, datetime.date.fromisoformat(first_night),
+            datetime.date.fromisoformat(last_night))
+
+    def test_property_stays(self):
+        generator = random.Random(0)
+        stays, nights = PropertyStays(), [0] * 60
+        added = []
+        for _ in range(300):
+            if added and generator.random() < 0.4:
+                first, last, guests = added.pop(generator.randrange(len(added)))
+                guests = -guests
+            else:
+                first = generator.randrange(50)
+                last = first + generator.randrange(8)
+                guests = generator.randint(1, 4)
+                added.append((first, last, guests))
+            stays.add(first, last, guests)
+            for night in range(first, last + 1):
+                nights[night] += guests
+            first = generator.randrange(60)
+            last = first + generator.randrange(10)
+            self.assertEqual(stays.peak(first, last), max(nights[first:last + 1]))
+        self.assertEqual(stays, PropertyStays.from_stays(added))
+
+    def test_reservation_validation(self):
+        self.assertEqual(self.reserve('2023-01-06', '2023-01-08', 2).status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(self.peak('2023-01-01', '2023-01-31'), 2)
+
+        for checkin_date, checkout_date, field in (('2023-01-07', '2023-01-09', 'checkin_date'),
+                ('2023-01-02', '2023-01-06', 'checkout_date'), ('2023-01-01', '2023-01-31', 'checkin_date')):
+            with self.assertRaises(ValidationError) as error:
+                self.reserve(checkin_date, checkout_date, 2)
+            self.assertEqual(list(error.exception.message_dict), [field])
+        self.assertEqual(self.reserve('2023-01-07', '2023-01-09', 1).status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(self.peak('2023-01-01', '2023-01-31'), 3)
+
+        # An edited reservation doesn't count against itself.
+        reservation = Reservation.objects.get(guests=2)
+        reservation.checkout_date = datetime.date(2023, 1, 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.save()
+        self.assertEqual(self.peak('2023-01-08', '2023-01-08'), 1)
+        reservation.guests = 3
+        with self.assertRaises(ValidationError):
+            reservation.save()
+
+        # Stays the index misses, as when they were booked through another process, are still counted.
+        index.remove_stay(self.property.id, datetime.date(2023, 1, 7), datetime.date(2023, 1, 9), 1)
+        self.assertEqual(self.peak('2023-01-08', '2023-01-08'), 0)
+        with self.assertRaises(ValidationError) as error:
+            self.reserve('2023-01-08', '2023-01-08', 3)
+        self.assertEqual(list(error.exception.message_dict), ['checkin_date'])
+
+    def test_removals_once_committed(self):
+        self.reserve('2023-01-06', '2023-01-08', 3)
+        reservation = Reservation.objects.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            reservation.delete()
+        self.assertEqual(self.peak('2023-01-06', '2023-01-08'), 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.peak('2023-01-06', '2023-01-08'), 0)
+        self.assertEqual(self.reserve('2023-01-06', '2023-01-08', 3).status_code, HTTPStatus.CREATED._value_)
+
+        response = self.client.post('/reservations/bulk/', [{'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-10', 'checkout_date': '2023-01-12', 'total_cost': '100.00', 'comment': 'Test',
+            'guests': 2}], format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(self.peak('2023-01-11', '2023-01-11'), 2)
+        self.assertEqual(index.verify(), [])
+
+        # Deleting the property drops it from the index.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.delete()
+        self.assertEqual(self.peak('2023-01-01', '2023-01-31'), 0)
+        self.assertNotIn(self.property.id, index.properties)
+
+    def test_available(self):
+        for code, vacancies in ((2, 5), (3, 2)):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=vacancies, bathrooms=1,
+                pets_allowed=True, cleaning_cost='10.00')
+            Advertisement.objects.create(property=reserved_property, platform='TestPlatform1', platform_tax='10.00')
+        self.reserve('2023-01-06', '2023-01-07', 2)
+        Reservation.objects.create(advertisement=Advertisement.objects.get(property__code=2),
+            checkin_date='2023-01-08', checkout_date='2023-01-08', total_cost='100.00', comment='Test', guests=5)
+
+        for checkin_date, checkout_date, guests in (('2023-01-05', '2023-01-09', 1), ('2023-01-05', '2023-01-09', 2),
+                ('2023-01-01', '2023-01-05', 2), ('2023-01-07', '2023-01-07', 3)):
+            query = 'checkin={}&checkout={}&guests={}'.format(checkin_date, checkout_date, guests)
+            searches = []
+            for enabled in (True, False):
+                with self.settings(AVAILABILITY_INDEX=enabled):
+                    response = self.client.get('/properties/available/?' + query)
+                searches.append([result['code'] for result in response.data['results']])
+            self.assertEqual(searches[0], searches[1])
+        self.assertEqual(searches[0], [2])
+
+    def test_verify(self):
+        self.reserve('2023-01-06', '2023-01-08', 2)
+
+        # Rows written in bulk skip the signals, so the index drifts until it is repaired.
+        Reservation.objects.bulk_create([Reservation(advertisement=self.advertisement, code=999,
+            checkin_date='2023-01-07', checkout_date='2023-01-07', total_cost='100.00', comment='Test', guests=1)])
+        Property.objects.filter(pk=self.property.pk).update(guest_vacancies=4)
+        self.assertEqual(index.verify(repair=True), [self.property.id])
+        self.assertEqual(self.peak('2023-01-07', '2023-01-07'), 2)
+        self.assertEqual(index.verify(repair=True), [self.property.id])
+        self.assertEqual(self.peak('2023-01-07', '2023-01-07'), 3)
+        self.assertEqual(index.capacities[self.property.id], 4)
+        self.assertEqual(index.verify(), [])
@@ -0,0 +1,117 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from khanto.models import CodeSequence, Property, Advertisement, Reservation, PropertyNightOccupancy
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+import json
+import os
+import tempfile
+
+"""
+This file currently tests for:
+1 - Importing a batch of reservations through the API, reporting the result of each
+    one, rejecting the ones without vacancies, invalid fields, unknown advertisements
+    or duplicate codes, and keeping the occupancy ledger up to date (success expected
+    for the valid reservations, error expected for the others);
+2 - Importing a batch with a constant number of queries, no matter its size, reserving
+    its codes before locking its properties (success expected);
+3 - Importing reservations from an NDJSON file with the management command (success
+    expected);
+"""
+
+class BulkImportTest(TestCase):
+
+    # Setup user authentication for permissions and a property with 3 vacancies and 2 advertisements
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisements = [Advertisement.objects.create(property=self.property, platform=platform,
+            platform_tax='10.00') for platform in ('TestPlatform1', 'TestPlatform2')]
+        Reservation.objects.create(advertisement=self.advertisements[0], code=1, checkin_date='2023-01-06',
+            checkout_date='2023-01-07', total_cost='100.00', comment='Test', guests=2)
+
+    def item(self, checkin_date, checkout_date, guests, advertisement=None, **fields):
+        return dict({
+            "advertisement":advertisement or self.advertisements[1].id,
+            "checkin_date":checkin_date,
+            "checkout_date":checkout_date,
+            "total_cost":"100.00",
+            "comment":"Test",
+            "guests":guests
+        }, **fields)
+
+    def test_bulk_import(self):
+        items = [
+            self.item('2023-01-01', '2023-01-02', 3),
+            self.item('2023-01-05', '2023-01-06', 2),
+            self.item('2023-01-07', '2023-01-08', 1),
+            self.item('2023-01-08', '2023-01-09', 3),
+            self.item('2023-01-10', '2023-01-09', 1),
+            self.item('2023-01-10', '2023-01-11', 1, advertisement=999),
+            self.item('2023-01-10', '2023-01-11', 1, code=1),
+            self.item('2023-01-12', '2023-01-12', 1, code=5),
+            self.item('2023-01-13', '2023-01-13', 1, code=5),
+        ]
+        response = self.client.post('/reservations/bulk/', data=json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual((response.data['created'], response.data['errors']), (3, 6))
+        statuses = [(result['status'], list(result.get('errors', {}))) for result in response.data['results']]
+        self.assertEqual(statuses, [
+            ('created', []),
+            ('error', ['checkout_date']),
+            ('created', []),
+            ('error', ['checkin_date']),
+            ('error', ['checkin_date']),
+            ('error', ['advertisement']),
+            ('error', ['code']),
+            ('created', []),
+            ('error', ['code']),
+        ])
+        self.assertEqual(Reservation.objects.count(), 4)
+        self.assertEqual(response.data['results'][7]['code'], 5)
+
+        # The ledger now matches the reservations.
+        call_command('rebuild_occupancy', check=True, stdout=StringIO())
+
+    def test_bulk_import_queries(self):
+        CodeSequence.objects.create(name='reservation')
+        for count in (10, 50):
+            items = [self.item('2024-01-%02d' % (day % 28 + 1), '2024-01-%02d' % (day % 28 + 1), 1)
+                for day in range(count)]
+            PropertyNightOccupancy.objects.filter(night__year=2024).delete()
+            Reservation.objects.filter(checkin_date__year=2024).delete()
+
+            # Advertisements, property lock and change date, ledger read and inserts, code counter and reservations,
+            # along with the savepoints of the transaction and of the code counter.
+            with self.assertNumQueries(13) as queries:
+                response = self.client.post('/reservations/bulk/', data=json.dumps(items),
+                    content_type='application/json')
+            self.assertEqual(response.data['created'], count)
+
+            # The codes are reserved before the import's transaction, so the counter isn't held while the
+            # properties are locked.
+            statements = [query['sql'] for query in queries.captured_queries]
+            first_lock = min(index for index, sql in enumerate(statements) if 'khanto_property' in sql)
+            self.assertTrue(all(index < first_lock for index, sql in enumerate(statements)
+                if 'khanto_codesequence' in sql))
+
+    def test_import_command(self):
+        items = [self.item('2023-02-01', '2023-02-02', 1), self.item('2023-02-01', '2023-02-02', 3)]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as file:
+            file.write('\n'.join(json.dumps(item) for item in items))
+        try:
+            out = StringIO()
+            call_command('import_reservations', file.name, stdout=out)
+        finally:
+            os.remove(file.name)
+        self.assertIn('Imported 1 reservations, 1 failed.', out.getvalue())
+        self.assertEqual(Reservation.objects.filter(checkin_date='2023-02-01').count(), 1)
@@ -0,0 +1,101 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from khanto.caching import cache_statistics
+from khanto.models import Property, Advertisement
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import json
+
+"""
+This file currently tests for:
+1 - Serving the Property list and retrieve responses from the cache without querying
+    the database (success expected);
+2 - Invalidating cached Property responses when a property is created, edited or
+    deleted (success expected);
+3 - Invalidating cached Advertisement responses embedding a property when that
+    property is edited (success expected);
+4 - Validating reservations against a cached advertisement, until it is edited
+    (success expected);
+"""
+
+class CachingTest(TestCase):
+
+    # Setup user authentication for permissions and a property with an advertisement
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        return response, json.loads(response.content)
+
+    def test_cached_responses(self):
+        for url in ['/properties/', '/properties/{}/'.format(self.property.id)]:
+            response, data = self.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS')
+            hits = cache_statistics()['responses']['hit']
+            with self.assertNumQueries(0):
+                cached_response, cached_data = self.get(url)
+            self.assertEqual(cached_response['X-Cache'], 'HIT')
+            self.assertEqual(cached_data, data)
+            self.assertEqual(cache_statistics()['responses']['hit'], hits + 1)
+
+    def test_property_invalidation(self):
+        detail_url = '/properties/{}/'.format(self.property.id)
+        self.get('/properties/')
+        self.get(detail_url)
+
+        self.client.post('/properties/', {'code': 2, 'guest_vacancies': 1, 'bathrooms': 1,
+            'pets_allowed': False, 'cleaning_cost': '5.00'})
+        response, data = self.get('/properties/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(data['results']), 2)
+
+        self.property.bathrooms = 2
+        self.property.save()
+        response, data = self.get(detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(data['bathrooms'], 2)
+
+        self.property.delete()
+        self.assertEqual(self.client.get(detail_url).status_code, HTTPStatus.NOT_FOUND._value_)
+
+    def test_advertisement_invalidation(self):
+        url = '/advertisements/?expand=property'
+        self.get(url)
+        self.property.bathrooms = 2
+        self.property.save()
+        response, data = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(data['results'][0]['property']['bathrooms'], 2)
+
+    def test_cached_validation_lookup(self):
+        reservation = {'advertisement': self.advertisement.id, 'checkin_date': '2023-01-01',
+            'checkout_date': '2023-01-01', 'total_cost': '100.00', 'comment': 'Test', 'guests': 1}
+        self.assertEqual(self.client.post('/reservations/', reservation).status_code,
+            HTTPStatus.CREATED._value_)
+        misses = cache_statistics()['instances']['miss']
+        reservation['checkin_date'] = reservation['checkout_date'] = '2023-01-02'
+        self.assertEqual(self.client.post('/reservations/', reservation).status_code,
+            HTTPStatus.CREATED._value_)
+        self.assertEqual(cache_statistics()['instances']['miss'], misses)
+
+        # Editing the advertisement makes the next lookup read it again.
+        self.advertisement.platform_tax = '20.00'
+        self.advertisement.save()
+        reservation['checkin_date'] = reservation['checkout_date'] = '2023-01-03'
+        self.assertEqual(self.client.post('/reservations/', reservation).status_code,
+            HTTPStatus.CREATED._value_)
+        self.assertEqual(cache_statistics()['instances']['miss'], misses + 1)
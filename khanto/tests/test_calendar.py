@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+
+"""
+This file currently tests for:
+1 - Retrieving the availability calendar of a Property model instance (success
+    expected);
+2 - Revalidating a calendar with its ETag or its Last-Modified date (not modified
+    expected), and again after a reservation was created or deleted (success expected);
+3 - Serving a cached calendar without reading the occupancy ledger again, until a
+    reservation is created (success expected);
+4 - Retrieving a calendar ending before it starts (error expected);
+"""
+
+class CalendarTest(TestCase):
+
+    # Setup user authentication for permissions and a property with 3 vacancies, 2 of them taken on 2023-01-02
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+        self.reservation = self.reserve('2023-01-02', 2)
+        self.url = '/properties/{}/calendar/?from=2023-01-01&to=2023-01-03'.format(self.property.id)
+
+    def reserve(self, night, guests):
+        return Reservation.objects.create(advertisement=self.advertisement, checkin_date=night,
+            checkout_date=night, total_cost='100.00', comment='Test', guests=guests)
+
+    def test_calendar(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response.data['nights'], [
+            {'date': '2023-01-01', 'vacancies': 3},
+            {'date': '2023-01-02', 'vacancies': 1},
+            {'date': '2023-01-03', 'vacancies': 3}])
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_calendar_revalidation(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED._value_)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+            HTTPStatus.NOT_MODIFIED._value_)
+
+        # Creating and deleting reservations changes the calendar's ETag.
+        self.reserve('2023-01-03', 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response.data['nights'][2]['vacancies'], 2)
+
+        etag = response['ETag']
+        self.reservation.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response.data['nights'][1]['vacancies'], 3)
+
+    def test_calendar_cache(self):
+        self.client.get(self.url)
+
+        # Only the property is read while the calendar is cached.
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        self.reserve('2023-01-01', 1)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['nights'][0]['vacancies'], 2)
+
+    def test_calendar_invalid_time_frame(self):
+        response = self.client.get('/properties/{}/calendar/?from=2023-01-03&to=2023-01-01'.format(self.property.id))
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
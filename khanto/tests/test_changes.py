@@ -0,0 +1,183 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from khanto.models import Property, Advertisement, Reservation, Change, ChangeFeedHorizon, CodeSequence
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+import datetime
+import json
+
+"""
+This file currently tests for:
+1 - Logging the properties, advertisements and reservations created, edited, deleted
+    and imported in bulk, and reading them back from the change feed with the current
+    state of each object, page by page (success expected);
+2 - Stopping a page before a recent gap in the change IDs (success expected);
+3 - Compacting the feed, keeping the ID of the entries deleted by the retention apart
+    from the reservation code counters, and resuming from a cursor older than them
+    (error expected);
+4 - Reading the feed while it is disabled (error expected);
+5 - Waiting for changes and streaming them as Server-Sent Events under ASGI (success
+    expected);
+"""
+
+@override_settings(CHANGE_FEED=True, CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a single advertisement
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+
+    def reserve(self, checkin_date, checkout_date, guests):
+        return self.client.post('/reservations/', data=json.dumps({
+            "advertisement":self.advertisement.id,
+            "checkin_date":checkin_date,
+            "checkout_date":checkout_date,
+            "total_cost":"100.00",
+            "comment":"Test",
+            "guests":guests
+        }), content_type='application/json')
+
+    def feed(self, query=''):
+        return self.client.get('/changes/?' + query, HTTP_ACCEPT='application/json')
+
+    def summary(self, page):
+        return [(change['model'], change['action'], change['id']) for change in page['changes']]
+
+    def test_feed(self):
+        start = self.feed().data['next']
+        self.assertEqual(start, Change.objects.latest('id').id)
+        first = self.reserve('2023-01-06', '2023-01-08', 2).data['id']
+        second = self.reserve('2023-01-10', '2023-01-12', 1).data['id']
+        reservation = Reservation.objects.get(pk=first)
+        reservation.guests = 3
+        reservation.save()
+        self.client.delete('/reservations/{}/'.format(second))
+        self.property.bathrooms = 2
+        self.property.save()
+        response = self.client.post('/reservations/bulk/', [{'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-20', 'checkout_date': '2023-01-21', 'total_cost': '50.00', 'comment': 'Test',
+            'guests': 2}], format='json')
+        imported = response.data['results'][0]['id']
+
+        # The second reservation was created and deleted within the page, so it is left out.
+        page = self.feed('since={}'.format(start)).data
+        self.assertEqual(self.summary(page), [('reservation', 'created', first),
+            ('property', 'updated', self.property.id), ('reservation', 'created', imported)])
+        self.assertEqual(page['changes'][0]['data'], self.client.get('/reservations/{}/'.format(first)).data)
+        self.assertEqual(page['changes'][1]['data']['bathrooms'], 2)
+        self.assertEqual(page['next'], Change.objects.latest('id').id)
+        self.assertFalse(page['has_more'])
+
+        # Smaller pages hold the changes of their own entries, the deleted reservation being left out of the first
+        # one as it no longer exists.
+        page = self.feed('since={}&limit=3'.format(start)).data
+        self.assertEqual(self.summary(page), [('reservation', 'created', first)])
+        self.assertTrue(page['has_more'])
+        page = self.feed('since={}&limit=3'.format(page['next'])).data
+        self.assertEqual(self.summary(page), [('reservation', 'deleted', second),
+            ('property', 'updated', self.property.id), ('reservation', 'created', imported)])
+        page = self.feed('since={}&model=property'.format(start)).data
+        self.assertEqual(self.summary(page), [('property', 'updated', self.property.id)])
+
+        # Deleting the property deletes its advertisement and reservations too.
+        self.client.delete('/properties/{}/'.format(self.property.id))
+        page = self.feed('since={}'.format(page['next'])).data
+        self.assertCountEqual(self.summary(page)[:2], [('reservation', 'deleted', first),
+            ('reservation', 'deleted', imported)])
+        self.assertEqual(self.summary(page)[2:], [('advertisement', 'deleted', self.advertisement.id),
+            ('property', 'deleted', self.property.id)])
+        self.assertEqual(self.feed('model=hotel').status_code, HTTPStatus.BAD_REQUEST._value_)
+
+    @override_settings(CHANGE_FEED_SETTLE_SECONDS=60)
+    def test_settle(self):
+        start = self.feed().data['next']
+        for checkin_date in ('2023-01-06', '2023-01-10', '2023-01-14'):
+            self.reserve(checkin_date, checkin_date, 1)
+
+        # The second change may still be committing, until it is older than the settle window.
+        Change.objects.filter(id=start + 2).delete()
+        page = self.feed('since={}'.format(start)).data
+        self.assertEqual(len(page['changes']), 1)
+        self.assertEqual(page['next'], start + 1)
+        Change.objects.filter(id=start + 3).update(creation_date=timezone.now() - datetime.timedelta(minutes=1))
+        page = self.feed('since={}'.format(page['next'])).data
+        self.assertEqual(page['next'], start + 3)
+
+    def test_compaction(self):
+        reservation = Reservation.objects.create(advertisement=self.advertisement, checkin_date='2023-01-06',
+            checkout_date='2023-01-08', total_cost='100.00', comment='Test', guests=1)
+        for guests in (2, 3):
+            reservation.guests = guests
+            reservation.save()
+        self.assertEqual(Change.objects.count(), 5)
+        call_command('compact_changes', stdout=StringIO())
+        self.assertEqual(list(Change.objects.order_by('id').values_list('model', 'action')), [('property', 'created'),
+            ('advertisement', 'created'), ('reservation', 'updated')])
+        self.assertEqual(self.summary(self.feed().data), [('property', 'created', self.property.id),
+            ('advertisement', 'created', self.advertisement.id), ('reservation', 'updated', reservation.id)])
+
+        # Entries older than the retention are deleted, and so are the cursors before them.
+        Change.objects.filter(model='property').update(creation_date=timezone.now() - datetime.timedelta(days=31))
+        call_command('compact_changes', stdout=StringIO())
+        self.assertEqual(Change.objects.count(), 2)
+        response = self.feed()
+        self.assertEqual(response.status_code, HTTPStatus.GONE._value_)
+        self.assertEqual(response.data['latest'], Change.objects.latest('id').id)
+        horizon = Change.objects.earliest('id').id - 1
+        self.assertEqual(ChangeFeedHorizon.objects.get().change_id, horizon)
+        self.assertFalse(CodeSequence.objects.exclude(name='reservation').exists())
+        self.assertEqual(self.feed('since={}'.format(horizon - 1)).status_code, HTTPStatus.GONE._value_)
+        self.assertEqual(len(self.feed('since={}'.format(horizon)).data['changes']), 2)
+
+    def test_disabled(self):
+        with self.settings(CHANGE_FEED=False):
+            self.reserve('2023-01-06', '2023-01-08', 2)
+            self.assertEqual(self.feed().status_code, HTTPStatus.NOT_FOUND._value_)
+        self.assertEqual(list(Change.objects.order_by('id').values_list('model', flat=True)),
+            ['property', 'advertisement'])
+
+    @override_settings(ROOT_URLCONF='khanto.async_urls', CHANGE_FEED_POLL_INTERVAL=0.05,
+        CHANGE_FEED_STREAM_TIMEOUT=0.2)
+    def test_async_feed(self):
+        client = AsyncClient()
+        client.force_login(self.user)
+        latest = Change.objects.latest('id').id
+
+        # Waiting requests are answered at once when there are changes, and with an empty page otherwise.
+        response = async_to_sync(client.get)('/changes/?wait=10', headers={'Accept': 'application/json'})
+        self.assertEqual(response.content, self.client.get('/changes/', HTTP_ACCEPT='application/json').content)
+        response = async_to_sync(client.get)('/changes/?wait=1&since={}'.format(latest),
+            headers={'Accept': 'application/json'})
+        self.assertEqual(json.loads(response.content), {'changes': [], 'next': latest, 'has_more': False})
+
+        # Event streams resume from the Last-Event-ID header.
+        async def stream():
+            response = await client.get('/changes/', headers={'Accept': 'text/event-stream',
+                'Last-Event-ID': str(latest - 1)})
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        response, content = async_to_sync(stream)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = content.split(b'\n\n')
+        self.assertTrue(events[0].startswith('retry: 50\nid: {}\ndata: '.format(latest).encode()))
+        self.assertEqual(self.summary(json.loads(events[0].split(b'data: ')[1])),
+            [('advertisement', 'created', self.advertisement.id)])
+        self.assertIn(b': keepalive', events[1])
+
+        # The synchronous API answers a single event.
+        with self.settings(ROOT_URLCONF='khanto.urls'):
+            response = self.client.get('/changes/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.content.split(b'\n')[1], 'id: {}'.format(latest).encode())
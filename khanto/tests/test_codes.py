@@ -0,0 +1,104 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from khanto.codes import CodeAllocator, LEGACY_CODE_LIMIT, MAX_CODE, permute, reservation_codes
+from khanto.models import CodeSequence, Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+from unittest import skipIf, skipUnless
+
+"""
+This file currently tests for:
+1 - Scrambling counter values into distinct codes (success expected);
+2 - Generating reservation codes outside of the legacy range which never repeat and
+    don't look sequential (success expected);
+3 - Reserving blocks of counter values at once outside of transactions, from the
+    CodeSequence table (success expected);
+4 - Drawing codes from the PostgreSQL sequence without touching the CodeSequence table,
+    never handing out again the ones of a rolled back transaction (success expected);
+5 - Sending codes above the legacy range, which are left to the generator, through the
+    API and the bulk import (error expected);
+"""
+
+class CodePermutationTest(TestCase):
+
+    # Test if distinct counter values are always scrambled into distinct codes within the code space
+    def test_permute_distinct(self):
+        permuted = set(permute(value) for value in range(100000))
+        self.assertEqual(len(permuted), 100000)
+        self.assertTrue(all(0 <= value < MAX_CODE - LEGACY_CODE_LIMIT for value in permuted))
+
+    # Test if reservations get unique, non-sequential codes that can't collide with the legacy ones
+    def test_reservation_codes(self):
+        reserved_property = Property.objects.create(code=1, guest_vacancies=100, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        advertisement = Advertisement.objects.create(property=reserved_property, platform='TestPlatform1',
+            platform_tax='10.00')
+        reservations = [Reservation.objects.create(advertisement=advertisement, checkin_date='2023-01-06',
+            checkout_date='2023-01-07', total_cost='100.00', comment='Test', guests=1) for _ in range(20)]
+
+        codes = [reservation.code for reservation in reservations]
+        self.assertEqual(len(set(codes)), 20)
+        self.assertTrue(all(LEGACY_CODE_LIMIT < code <= MAX_CODE for code in codes))
+        self.assertFalse(all(second - first == 1 for first, second in zip(codes, codes[1:])))
+
+        # Inside a transaction the counter values are reserved from the CodeSequence table one at a time.
+        if connection.vendor != 'postgresql':
+            self.assertEqual(CodeSequence.objects.get(name='reservation').next_value, 20)
+
+class CodeAllocatorTest(TransactionTestCase):
+
+    # Test if counter values are reserved in blocks when no transaction is open
+    @skipIf(connection.vendor == 'postgresql', 'PostgreSQL draws the codes from a sequence')
+    def test_block_reservation(self):
+        allocator = CodeAllocator('test')
+        with self.settings(RESERVATION_CODE_BLOCK_SIZE=10):
+            codes = [allocator.next_code() for _ in range(25)]
+        self.assertEqual(len(set(codes)), 25)
+        self.assertEqual(CodeSequence.objects.get(name='test').next_value, 30)
+
+    # Test if the codes drawn from the sequence are never given back nor written to the CodeSequence table
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_sequence(self):
+        try:
+            with transaction.atomic():
+                rolled_back = reservation_codes.next_codes(5)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        codes = reservation_codes.next_codes(5)
+        self.assertFalse(set(rolled_back) & set(codes))
+        self.assertFalse(CodeSequence.objects.filter(name='reservation').exists())
+
+class ClientCodeTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a single advertisement
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=100, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+
+    def reservation(self, **fields):
+        return dict({'advertisement': self.advertisement.id, 'checkin_date': '2023-01-06',
+            'checkout_date': '2023-01-07', 'total_cost': '100.00', 'comment': 'Test', 'guests': 1}, **fields)
+
+    # Test if codes the generator may hand out are refused, while legacy ones are accepted
+    def test_client_codes(self):
+        response = self.client.post('/reservations/', self.reservation(code=LEGACY_CODE_LIMIT + 1), format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertEqual(list(response.data), ['code'])
+        response = self.client.post('/reservations/bulk/', [self.reservation(code=LEGACY_CODE_LIMIT + 1),
+            self.reservation(code=LEGACY_CODE_LIMIT)], format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+        self.assertEqual(list(response.data['results'][0]['errors']), ['code'])
+        response = self.client.post('/reservations/', self.reservation(), format='json')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertGreater(response.data['code'], LEGACY_CODE_LIMIT)
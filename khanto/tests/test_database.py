@@ -0,0 +1,16 @@
+from django.db import connection
+from django.test import TestCase
+from unittest import skipUnless
+
+"""
+This file currently tests for:
+1 - Tuning new SQLite connections with the SQLITE_PRAGMAS setting (success expected);
+"""
+
+class DatabaseTest(TestCase):
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import csv
+import datetime
+import json
+
+"""
+This file currently tests for:
+1 - Exporting Reservation model instances as NDJSON, with the same content as the
+    list endpoint and honoring its filters (success expected);
+2 - Exporting Property model instances as CSV (success expected);
+3 - Exporting with an unsupported output (error expected);
+"""
+
+class ExportTest(TestCase):
+
+    # Setup user authentication for permissions and a few reservations
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for code in (1, 2):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=10, bathrooms=code,
+                pets_allowed=True, cleaning_cost='10.50')
+            advertisement = Advertisement.objects.create(property=reserved_property, platform='TestPlatform1',
+                platform_tax='10.00')
+            for guests in (1, 2, 3):
+                checkin_date = datetime.date(2023, 1, guests)
+                Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+                    checkout_date=checkin_date, total_cost='100.00', comment='Test, "quoted"', guests=guests)
+
+    def content(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    def test_reservation_export_ndjson(self):
+        response = self.client.get('/reservations/export/?guests=2')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        exported = [json.loads(line) for line in self.content(response).splitlines()]
+
+        listed = self.client.get('/reservations/?guests=2').data['results']
+        self.assertEqual(len(exported), 2)
+        self.assertEqual(exported, json.loads(json.dumps(listed)))
+
+    def test_property_export_csv(self):
+        response = self.client.get('/properties/export/?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(self.content(response).splitlines()))
+        listed = self.client.get('/properties/').data['results']
+        self.assertEqual([row['code'] for row in rows], ['1', '2'])
+        self.assertEqual(rows[0]['cleaning_cost'], '10.50')
+        self.assertEqual(rows[1]['creation_date'], listed[1]['creation_date'])
+
+    def test_export_invalid_output(self):
+        response = self.client.get('/reservations/export/?output=xml')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from khanto import fastpath
+from khanto.fastpath import FastJSONResponse, FastListViewSetMixin
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+from unittest import mock
+import datetime
+import decimal
+
+"""
+This file currently tests for:
+1 - Answering the property, advertisement and reservation lists and the availability
+    search through the fast path with the same bytes as the serializers, across pages,
+    with and without orjson (success expected);
+2 - Answering through the serializers when the request asks for embedded relations,
+    another format or indented JSON, or when decimals aren't formatted as strings
+    (success expected);
+"""
+
+class FastPathTest(TestCase):
+
+    # Setup user authentication for permissions and a few reservations with unusual characters in their comments
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        comments = ['Plain', 'Quotes " and \\ backslashes', 'Non-ASCII é ü 日本 😀', 'Separators \u2028 \u2029',
+            'Control \x01 \t \n characters']
+        for code in (1, 2, 3):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=10, bathrooms=code,
+                pets_allowed=code % 2 == 0, cleaning_cost='10.5')
+            advertisement = Advertisement.objects.create(property=reserved_property, platform='Plateforme é',
+                platform_tax='10.00', nightly_rate='99.99' if code == 1 else None)
+            for index, comment in enumerate(comments):
+                checkin_date = datetime.date(2023, 1, 1 + index * 3)
+                Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+                    checkout_date=checkin_date + datetime.timedelta(days=1), total_cost='100.10', comment=comment,
+                    guests=index + 1)
+
+    # Return the content of every page of a list, following the next links, along with whether the fast path
+    # answered them.
+    def pages(self, url):
+        contents, fast = [], []
+        while url is not None:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+            contents.append(response.content)
+            fast.append(isinstance(response, FastJSONResponse))
+            url = response.data['next']
+        return contents, fast
+
+    def assertSameBytes(self, url):
+        with mock.patch.object(FastListViewSetMixin, 'fast_row_serializer', return_value=None):
+            expected, fast = self.pages(url)
+        self.assertEqual(set(fast), {False})
+        for orjson in (fastpath.orjson, None):
+            with mock.patch.object(fastpath, 'orjson', orjson):
+                actual, fast = self.pages(url)
+            self.assertEqual(set(fast), {True})
+            self.assertEqual(actual, expected)
+
+    def test_same_bytes(self):
+        self.assertSameBytes('/properties/?page_size=2')
+        self.assertSameBytes('/advertisements/?page_size=2')
+        self.assertSameBytes('/reservations/?page_size=4')
+        self.assertSameBytes('/reservations/?guests=2')
+        self.assertSameBytes('/properties/available/?checkin=2023-01-01&checkout=2023-01-02&guests=2')
+
+    def test_serializer_fallback(self):
+        for url, accept in (('/reservations/?expand=advertisement', 'application/json'),
+                ('/reservations/', 'text/html'), ('/reservations/', 'application/json; indent=4')):
+            response = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+            self.assertNotIsInstance(response, FastJSONResponse)
+
+        # Decimals are then left as numbers, which render_json() encodes like JSONRenderer too.
+        with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, COERCE_DECIMAL_TO_STRING=False)):
+            response = self.client.get('/reservations/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertNotIsInstance(response, FastJSONResponse)
+        self.assertEqual(response.json()['results'][0]['total_cost'], 100.1)
+        for orjson in (fastpath.orjson, None):
+            with mock.patch.object(fastpath, 'orjson', orjson):
+                self.assertEqual(fastpath.render_json({'total_cost': decimal.Decimal('100.50')}),
+                    b'{"total_cost":100.5}')
@@ -0,0 +1,41 @@
+from django.core.management import call_command
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation, PropertyNightOccupancy
+from io import StringIO
+
+"""
+This file currently tests for:
+1 - Generating a synthetic dataset with a consistent occupancy ledger and no property
+    booked over its capacity (success expected);
+2 - Generating the same dataset again from the same seed (success expected);
+"""
+
+class GenerateDataTest(TestCase):
+
+    def generate(self, seed):
+        call_command('generate_data', properties=20, advertisements=3, occupancy=0.5, days=120, seed=seed,
+            stdout=StringIO())
+
+    def test_generate_data(self):
+        self.generate(1)
+        self.assertEqual(Property.objects.count(), 20)
+        self.assertEqual(Advertisement.objects.count(), 60)
+        self.assertGreater(Reservation.objects.count(), 0)
+
+        # The ledger matches the reservations and no night holds more guests than the property's vacancies.
+        call_command('rebuild_occupancy', check=True, stdout=StringIO())
+        for occupancy in PropertyNightOccupancy.objects.select_related('property'):
+            self.assertLessEqual(occupancy.guests, occupancy.property.guest_vacancies)
+
+        # Roughly the requested share of the nights is booked.
+        booked = PropertyNightOccupancy.objects.count() / (20 * 120)
+        self.assertAlmostEqual(booked, 0.5, delta=0.15)
+
+    def test_generate_data_seed(self):
+        fields = ('advertisement__property__code', 'checkin_date', 'checkout_date', 'guests', 'total_cost')
+        self.generate(1)
+        first = list(Reservation.objects.order_by('id').values_list(*fields))
+        Property.objects.all().delete()
+        self.generate(1)
+        second = list(Reservation.objects.order_by('id').values_list(*fields))
+        self.assertEqual(first, second)
@@ -0,0 +1,133 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from khanto.models import Property, Advertisement, Reservation, IdempotencyKey
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+from unittest import mock
+import datetime
+
+"""
+This file currently tests for:
+1 - Replaying the stored response of a create request repeated with the same
+    Idempotency-Key, headers such as Location included, for reservations, properties and
+    advertisements, without creating anything again (success expected);
+2 - Keeping the keys of different users apart (success expected);
+3 - Reusing a key with another request (error expected);
+4 - Releasing the key of a failed request so that it can be retried (success expected);
+5 - Answering 409 Conflict straight away to repeats of a request in progress, then
+    the stored response, headers included, once it completes (success expected);
+6 - Taking over abandoned and expired keys, and removing expired keys with the
+    management command (success expected);
+"""
+
+class IdempotencyTest(TestCase):
+
+    # Setup user authentication for permissions and a property with an advertisement
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+        self.reservation = {'advertisement': self.advertisement.id, 'checkin_date': '2023-01-01',
+            'checkout_date': '2023-01-02', 'total_cost': '100.00', 'comment': 'Test', 'guests': 1}
+
+    def reserve(self, key, client=None, **fields):
+        return (client or self.client).post('/reservations/', dict(self.reservation, **fields),
+            HTTP_IDEMPOTENCY_KEY=key)
+
+    # Leave the key as a request still in progress would: claimed by reserve(), without a response nor a reservation.
+    def in_progress(self, key):
+        self.reserve(key)
+        Reservation.objects.all().delete()
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        return IdempotencyKey.objects.get()
+
+    def test_replay(self):
+        first = self.reserve('key-1')
+        self.assertEqual(first.status_code, HTTPStatus.CREATED._value_)
+        with self.assertNumQueries(5):
+            repeat = self.reserve('key-1')
+        self.assertEqual(repeat.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(repeat['Idempotent-Replayed'], 'true')
+        self.assertEqual(repeat.data, first.data)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+        for url, data in (('/properties/', {'code': 2, 'guest_vacancies': 2, 'bathrooms': 1, 'pets_allowed': False,
+                'cleaning_cost': '5.00'}), ('/advertisements/', {'property': self.property.id, 'platform': 'Other',
+                'platform_tax': '1.00'})):
+            responses = [self.client.post(url, data, HTTP_IDEMPOTENCY_KEY='key-2') for _ in range(2)]
+            self.assertEqual(responses[0].status_code, HTTPStatus.CREATED._value_)
+            self.assertEqual(responses[1].data, responses[0].data)
+            IdempotencyKey.objects.all().delete()
+        self.assertEqual(Property.objects.count(), 2)
+        self.assertEqual(Advertisement.objects.count(), 2)
+
+    def test_users(self):
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_superuser(username='other', password='other'))
+        self.assertEqual(self.reserve('key-1').status_code, HTTPStatus.CREATED._value_)
+        response = self.reserve('key-1', client=other, checkin_date='2023-01-03', checkout_date='2023-01-04')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_reused_key(self):
+        self.reserve('key-1')
+        response = self.reserve('key-1', guests=2)
+        self.assertEqual(response.status_code, HTTPStatus.UNPROCESSABLE_ENTITY._value_)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_failed_request(self):
+        response = self.reserve('key-1', guests='many')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.reserve('key-1').status_code, HTTPStatus.CREATED._value_)
+
+    def test_request_in_progress(self):
+        record = self.in_progress('key-1')
+        response = self.reserve('key-1')
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT._value_)
+        self.assertEqual(response['Retry-After'], '1')
+
+        # Once the request in progress completes, repeats get its response.
+        IdempotencyKey.objects.filter(key=record.key).update(status_code=201, response={'id': 42},
+            headers={'Location': '/reservations/42/'})
+        response = self.reserve('key-1')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(response.data, {'id': 42})
+        self.assertEqual(response['Location'], '/reservations/42/')
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_replayed_headers(self):
+        with mock.patch('khanto.views.ReservationsViewSet.get_success_headers',
+                side_effect=lambda data: {'Location': '/reservations/{}/'.format(data['id'])}):
+            first = self.reserve('key-1')
+        repeat = self.reserve('key-1')
+        self.assertEqual(repeat.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(repeat['Location'], first['Location'])
+        self.assertEqual(repeat['Location'], '/reservations/{}/'.format(first.data['id']))
+
+    def test_abandoned_and_expired_keys(self):
+        record = self.in_progress('key-1')
+        IdempotencyKey.objects.filter(key=record.key).update(
+            creation_date=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertNotIn('Idempotent-Replayed', self.reserve('key-1'))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+        IdempotencyKey.objects.update(expiration_date=timezone.now())
+        response = self.reserve('key-1', checkin_date='2023-01-03', checkout_date='2023-01-04')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expiration_date=timezone.now())
+        call_command('clear_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
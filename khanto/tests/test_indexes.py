@@ -0,0 +1,60 @@
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.utils import timezone
+from khanto.models import Property, Advertisement, Reservation
+import datetime
+import re
+
+"""
+This file currently tests for:
+1 - Filtering the lists by their hot filters through an index, as shown by the
+    database's query plan (success expected);
+2 - Saving a Reservation model instance whose check-out date is earlier than its
+    check-in date, bypassing validation (error expected);
+"""
+
+# Return whether a query plan reads a whole table instead of searching an index.
+def sequential_scan(plan):
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' in plan
+    return any(re.search(r'\bSCAN (TABLE )?\w+$', line.strip()) for line in plan.splitlines())
+
+class IndexesTest(TestCase):
+
+    # Setup a property with an advertisement and a reservation
+    def setUp(self):
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+        Reservation.objects.create(advertisement=self.advertisement, checkin_date='2023-01-02',
+            checkout_date='2023-01-03', total_cost='100.00', comment='Test', guests=2)
+
+        # With so few rows PostgreSQL would rightly prefer reading the tables, so make it plan as for large ones.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_hot_filters_use_indexes(self):
+        night = datetime.date(2023, 1, 2)
+        querysets = [
+            Property.objects.filter(guest_vacancies=2),
+            Property.objects.filter(pets_allowed=True, guest_vacancies__gte=2),
+            Property.objects.filter(update_date__gte=timezone.now()),
+            Advertisement.objects.filter(platform='TestPlatform1').order_by('creation_date', 'id'),
+            Advertisement.objects.filter(property=self.property),
+            Reservation.objects.filter(advertisement=self.advertisement),
+            Reservation.objects.filter(checkin_date=night),
+            Reservation.objects.filter(checkout_date=night),
+            Reservation.objects.filter(creation_date__gte=timezone.now()),
+            Reservation.objects.filter(code=1),
+        ]
+        for queryset in querysets:
+            plan = queryset.explain()
+            self.assertFalse(sequential_scan(plan), '{}\n{}'.format(queryset.query, plan))
+
+    def test_checkin_before_checkout_constraint(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.bulk_create([Reservation(advertisement=self.advertisement, code=2,
+                checkin_date='2023-01-05', checkout_date='2023-01-04', total_cost='100.00', comment='Test',
+                guests=1)])
@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from khanto.metrics import registry
+from khanto.models import Property, Advertisement
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import os
+import re
+import tempfile
+
+"""
+This file currently tests for:
+1 - Sending the query count, database time and serialization time of a request in its
+    Server-Timing header (success expected);
+2 - Exposing the metrics of each view and method at /metrics (success expected);
+3 - Dumping the profile of slow requests (success expected);
+4 - Recording nothing and exposing no /metrics while metrics are disabled (success
+    expected);
+5 - Serving /metrics to staff users and to requests sending the metrics token only
+    (error expected for the others);
+"""
+
+class MetricsTest(TestCase):
+
+    # Setup user authentication for permissions and a property with an advertisement
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='10.00')
+
+    # The middleware chain is built by each new client, after the settings were overridden.
+    def client_for(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        return client
+
+    def reserve(self, client):
+        return client.post('/reservations/', {'advertisement': self.advertisement.id, 'checkin_date': '2023-01-01',
+            'checkout_date': '2023-01-02', 'total_cost': '100.00', 'comment': 'Test', 'guests': 1})
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_server_timing(self):
+        response = self.reserve(self.client_for())
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+        queries = int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', timing).group(1))
+        self.assertGreater(queries, 0)
+        self.assertRegex(timing, r'serializer;dur=[\d.]+')
+        self.assertRegex(timing, r'validation;dur=[\d.]+')
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        client = self.client_for()
+        self.reserve(client)
+        client.get('/reservations/')
+        client.get('/reservations/')
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        text = response.content.decode()
+        self.assertIn('khanto_request_duration_seconds_count{view="reservation-list",method="GET"} 2', text)
+        self.assertIn('khanto_request_duration_seconds_count{view="reservation-list",method="POST"} 1', text)
+        self.assertRegex(text, r'khanto_request_queries_total\{view="reservation-list",method="POST"\} [1-9]')
+        self.assertRegex(text, r'khanto_response_bytes_total\{view="reservation-list",method="GET"\} [1-9]')
+
+    def test_profile_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_ENABLED=True, METRICS_PROFILE_SAMPLE_RATE=1, METRICS_PROFILE_SLOW_MS=0,
+                    METRICS_PROFILE_DIR=directory):
+                self.client_for().get('/properties/')
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_metrics_disabled(self):
+        response = self.reserve(self.client_for())
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client_for().get('/metrics').status_code, HTTPStatus.NOT_FOUND._value_)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        client = APIClient()
+        self.assertEqual(client.get('/metrics').status_code, HTTPStatus.FORBIDDEN._value_)
+        response = client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN._value_)
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+
+        # API users aren't allowed unless they are staff members.
+        client.force_login(User.objects.create_user(username='user', password='user'))
+        self.assertEqual(client.get('/metrics').status_code, HTTPStatus.FORBIDDEN._value_)
+        client.force_login(self.user)
+        self.assertEqual(client.get('/metrics').status_code, HTTPStatus.OK._value_)
+        with self.settings(METRICS_TOKEN=''):
+            response = client.get('/metrics', headers={'Authorization': 'Bearer '})
+            self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+            client.logout()
+            response = client.get('/metrics', headers={'Authorization': 'Bearer '})
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN._value_)
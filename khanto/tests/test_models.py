@@ -3,12 +3,14 @@ from collections import OrderedDict
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase, RequestFactory
 from khanto.views import PropertiesViewSet, AdvertisementsViewSet, ReservationsViewSet
 from khanto.models import Property, Advertisement, Reservation
 from http import HTTPStatus
 from os.path import join
 from rest_framework.test import force_authenticate, APIClient
+from io import StringIO
 import json
 
 """
@@ -28,6 +30,8 @@ This file currently tests for:
     time frame of at least one different reservation and the sum of their number of
     guests exceeds the number of vacancies for the corresponding property (error
     expected);
+7 - Validating a Reservation model instance with a constant number of queries, no
+    matter how many other reservations exist (success expected);
 """
 
 class ModelViewSetTest(TestCase):
@@ -53,6 +57,9 @@ class ModelViewSetTest(TestCase):
             email='admin@test.com'
         )
 
+        # Fixtures are loaded without calling save(), so build the occupancy ledger from them.
+        call_command('rebuild_occupancy', stdout=StringIO())
+
     # Get a Property model instance
     def test_property_get(self):
         request = self.factory.get('/properties/')
@@ -76,7 +83,7 @@ class ModelViewSetTest(TestCase):
 
         # Confirm that the right instance was retrieved
         self.assertEqual(response.data, {'id': 1, 'property': 1, 'platform': 'TestPlatform1',
-            'platform_tax': '50.00', 'creation_date': '2023-01-05T20:33:36.345000Z',
+            'platform_tax': '50.00', 'nightly_rate': None, 'creation_date': '2023-01-05T20:33:36.345000Z',
             'update_date': '2023-01-05T20:33:36.345000Z'})
 
         # Confirm that request was successful:
@@ -242,3 +249,20 @@ class ModelViewSetTest(TestCase):
         # Confirm that there was an error during validation
         with self.assertRaises(ValidationError):
             response = client.post('/reservations/', data=data, content_type='application/json')
+
+    # Test if validating a Reservation model instance sends the same number of queries no matter
+    # how many reservations already exist (the advertisement, its property and the occupied nights of the stay).
+    def test_reservation_clean_query_count(self):
+        reservation = Reservation(advertisement_id=3, checkin_date='2023-02-01',
+            checkout_date='2023-02-03', total_cost='100.00', comment='Test', guests=1)
+        with self.assertNumQueries(3):
+            reservation.clean()
+
+        # Add more reservations for the same property and confirm that the query count didn't change.
+        for code in range(1, 21):
+            Reservation.objects.create(advertisement_id=3, code=code, checkin_date='2023-03-%02d' % code,
+                checkout_date='2023-03-%02d' % code, total_cost='100.00', comment='Test', guests=1)
+        reservation = Reservation(advertisement_id=3, checkin_date='2023-02-01',
+            checkout_date='2023-02-03', total_cost='100.00', comment='Test', guests=1)
+        with self.assertNumQueries(3):
+            reservation.clean()
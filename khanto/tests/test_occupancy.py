@@ -0,0 +1,201 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from khanto.models import Property, Advertisement, Reservation, ReservationRollup, PropertyNightOccupancy
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+from unittest import skipUnless
+import datetime
+import json
+
+"""
+This file currently tests for:
+1 - Creating and deleting Reservation model instances through the API keeping the
+    occupancy ledger up to date (success expected);
+2 - Creating a Reservation model instance whose time frame fully contains another
+    reservation that leaves no vacancies (error expected);
+3 - Checking and rebuilding the occupancy ledger after it drifted from the
+    reservations (error expected on check, success expected on rebuild);
+4 - Keeping the exclusive property of the reservations in step with the guest limit
+    and the advertisement of their property, and having PostgreSQL reject overlapping
+    stays of properties hosting a single guest written without the ledger (success
+    expected, error expected for the overlapping stay and for lowering the guest limit
+    of a property with overlapping stays to 1);
+5 - Editing and deleting stale copies of a reservation, as concurrent requests would,
+    releasing the stay stored in the database once (success expected);
+6 - Releasing the stays of reservations deleted from the admin panel and along with
+    their advertisement, and archived ones along with their advertisement (success
+    expected);
+"""
+
+class PropertyNightOccupancyTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a single advertisement
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+
+    def reserve(self, checkin_date, checkout_date, guests):
+        return self.client.post('/reservations/', data=json.dumps({
+            "advertisement":self.advertisement.id,
+            "checkin_date":checkin_date,
+            "checkout_date":checkout_date,
+            "total_cost":"100.00",
+            "comment":"Test",
+            "guests":guests
+        }), content_type='application/json')
+
+    def ledger(self):
+        return dict(PropertyNightOccupancy.objects.filter(property=self.property)
+            .values_list('night', 'guests'))
+
+    # Test if creating and deleting reservations through the API updates the ledger incrementally
+    def test_ledger_create_delete(self):
+        first = self.reserve('2023-01-06', '2023-01-08', 1)
+        second = self.reserve('2023-01-07', '2023-01-09', 2)
+        self.assertEqual(first.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(second.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(self.ledger(), {
+            datetime.date(2023, 1, 6): 1,
+            datetime.date(2023, 1, 7): 3,
+            datetime.date(2023, 1, 8): 3,
+            datetime.date(2023, 1, 9): 2})
+
+        # Deleting a reservation releases its nights, dropping the ones left empty.
+        response = self.client.delete('/reservations/{}/'.format(second.data['id']))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT._value_)
+        self.assertEqual(self.ledger(), {
+            datetime.date(2023, 1, 6): 1,
+            datetime.date(2023, 1, 7): 1,
+            datetime.date(2023, 1, 8): 1})
+
+    # Test if stale copies of a reservation release the stay that is stored, and only once
+    @override_settings(ANALYTICS_ROLLUP=True)
+    def test_stale_copies(self):
+        self.reserve('2023-01-06', '2023-01-08', 2)
+        first, second, third = (Reservation.objects.get() for _ in range(3))
+        first.checkin_date, first.checkout_date = datetime.date(2023, 1, 10), datetime.date(2023, 1, 11)
+        first.save()
+        second.delete()
+        self.assertEqual(self.ledger(), {})
+        self.assertEqual(third.delete(), (0, {}))
+        self.assertEqual(self.ledger(), {})
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(set(ReservationRollup.objects.values_list('reservations', 'stay_nights')), {(0, 0)})
+
+    # Test if deleting reservations without Reservation.delete() releases their nights too
+    @override_settings(ANALYTICS_ROLLUP=True)
+    def test_bulk_deletions(self):
+        first = self.reserve('2023-01-06', '2023-01-08', 2).data['id']
+        second = self.reserve('2023-01-07', '2023-01-09', 1).data['id']
+        client = Client()
+        client.force_login(self.user)
+        response = client.post('/admin/khanto/reservation/', {'action': 'delete_selected',
+            '_selected_action': [first, second], 'post': 'yes'})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND._value_)
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(self.ledger(), {})
+        self.assertEqual(set(ReservationRollup.objects.values_list('reservations', 'stay_nights')), {(0, 0)})
+
+        # Deleting an advertisement deletes its reservations, archived ones included, and releases their nights.
+        self.reserve('2023-01-06', '2023-01-08', 2)
+        self.reserve('2022-01-06', '2022-01-08', 1)
+        call_command('archive_reservations', before=datetime.date(2023, 1, 1), stdout=StringIO())
+        other = Advertisement.objects.create(property=self.property, platform='TestPlatform2', platform_tax='10.00')
+        Reservation.objects.create(advertisement=other, checkin_date='2023-01-07', checkout_date='2023-01-07',
+            total_cost='100.00', comment='Test', guests=1)
+        self.advertisement.delete()
+        self.assertEqual(self.ledger(), {datetime.date(2023, 1, 7): 1})
+        call_command('rebuild_occupancy', check=True, stdout=StringIO())
+
+    # Test if a reservation fully containing a booked out reservation fails, even though neither its
+    # check-in nor its check-out date falls within the other reservation's time frame
+    def test_reservation_containing_other(self):
+        self.reserve('2023-01-07', '2023-01-08', 3)
+        with self.assertRaises(ValidationError):
+            self.reserve('2023-01-05', '2023-01-10', 1)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    # Test if the management command detects and repairs drift in the ledger
+    def test_ledger_rebuild(self):
+        self.reserve('2023-01-06', '2023-01-07', 2)
+        PropertyNightOccupancy.objects.filter(night='2023-01-06').update(guests=1)
+        PropertyNightOccupancy.objects.create(property=self.property, night='2023-02-01', guests=1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_occupancy', check=True, stdout=StringIO())
+
+        call_command('rebuild_occupancy', stdout=StringIO())
+        call_command('rebuild_occupancy', check=True, stdout=StringIO())
+        self.assertEqual(self.ledger(), {
+            datetime.date(2023, 1, 6): 2,
+            datetime.date(2023, 1, 7): 2})
+
+    def exclusive_properties(self):
+        return list(Reservation.objects.order_by('checkin_date').values_list('exclusive_property', flat=True))
+
+    def test_exclusive_property(self):
+        self.reserve('2023-01-06', '2023-01-07', 1)
+        self.assertEqual(self.exclusive_properties(), [None])
+        self.property.guest_vacancies = 1
+        self.property.save()
+        self.assertEqual(self.exclusive_properties(), [self.property.id])
+        response = self.client.post('/reservations/bulk/', [{'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-10', 'checkout_date': '2023-01-12', 'total_cost': '100.00', 'comment': 'Test',
+            'guests': 1}], format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(self.exclusive_properties(), [self.property.id] * 2)
+
+        # Moving the advertisement to a larger property frees its reservations from the constraint.
+        other = Property.objects.create(code=2, guest_vacancies=2, bathrooms=1, pets_allowed=True,
+            cleaning_cost='10.00')
+        self.advertisement.property = other
+        self.advertisement.save()
+        self.assertEqual(self.exclusive_properties(), [None] * 2)
+        self.advertisement.property = self.property
+        self.advertisement.save()
+        self.assertEqual(self.exclusive_properties(), [self.property.id] * 2)
+        self.property.guest_vacancies = 2
+        self.property.save()
+        self.assertEqual(self.exclusive_properties(), [None] * 2)
+
+        # The guest limit can't go back to 1 while stays overlap, as the constraint would reject them.
+        self.reserve('2023-01-12', '2023-01-13', 1)
+        response = self.client.put('/properties/{}/'.format(self.property.id), {'code': 1, 'guest_vacancies': 1,
+            'bathrooms': 1, 'pets_allowed': True, 'cleaning_cost': '10.00'}, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertIn('guest_vacancies', response.data)
+        self.property.guest_vacancies = 1
+        with self.assertRaises(ValidationError):
+            self.property.save()
+        self.assertEqual(Property.objects.get(pk=self.property.id).guest_vacancies, 2)
+        self.assertEqual(self.exclusive_properties(), [None] * 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_exclusion_constraint(self):
+        self.property.guest_vacancies = 1
+        self.property.save()
+        self.reserve('2023-01-06', '2023-01-07', 1)
+        other = Advertisement.objects.create(property=self.property, platform='TestPlatform2', platform_tax='10.00')
+
+        # Stays written without going through the ledger are still rejected when they overlap.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.bulk_create([Reservation(advertisement=other, checkin_date='2023-01-07',
+                checkout_date='2023-01-09', total_cost='100.00', comment='Test', guests=1,
+                exclusive_property=self.property)])
+        Reservation.objects.bulk_create([Reservation(advertisement=other, checkin_date='2023-01-08',
+            checkout_date='2023-01-09', total_cost='100.00', comment='Test', guests=1,
+            exclusive_property=self.property)])
@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import datetime
+
+"""
+This file currently tests for:
+1 - Walking through every page of a Reservation list forwards and backwards, in
+    check-in order (success expected);
+2 - Walking through every page of a filtered Reservation list, keeping the filter
+    across pages (success expected);
+3 - Fetching deep pages with the same number of queries as the first one (success
+    expected);
+4 - Fetching a page with an invalid cursor (error expected);
+"""
+
+class KeysetPaginationTest(TestCase):
+
+    # Setup user authentication for permissions and reservations sharing some of their check-in dates
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        reserved_property = Property.objects.create(code=1, guest_vacancies=100, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        advertisement = Advertisement.objects.create(property=reserved_property, platform='TestPlatform1',
+            platform_tax='10.00')
+        for day in (5, 3, 3, 1, 4, 3, 2, 5, 1):
+            checkin_date = datetime.date(2023, 1, day)
+            Reservation.objects.create(advertisement=advertisement, checkin_date=checkin_date,
+                checkout_date=checkin_date, total_cost='100.00', comment='Test', guests=day % 2 + 1)
+
+    # Follow the `next` (or `previous`) links from `url` and return the IDs of every page's results, along
+    # with the last page.
+    def walk(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+            pages.append([reservation['id'] for reservation in response.data['results']])
+            url = response.data[link]
+        return pages, response
+
+    def test_pages_forwards_backwards(self):
+        expected = list(Reservation.objects.order_by('checkin_date', 'id').values_list('id', flat=True))
+        pages, last = self.walk('/reservations/?page_size=2')
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2, 1])
+
+        # Walk back from the last page through the `previous` links.
+        pages, first = self.walk(last.data['previous'], link='previous')
+        self.assertEqual(sum(reversed(pages), []), expected[:8])
+        self.assertIsNone(first.data['previous'])
+
+    def test_filtered_pages(self):
+        expected = list(Reservation.objects.filter(guests=2).order_by('checkin_date', 'id')
+            .values_list('id', flat=True))
+        pages, last = self.walk('/reservations/?guests=2&page_size=2')
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_deep_page_queries(self):
+        url = '/reservations/?page_size=1'
+        for _ in range(8):
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            url = response.data['next']
+        self.assertIsNone(self.client.get(url).data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/reservations/?cursor=invalid')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND._value_)
@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from khanto.models import Property, Advertisement, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+import datetime
+
+"""
+This file currently tests for:
+1 - Listing Property, Advertisement and Reservation model instances with a constant
+    number of queries, no matter how many instances exist or fit in a page (success
+    expected);
+2 - Listing and retrieving Advertisement and Reservation model instances with their
+    related objects embedded through `?expand=`, still with a constant number of
+    queries (success expected);
+"""
+
+class QueryCountTest(TestCase):
+
+    # Setup user authentication for permissions
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    # Create `count` properties, each with one advertisement and one reservation.
+    def create_instances(self, count):
+        first = Property.objects.count()
+        for code in range(first + 1, first + count + 1):
+            reserved_property = Property.objects.create(code=code, guest_vacancies=3, bathrooms=1,
+                pets_allowed=True, cleaning_cost='10.00')
+            advertisement = Advertisement.objects.create(property=reserved_property,
+                platform='TestPlatform1', platform_tax='10.00')
+            Reservation.objects.create(advertisement=advertisement, checkin_date=datetime.date(2023, 1, 6),
+                checkout_date=datetime.date(2023, 1, 7), total_cost='100.00', comment='Test', guests=1)
+
+    # Request `url` once with `count` instances and once with `count * 5` instances, each time with pages of one
+    # instance and of every instance, checking the query count.
+    def assertListQueries(self, url, queries, count=2):
+        separator = '&' if '?' in url else '?'
+        for total in (count, count * 5):
+            self.create_instances(total - Property.objects.count())
+            for page_size in (1, total):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url + separator + 'page_size={}'.format(page_size))
+                self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+                self.assertEqual(len(response.data['results']), page_size)
+        return response
+
+    def test_property_list_queries(self):
+        self.assertListQueries('/properties/', 1)
+
+    def test_advertisement_list_queries(self):
+        self.assertListQueries('/advertisements/', 1)
+
+    def test_reservation_list_queries(self):
+        self.assertListQueries('/reservations/', 1)
+
+    def test_advertisement_expand_queries(self):
+        response = self.assertListQueries('/advertisements/?expand=property', 1)
+        self.assertEqual(response.data['results'][0]['property']['code'], 1)
+
+    def test_reservation_expand_queries(self):
+        response = self.assertListQueries('/reservations/?expand=advertisement.property', 1)
+        self.assertEqual(response.data['results'][0]['advertisement']['platform'], 'TestPlatform1')
+        self.assertEqual(response.data['results'][0]['advertisement']['property']['code'], 1)
+
+        # Only the advertisement is embedded when its property isn't requested.
+        response = self.client.get('/reservations/?expand=advertisement')
+        self.assertEqual(response.data['results'][0]['advertisement']['property'], 1)
+
+    def test_reservation_expand_retrieve_queries(self):
+        self.create_instances(1)
+        reservation = Reservation.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client.get('/reservations/{}/?expand=advertisement,advertisement.property'.format(
+                reservation.id))
+        self.assertEqual(response.data['advertisement']['property']['id'], reservation.advertisement.property_id)
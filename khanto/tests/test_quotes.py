@@ -0,0 +1,154 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from khanto import quotes
+from khanto.models import Property, Advertisement, NightlyRate, Reservation
+from http import HTTPStatus
+from rest_framework.test import APIClient
+from unittest import mock, skipIf
+import datetime
+import random
+
+"""
+This file currently tests for:
+1 - Quoting a list of stays from the usual and overridden nightly rates, the cleaning
+    cost and the platform tax, reporting the result of each one and rejecting the
+    invalid stays, unknown advertisements, advertisements without a nightly rate and
+    parties too large for the property (success expected for the valid stays, error
+    expected for the others);
+2 - Quoting with the same results without NumPy, and with the same results with and
+    without NumPy over random stays and rates when it is installed (success expected);
+3 - Quoting a batch with a constant number of queries, no matter its size (success
+    expected);
+4 - Rejecting batches larger than the limit (error expected);
+5 - Computing the total cost of new reservations that leave it out, and rejecting the
+    ones that don't match the quote, when pricing is enabled (success expected for the
+    matching ones, error expected for the others);
+6 - Computing and checking total costs in bulk imports when pricing is enabled (success
+    expected for the matching ones, error expected for the others);
+"""
+
+class QuotesTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a priced advertisement and an unpriced one
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property, platform='TestPlatform1',
+            platform_tax='5.50', nightly_rate='100.00')
+        self.unpriced = Advertisement.objects.create(property=self.property, platform='TestPlatform2',
+            platform_tax='5.00')
+        NightlyRate.objects.create(advertisement=self.advertisement, night='2023-01-07', rate='150.25')
+
+    def stay(self, checkin_date, checkout_date, guests=2, advertisement=None):
+        return {
+            "advertisement":advertisement or self.advertisement.id,
+            "checkin_date":checkin_date,
+            "checkout_date":checkout_date,
+            "guests":guests
+        }
+
+    def test_quotes(self):
+        response = self.client.post('/quotes/', [
+            self.stay('2023-01-05', '2023-01-07'),
+            self.stay('2023-01-06', '2023-01-09'),
+            self.stay('2023-01-07', '2023-01-07'),
+            self.stay('2023-01-09', '2023-01-08'),
+            self.stay('2023-01-05', '2023-01-07', advertisement=999),
+            self.stay('2023-01-05', '2023-01-07', advertisement=self.unpriced.id),
+            self.stay('2023-01-05', '2023-01-07', guests=4),
+        ], format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual(response.data['quoted'], 3)
+        self.assertEqual(response.data['errors'], 4)
+        results = response.data['results']
+        self.assertEqual(results[0], {'index': 0, 'status': 'quoted', 'nights': 2, 'nightly_cost': '200.00',
+            'cleaning_cost': '10.00', 'platform_tax': '5.50', 'total_cost': '215.50'})
+        self.assertEqual(results[1]['nightly_cost'], '350.25')
+        self.assertEqual(results[1]['total_cost'], '365.75')
+        self.assertEqual(results[2]['total_cost'], '15.50')
+        self.assertIn('checkin_date', results[3]['errors'])
+        self.assertIn('advertisement', results[4]['errors'])
+        self.assertEqual(results[5]['errors'], {'advertisement': [quotes.NO_NIGHTLY_RATE]})
+        self.assertIn('guests', results[6]['errors'])
+
+    def test_quotes_without_numpy(self):
+        stays = [self.stay('2023-01-05', '2023-01-07'), self.stay('2023-01-06', '2023-01-09')]
+        with mock.patch.object(quotes, 'numpy', None):
+            results = quotes.quote_stays(stays)
+        self.assertEqual([result['total_cost'] for result in results], ['215.50', '365.75'])
+
+    @skipIf(quotes.numpy is None, 'NumPy is not installed')
+    def test_numpy_matches_lists(self):
+        generator = random.Random(0)
+        first_night = datetime.date(2023, 1, 1)
+        NightlyRate.objects.bulk_create([NightlyRate(advertisement=self.advertisement,
+            night=first_night + datetime.timedelta(days=offset), rate='{}.{:02d}'.format(generator.randint(50, 500),
+            generator.randrange(100))) for offset in generator.sample(range(7, 365), 100)])
+        stays = []
+        for _ in range(500):
+            checkin_date = first_night + datetime.timedelta(days=generator.randrange(365))
+            stays.append(self.stay(checkin_date.isoformat(),
+                (checkin_date + datetime.timedelta(days=generator.randint(0, 60))).isoformat()))
+        results = quotes.quote_stays(stays)
+        with mock.patch.object(quotes, 'numpy', None):
+            self.assertEqual(quotes.quote_stays(stays), results)
+        self.assertEqual({result['status'] for result in results}, {'quoted'})
+
+    def test_query_count(self):
+        with self.assertNumQueries(2):
+            quotes.quote_stays([self.stay('2023-01-01', '2023-01-03')])
+        with self.assertNumQueries(2):
+            quotes.quote_stays([self.stay('2023-{:02d}-01'.format(month), '2023-{:02d}-10'.format(month))
+                for month in range(1, 13)] * 50)
+
+    @override_settings(QUOTE_BATCH_LIMIT=2)
+    def test_batch_limit(self):
+        response = self.client.post('/quotes/', [self.stay('2023-01-05', '2023-01-07')] * 3, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+
+    def reserve(self, **fields):
+        return self.client.post('/reservations/', dict({'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-06', 'checkout_date': '2023-01-08', 'comment': 'Test', 'guests': 1}, **fields))
+
+    @override_settings(RESERVATION_PRICING=True)
+    def test_reservation_pricing(self):
+        response = self.reserve()
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(response.data['total_cost'], '265.75')
+        response = self.reserve(checkin_date='2023-01-10', checkout_date='2023-01-11', total_cost='100.00')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        self.assertIn('total_cost', response.data)
+        response = self.reserve(checkin_date='2023-01-10', checkout_date='2023-01-11', total_cost='115.50')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+
+        # Advertisements without a nightly rate need a total cost.
+        response = self.reserve(advertisement=self.unpriced.id, checkin_date='2023-01-20', checkout_date='2023-01-21')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        response = self.reserve(advertisement=self.unpriced.id, checkin_date='2023-01-20', checkout_date='2023-01-21',
+            total_cost='42.00')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+
+    def test_reservation_without_pricing(self):
+        response = self.reserve()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST._value_)
+        response = self.reserve(total_cost='1.00')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED._value_)
+
+    @override_settings(RESERVATION_PRICING=True)
+    def test_bulk_pricing(self):
+        response = self.client.post('/reservations/bulk/', [
+            dict(self.stay('2023-01-05', '2023-01-06', guests=1), comment='Test'),
+            dict(self.stay('2023-01-10', '2023-01-11', guests=1), comment='Test', total_cost='1.00'),
+            dict(self.stay('2023-01-12', '2023-01-13', guests=1), comment='Test', total_cost='115.50'),
+        ], format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error', 'created'])
+        self.assertEqual(sorted(str(total_cost) for total_cost in Reservation.objects.values_list('total_cost',
+            flat=True)), ['115.50', '115.50'])
@@ -0,0 +1,146 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from khanto import analytics, tasks
+from khanto.metrics import registry
+from khanto.models import Property, Advertisement, Reservation, ReservationRollup, Task
+from http import HTTPStatus
+from io import StringIO
+from rest_framework.test import APIClient
+import datetime
+
+"""
+This file currently tests for:
+1 - Queuing the analytics rollup of reservations created, edited, deleted and imported
+    in bulk, and running it in batches with the worker command without drawing
+    reservation codes (success expected);
+2 - Queuing nothing for writes that are rolled back (success expected);
+3 - Retrying failed tasks later, and keeping them as failed after too many attempts
+    (error expected);
+4 - Skipping the tasks claimed by a worker until their lease is up (success expected);
+5 - Running the handlers straight away when the queue is disabled (success expected);
+"""
+
+@tasks.handler('test.record')
+def record(payloads):
+    recorded.append(payloads)
+
+@tasks.handler('test.fail')
+def fail(payloads):
+    raise ValueError('Failed on purpose.')
+
+recorded = []
+
+@override_settings(TASK_QUEUE=True, ANALYTICS_ROLLUP=True)
+class TaskQueueTest(TestCase):
+
+    # Setup user authentication for permissions and a property with a single advertisement
+    def setUp(self):
+        registry.reset()
+        recorded.clear()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+
+    def reserve(self, checkin_date, checkout_date, guests):
+        return self.client.post('/reservations/', {'advertisement': self.advertisement.id,
+            'checkin_date': checkin_date, 'checkout_date': checkout_date, 'total_cost': '100.00',
+            'comment': 'Test', 'guests': guests})
+
+    def run_tasks(self):
+        call_command('run_tasks', once=True, stdout=StringIO())
+
+    def revenue(self):
+        return analytics.revenue(datetime.date(2023, 1, 1), datetime.date(2023, 3, 31), by='advertisement')
+
+    def test_rollup_tasks(self):
+        for checkin_date, checkout_date in (('2023-01-05', '2023-01-07'), ('2023-02-05', '2023-02-07'),
+                ('2023-03-05', '2023-03-07')):
+            self.assertEqual(self.reserve(checkin_date, checkout_date, 1).status_code, HTTPStatus.CREATED._value_)
+        reservation = Reservation.objects.get(checkin_date='2023-02-05')
+        reservation.checkin_date = datetime.date(2023, 3, 10)
+        reservation.checkout_date = datetime.date(2023, 3, 12)
+        reservation.save()
+        Reservation.objects.get(checkin_date='2023-01-05').delete()
+        response = self.client.post('/reservations/bulk/', [{'advertisement': self.advertisement.id,
+            'checkin_date': '2023-01-20', 'checkout_date': '2023-01-21', 'total_cost': '50.00', 'comment': 'Test',
+            'guests': 2}], format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK._value_)
+
+        # Nothing was recorded in the rollup by the requests.
+        self.assertFalse(ReservationRollup.objects.exists())
+        self.assertEqual(Task.objects.count(), 7)
+
+        # Running the tasks draws no reservation code.
+        with CaptureQueriesContext(connection) as queries:
+            self.run_tasks()
+        self.assertFalse([query for query in queries if 'khanto_codesequence' in query['sql']])
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(registry.tasks['analytics.rollup']['batches'], {'done': 1})
+        self.assertEqual(registry.tasks['analytics.rollup']['tasks'], {'done': 7})
+        with override_settings(ANALYTICS_ROLLUP=False):
+            expected = self.revenue()[1]
+        source, actual = self.revenue()
+        self.assertEqual(source, 'rollup')
+        self.assertEqual(actual, expected)
+        self.assertIn('khanto_tasks_total{task="analytics.rollup",outcome="done"} 7', registry.render())
+
+    def test_rolled_back_write(self):
+        try:
+            with transaction.atomic():
+                self.reserve('2023-01-05', '2023-01-07', 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_RETRY_DELAY=0, TASK_MAX_ATTEMPTS=2)
+    def test_retries(self):
+        tasks.enqueue('test.fail', [{'index': 0}])
+        self.assertEqual(tasks.run_batch(), 1)
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertFalse(task.failed)
+        self.assertIn('Failed on purpose.', task.last_error)
+
+        self.run_tasks()
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 2)
+        self.assertTrue(task.failed)
+        self.assertEqual(tasks.run_batch(), 0)
+        self.assertEqual(registry.tasks['test.fail']['batches'], {'failed': 2})
+
+    @override_settings(TASK_BATCH_SIZE=2)
+    def test_batches_and_leases(self):
+        tasks.enqueue('test.record', [{'index': index} for index in range(3)])
+        tasks.enqueue('test.fail', [{'index': 3}])
+        claimed = tasks.claim()
+        self.assertEqual([task.payload for task in claimed], [{'index': 0}, {'index': 1}])
+        self.assertEqual([task.payload for task in tasks.claim()], [{'index': 2}])
+        self.assertEqual([task.name for task in tasks.claim()], ['test.fail'])
+        self.assertEqual(tasks.claim(), [])
+
+        # Tasks of a worker that died are claimed again once their lease is up.
+        Task.objects.filter(pk__in=[task.pk for task in claimed]).update(run_after=timezone.now())
+        self.assertEqual(tasks.run_batch(), 2)
+        self.assertEqual(recorded, [[{'index': 0}, {'index': 1}]])
+        self.assertEqual(Task.objects.count(), 2)
+
+    @override_settings(TASK_QUEUE=False)
+    def test_queue_disabled(self):
+        tasks.enqueue('test.record', [{'index': 0}])
+        self.assertEqual(recorded, [[{'index': 0}]])
+        self.reserve('2023-01-05', '2023-01-07', 1)
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(ReservationRollup.objects.get().reservations, 1)
@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from khanto.metrics import registry
+from khanto.models import Property, Advertisement
+from khanto.throttling import limiter
+from khanto.urls import router
+from http import HTTPStatus
+from rest_framework.test import APIClient
+from unittest import mock
+
+"""
+This file currently tests for:
+1 - Throttling the requests of a user once the tokens of their bucket for the whole API
+    are spent, and refilling it over time (error expected);
+2 - Costing reservation creations more tokens than reads in the bucket of the
+    reservations endpoint, per user (error expected);
+3 - Shedding requests with 503 while the work in flight is over the threshold, and
+    releasing the work of streamed exports once sent (error expected);
+4 - Exposing the throttled, allowed and shed requests at /metrics (success expected);
+5 - Neither throttling nor shedding requests while throttling is disabled (success
+    expected);
+6 - Having a default rate for the scope of every registered viewset (success expected);
+"""
+
+RATES = {
+    'user': '10/min',
+    'anon': '10/min',
+    'reservations': '45/min',
+}
+
+@override_settings(THROTTLING=True, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class ThrottlingTest(TestCase):
+
+    # Setup user authentication for permissions and a property with an advertisement
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_superuser(
+            username='admin',
+            password='admin',
+            email='admin@test.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.property = Property.objects.create(code=1, guest_vacancies=3, bathrooms=1,
+            pets_allowed=True, cleaning_cost='10.00')
+        self.advertisement = Advertisement.objects.create(property=self.property,
+            platform='TestPlatform1', platform_tax='10.00')
+
+    def reserve(self, client, checkin_date):
+        return client.post('/reservations/', {'advertisement': self.advertisement.id, 'checkin_date': checkin_date,
+            'checkout_date': checkin_date, 'total_cost': '100.00', 'comment': 'Test', 'guests': 1}, format='json')
+
+    def test_user_bucket(self):
+        for _ in range(10):
+            self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.OK._value_)
+        response = self.client.get('/advertisements/')
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS._value_)
+        self.assertEqual(response['Retry-After'], '6')
+
+        # A token comes back every 6 seconds.
+        now = cache.get('throttle:user:user:{}'.format(self.user.pk)) / 1000000 - 60
+        with mock.patch('time.time', return_value=now + 6):
+            self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.OK._value_)
+            self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.TOO_MANY_REQUESTS._value_)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        **RATES, 'user': '1000/min'}})
+    def test_costs(self):
+        self.assertEqual(self.reserve(self.client, '2023-01-06').status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(self.reserve(self.client, '2023-01-08').status_code, HTTPStatus.CREATED._value_)
+        self.assertEqual(self.reserve(self.client, '2023-01-10').status_code, HTTPStatus.TOO_MANY_REQUESTS._value_)
+
+        # The 5 tokens left are enough for reads, but not for another creation.
+        for _ in range(5):
+            self.assertEqual(self.client.get('/reservations/').status_code, HTTPStatus.OK._value_)
+        self.assertEqual(self.client.get('/reservations/').status_code, HTTPStatus.TOO_MANY_REQUESTS._value_)
+        self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.OK._value_)
+
+        # Other users have buckets of their own.
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='other', password='other'))
+        self.assertEqual(self.reserve(client, '2023-01-10').status_code, HTTPStatus.CREATED._value_)
+
+    @override_settings(ADMISSION_MAX_WORK=100, REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {}})
+    def test_admission(self):
+        self.assertTrue(limiter.acquire(99))
+        try:
+            self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.OK._value_)
+            response = self.reserve(self.client, '2023-01-06')
+            self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE._value_)
+            self.assertEqual(response['Retry-After'], '1')
+        finally:
+            limiter.release(99)
+        self.assertEqual(self.reserve(self.client, '2023-01-06').status_code, HTTPStatus.CREATED._value_)
+
+        # Exports cost the whole threshold, and hold it until they were sent.
+        response = self.client.get('/reservations/export/')
+        self.assertEqual(limiter.in_flight, 100)
+        self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.SERVICE_UNAVAILABLE._value_)
+        b''.join(response.streaming_content)
+        self.assertEqual(limiter.in_flight, 0)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    def test_metrics(self):
+        limiter.acquire(1000)
+        try:
+            self.assertEqual(self.client.get('/advertisements/').status_code, HTTPStatus.SERVICE_UNAVAILABLE._value_)
+        finally:
+            limiter.release(1000)
+        for _ in range(10):
+            self.client.get('/properties/')
+        text = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'}).content.decode()
+        self.assertIn('khanto_throttle_requests_total{scope="user",outcome="allowed"} 10', text)
+        self.assertIn('khanto_throttle_requests_total{scope="user",outcome="throttled"} 1', text)
+        self.assertIn('khanto_throttle_tokens_total{scope="user",outcome="allowed"} 10', text)
+        self.assertIn('khanto_admission_shed_total{scope="advertisements"} 1', text)
+        self.assertIn('khanto_admission_work_in_flight{} 0', text)
+
+    @override_settings(THROTTLING=False)
+    def test_disabled(self):
+        limiter.acquire(1000)
+        try:
+            for _ in range(20):
+                self.assertEqual(self.client.get('/properties/').status_code, HTTPStatus.OK._value_)
+        finally:
+            limiter.release(1000)
+        self.assertFalse(cache.get('throttle:user:user:{}'.format(self.user.pk)))
+
+    @override_settings(REST_FRAMEWORK=settings.REST_FRAMEWORK)
+    def test_default_rates(self):
+        for prefix, viewset, basename in router.registry:
+            self.assertIn(viewset.throttle_scope, settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'])
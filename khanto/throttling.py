@@ -0,0 +1,229 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions, permissions, status
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from .metrics import registry
+import math
+import threading
+import time
+
+"""
+This file currently provides the rate limits and the admission control of the API, enforced when the THROTTLING
+setting is on, so that a few aggressive clients can't saturate the database for everyone else:
+- every request costs a number of tokens, after the database work it makes (THROTTLE_COSTS, see request_cost()):
+  reads, most of them served from the response cache, cost the least, and reservation creations, each validated
+  by Reservation.clean(), and exports, which read a whole table, the most;
+- each user (or IP address, for anonymous requests) gets a token bucket for the whole API (UserThrottle) and one
+  per endpoint (EndpointThrottle, keyed by the viewset's `throttle_scope`), filled at the DEFAULT_THROTTLE_RATES
+  of REST_FRAMEWORK: "1200/min" holds up to 1200 tokens and gets 20 of them back every second. Requests costing
+  more tokens than are left are answered 429 Too Many Requests, with a Retry-After header telling when there will
+  be enough. Requests costing more than a whole bucket are charged the whole bucket;
+- buckets are kept in the THROTTLE_CACHE_ALIAS cache, shared by every process when it is a Redis server (see
+  CACHES in khanto/settings.py), and only updated with atomic increments (see TokenBucket);
+- each process runs at most ADMISSION_MAX_WORK tokens worth of requests at once, and answers the others 503
+  Service Unavailable with a Retry-After header of ADMISSION_RETRY_AFTER seconds, shedding load before it queues
+  up in front of the database (see AdmissionControl).
+
+Requests allowed and throttled, the tokens they cost and the requests shed are counted per scope, and exposed at
+/metrics along with the work in flight (see khanto/metrics.py).
+"""
+
+# Tokens costed by each kind of request, unless set by THROTTLE_COSTS.
+DEFAULT_COSTS = {
+    'read': 1,
+    'write': 5,
+    'reservation': 20,
+    'bulk_reservation': 1,
+    'export': 100,
+}
+
+# Seconds of each rate period, e.g. "1200/min".
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def throttling_enabled():
+    return getattr(settings, 'THROTTLING', False)
+
+def get_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+# Tokens costed by a kind of request (see DEFAULT_COSTS).
+def throttle_cost(kind):
+    return getattr(settings, 'THROTTLE_COSTS', DEFAULT_COSTS).get(kind, DEFAULT_COSTS[kind])
+
+# Tokens costed by the request: the viewset's throttle_cost() when it has one and it returns a cost, else the cost
+# of an export, a read or a write.
+def request_cost(request, view):
+    cost = view.throttle_cost(request) if hasattr(view, 'throttle_cost') else None
+    if cost is not None:
+        return cost
+    if getattr(view, 'action', None) == 'export':
+        return throttle_cost('export')
+    return throttle_cost('read' if request.method in permissions.SAFE_METHODS else 'write')
+
+# Return the number of tokens and the period in seconds of a rate such as "1200/min".
+def parse_rate(rate):
+    tokens, period = rate.split('/')
+    return int(tokens), PERIODS[period[0]]
+
+# Token bucket holding up to `capacity` tokens and refilled over `period` seconds. The cache only holds the time
+# at which the bucket will be full again, in microseconds (the "theoretical arrival time" of the generic cell rate
+# algorithm), so that taking tokens is a single atomic increment of that time, whatever the number of processes
+# sharing the cache. A missing entry is a full bucket.
+class TokenBucket:
+
+    def __init__(self, cache, key, capacity, period):
+        self.cache = cache
+        self.key = key
+        self.capacity = capacity
+        self.interval = period * 1000000 / capacity
+
+    # Take `cost` tokens, returning 0 when there were enough of them, or else the seconds to wait until there are.
+    def take(self, cost):
+        cost = min(cost, self.capacity)
+        increment = int(cost * self.interval)
+        limit = int(self.capacity * self.interval)
+        now = int(time.time() * 1000000)
+        try:
+            full = self.cache.incr(self.key, increment)
+        except ValueError:
+            if self.cache.add(self.key, now + increment, self.timeout(increment)):
+                return 0
+            full = self.cache.incr(self.key, increment)
+
+        # The bucket was full: it starts again from now. Requests sent at that very moment from other processes may
+        # be left uncharged, which errs on the side of letting them through.
+        if full - increment < now:
+            self.cache.set(self.key, now + increment, self.timeout(increment))
+            return 0
+        if full - now > limit:
+            self.cache.decr(self.key, increment)
+            return (full - now - limit) / 1000000
+
+        # The entry lasts until the bucket is full again, so that an entry never expires while tokens are missing.
+        self.cache.touch(self.key, self.timeout(full - now))
+        return 0
+
+    def timeout(self, microseconds):
+        return math.ceil(microseconds / 1000000) + 1
+
+class TokenBucketThrottle(BaseThrottle):
+
+    # Rate scope of the requests, whose rate is read from the DEFAULT_THROTTLE_RATES of REST_FRAMEWORK. Requests
+    # without a scope or a rate aren't throttled.
+    scope = None
+
+    # Rate scope of the request, the `scope` attribute unless overridden.
+    def get_scope(self, request, view):
+        return self.scope
+
+    # Key of the bucket of the request's user, or IP address when anonymous.
+    def get_cache_key(self, request, scope):
+        if request.user and request.user.is_authenticated:
+            return 'throttle:{}:user:{}'.format(scope, request.user.pk)
+        return 'throttle:{}:ip:{}'.format(scope, self.get_ident(request))
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        if not throttling_enabled():
+            return True
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+        cost = request_cost(request, view)
+        self.delay = TokenBucket(get_cache(), self.get_cache_key(request, scope), capacity, period).take(cost)
+        registry.record_throttle(scope, cost, throttled=bool(self.delay))
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+# Bucket of each user for the whole API, with the "user" rate, or the "anon" rate for anonymous requests.
+class UserThrottle(TokenBucketThrottle):
+
+    def get_scope(self, request, view):
+        return 'user' if request.user and request.user.is_authenticated else 'anon'
+
+# Bucket of each user for each endpoint, with the rate of the viewset's `throttle_scope`.
+class EndpointThrottle(TokenBucketThrottle):
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+# Answered to the requests shed by the admission control.
+class Overloaded(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, try again later.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+
+        # Sent back in the Retry-After header by the exception handler.
+        self.wait = wait
+
+# Tokens worth of requests running in the current process.
+class AdmissionControl:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    # Admit a request costing `cost` tokens, unless the requests running already cost ADMISSION_MAX_WORK tokens.
+    # Requests costing more than that are admitted when nothing else runs.
+    def acquire(self, cost):
+        with self.lock:
+            if self.in_flight and self.in_flight + cost > getattr(settings, 'ADMISSION_MAX_WORK', 200):
+                return False
+            self.in_flight += cost
+            return True
+
+    def release(self, cost):
+        with self.lock:
+            self.in_flight -= cost
+
+limiter = AdmissionControl()
+
+# Streamed content releasing its admission once the response is closed, whether it was sent whole or not.
+class AdmittedContent:
+
+    def __init__(self, content, release):
+        self.content = content
+        self.close = release
+
+    def __iter__(self):
+        return iter(self.content)
+
+class AdmissionControlViewSetMixin:
+
+    # Whether the viewset's requests go through the admission control.
+    admission_control = True
+
+    # Admit the request once it passed the permissions and the throttles, or shed it.
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.admitted_cost = None
+        if throttling_enabled() and self.admission_control:
+            cost = request_cost(request, self)
+            if not limiter.acquire(cost):
+                registry.record_shed(getattr(self, 'throttle_scope', None) or 'none')
+                raise Overloaded(getattr(settings, 'ADMISSION_RETRY_AFTER', 1))
+            self.admitted_cost = cost
+
+    # Release the request's admission, once (streamed responses release it once closed).
+    def release_admission(self):
+        cost = getattr(self, 'admitted_cost', None)
+        if cost is not None:
+            self.admitted_cost = None
+            limiter.release(cost)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(response, 'streaming', False) and not response.is_async \
+                and getattr(self, 'admitted_cost', None) is not None:
+            response.streaming_content = AdmittedContent(response.streaming_content, self.release_admission)
+        else:
+            self.release_admission()
+        return response
@@ -16,16 +16,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from khanto import views
+from khanto import metrics, views
 
 # Create a router and register the viewsets with it.
 router = DefaultRouter()
 router.register(r'properties', views.PropertiesViewSet)
 router.register(r'advertisements', views.AdvertisementsViewSet)
 router.register(r'reservations', views.ReservationsViewSet)
+router.register(r'quotes', views.QuotesViewSet, basename='quote')
+router.register(r'analytics', views.AnalyticsViewSet, basename='analytics')
+router.register(r'changes', views.ChangesViewSet, basename='change')
 
 # API URLs are determined automatically by the router.
 urlpatterns = [
     path('', include(router.urls)),
     path('admin/', admin.site.urls),
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
@@ -1,18 +1,66 @@
+from django.conf import settings
+from django.http import Http404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, permissions
-from .models import Property, Advertisement, Reservation
-from .serializers import PropertySerializer, AdvertisementSerializer, ReservationSerializer
+from rest_framework import exceptions, viewsets, permissions, serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from . import analytics, changes
+from .archive import ArchiveViewSetMixin
+from .availability import calendar_headers, last_modified, property_calendar
+from .bulk import import_reservations
+from .caching import CachedResponseViewSetMixin
+from .export import export_response
+from .fastpath import FastListViewSetMixin
+from .idempotency import IdempotentCreateViewSetMixin
+from .quotes import checked_total_cost, price_stays, pricing_enabled, quote_stays
+from .throttling import AdmissionControlViewSetMixin, throttle_cost
+from .models import Property, Advertisement, Reservation, ReservationRecord
+from .serializers import PropertySerializer, AdvertisementSerializer, ReservationSerializer, AvailabilitySerializer
+from .serializers import CalendarSerializer, requested_expansions
+from .serializers import AnalyticsSerializer, OccupancyAnalyticsSerializer, RevenueSerializer, StaysSerializer
+from .serializers import ChangesSerializer
 
 """
 This file currently provides ModelViewSets for the following models:
 - Property, represting real estate properties
 - Advertisement, representing advertisements associated with real estate properties
 - Reservation, representing reservation associated with an advertisement
+
+along with the quote engine (see khanto/quotes.py) and the read-only analytics endpoints (see khanto/analytics.py).
+
+Every viewset's requests are rate limited per user and per endpoint (its `throttle_scope`), and go through the
+admission control, when THROTTLING is on (see khanto/throttling.py).
 """
 
-class PropertiesViewSet(viewsets.ModelViewSet):
+class ExpandableViewSetMixin:
+
+    # Join the relations requested with `?expand=` so that embedding them doesn't cost a query per instance.
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        lookups = self.get_serializer_class().related_lookups(requested_expansions(self.request))
+        if lookups:
+            queryset = queryset.select_related(*lookups)
+        return queryset
+
+class ExportViewSetMixin:
+
+    # Name of the exported file, without extension.
+    export_filename = 'export'
+
+    # Stream every instance matching the list filters as NDJSON or CSV (see khanto/export.py).
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*self.keyset_ordering)
+        return export_response(request, queryset, self.get_serializer_class(), self.export_filename)
+
+class PropertiesViewSet(AdmissionControlViewSetMixin, IdempotentCreateViewSetMixin, CachedResponseViewSetMixin,
+        FastListViewSetMixin, ExportViewSetMixin, viewsets.ModelViewSet):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
+    throttle_scope = 'properties'
 
     # Restrict non-authenticated users.
     permission_classes = [permissions.IsAuthenticated]
@@ -20,6 +68,10 @@ class PropertiesViewSet(viewsets.ModelViewSet):
     # Per specification, properties have no particular restrictions when being created, deleted or edited.
     http_method_names = ['get', 'post', 'put', 'delete', 'head']
 
+    # Paginate lists in creation order (see khanto/pagination.py).
+    keyset_ordering = ('creation_date', 'id')
+    export_filename = 'properties'
+
     # Allow searching by currently available fields.
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
@@ -33,9 +85,53 @@ class PropertiesViewSet(viewsets.ModelViewSet):
             'update_date'
         ]
 
-class AdvertisementsViewSet(viewsets.ModelViewSet):
+    # Search the properties able to host a number of guests between two dates, e.g.
+    # /properties/available/?checkin=2023-01-06&checkout=2023-01-08&guests=2&pets_allowed=true
+    # The list filters (such as pets_allowed) and pagination apply to the results too.
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        return self.paginated_list(request, self.available_queryset(request))
+
+    def available_queryset(self, request):
+        search = AvailabilitySerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+        return self.filter_queryset(self.get_queryset()).available(
+            search.validated_data['checkin'], search.validated_data['checkout'], search.validated_data['guests'])
+
+    # Remaining vacancies of the property on each night of a time frame, e.g.
+    # /properties/1/calendar/?from=2023-01-01&to=2023-12-31 (see khanto/availability.py).
+    @action(detail=True, methods=['get'])
+    def calendar(self, request, pk=None):
+        reserved_property = self.get_object()
+        first_night, last_night = self.calendar_time_frame(request)
+        headers = calendar_headers(reserved_property, first_night, last_night, request.accepted_renderer.format)
+        not_modified = self.calendar_not_modified(request, reserved_property, headers)
+        if not_modified is not None:
+            return not_modified
+        return Response(property_calendar(reserved_property, first_night, last_night), headers=headers)
+
+    def calendar_time_frame(self, request):
+        time_frame = CalendarSerializer(data=request.query_params)
+        time_frame.is_valid(raise_exception=True)
+        return time_frame.validated_data['from'], time_frame.validated_data['to']
+
+    # Answer with 304 Not Modified when the client's copy is still current, without building the calendar.
+    def calendar_not_modified(self, request, reserved_property, headers):
+        not_modified = get_conditional_response(request, etag=headers['ETag'],
+            last_modified=int(last_modified(reserved_property).timestamp()))
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+        return not_modified
+
+class AdvertisementsViewSet(AdmissionControlViewSetMixin, IdempotentCreateViewSetMixin, CachedResponseViewSetMixin,
+        FastListViewSetMixin, ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = Advertisement.objects.all()
     serializer_class = AdvertisementSerializer
+    throttle_scope = 'advertisements'
+
+    # Cached responses may embed properties with `?expand=property` (see khanto/caching.py).
+    cache_dependencies = (Property,)
 
     # Restrict non-authenticated users.
     permission_classes = [permissions.IsAuthenticated]
@@ -43,6 +139,9 @@ class AdvertisementsViewSet(viewsets.ModelViewSet):
     # Per specification, advertisements should not be deletable. 
     http_method_names = ['get', 'post', 'put', 'head']
 
+    # Paginate lists in creation order (see khanto/pagination.py).
+    keyset_ordering = ('creation_date', 'id')
+
     # Allow searching by currently available fields.
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
@@ -53,9 +152,14 @@ class AdvertisementsViewSet(viewsets.ModelViewSet):
             'update_date'
         ]
 
-class ReservationsViewSet(viewsets.ModelViewSet):
+class ReservationsViewSet(AdmissionControlViewSetMixin, IdempotentCreateViewSetMixin, FastListViewSetMixin,
+        ExpandableViewSetMixin, ExportViewSetMixin, ArchiveViewSetMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
+    throttle_scope = 'reservations'
+
+    # Archived reservations are only read with ?include_archived=true (see khanto/archive.py).
+    archive_queryset = ReservationRecord.objects.all()
 
     # Restrict non-authenticated users.
     permission_classes = [permissions.IsAuthenticated]
@@ -63,6 +167,10 @@ class ReservationsViewSet(viewsets.ModelViewSet):
     # Per specification, reservations should not be editable.
     http_method_names = ['get', 'post', 'delete', 'head']
 
+    # Paginate lists in check-in order (see khanto/pagination.py).
+    keyset_ordering = ('checkin_date', 'id')
+    export_filename = 'reservations'
+
     # Allow searching by currently available fields.
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
@@ -76,3 +184,137 @@ class ReservationsViewSet(viewsets.ModelViewSet):
             'creation_date',
             'update_date'
         ]
+
+    # Reservation creations cost more tokens than the other requests (see khanto/throttling.py): each one is
+    # validated by Reservation.clean(), while bulk imports validate their reservations together.
+    def throttle_cost(self, request):
+        if self.action == 'create':
+            return throttle_cost('reservation')
+        if self.action == 'bulk' and isinstance(request.data, list):
+            return throttle_cost('bulk_reservation') * len(request.data)
+        return None
+
+    # Compute or check the total cost of the new reservation with the quote engine, when enabled (see
+    # khanto/quotes.py).
+    def perform_create(self, serializer):
+        if pricing_enabled():
+            data = serializer.validated_data
+            price, = price_stays([(data['advertisement'], data['checkin_date'], data['checkout_date'])])
+            total_cost, errors = checked_total_cost(data.get('total_cost'), price)
+            if errors is not None:
+                raise serializers.ValidationError(errors)
+            data['total_cost'] = total_cost
+        serializer.save()
+
+    # Import a batch of reservations at once, validating them with a few set-based queries (see khanto/bulk.py).
+    # The request body is a list of reservations, and the response holds the result of each one.
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of reservations.']})
+        results = import_reservations(request.data)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response({'created': created, 'errors': len(results) - created, 'results': results})
+
+class QuotesViewSet(AdmissionControlViewSetMixin, viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'quotes'
+
+    # Price a list of stays at once (see khanto/quotes.py). The request body is a list of
+    # {"advertisement": 1, "checkin_date": "2023-01-06", "checkout_date": "2023-01-08", "guests": 2}, and the
+    # response holds the price of each one.
+    def create(self, request):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of stays.']})
+        limit = getattr(settings, 'QUOTE_BATCH_LIMIT', 10000)
+        if len(request.data) > limit:
+            raise serializers.ValidationError({'non_field_errors': ['At most {} stays may be quoted at once.'.format(
+                limit)]})
+        results = quote_stays(request.data)
+        quoted = sum(1 for result in results if result['status'] == 'quoted')
+        return Response({'quoted': quoted, 'errors': len(results) - quoted, 'results': results})
+
+class AnalyticsViewSet(AdmissionControlViewSetMixin, viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'analytics'
+
+    def list(self, request):
+        return Response({name: reverse('analytics-' + name, request=request)
+            for name in ('revenue', 'occupancy', 'stays')})
+
+    # Reservations, revenue, platform taxes and net revenue, e.g. /analytics/revenue/?by=platform
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        query = self.validated_query(AnalyticsSerializer, request)
+        source, results = analytics.revenue(query['from'], query['to'], query.get('property'),
+            query.get('platform'), query['by'])
+        return self.figures(query, source, RevenueSerializer(results, many=True).data)
+
+    # Occupancy rate of each month, e.g. /analytics/occupancy/?from=2023-01-01&to=2023-12-31&property=1
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        query = self.validated_query(OccupancyAnalyticsSerializer, request)
+        source, results = analytics.occupancy(query['from'], query['to'], query.get('property'))
+        return self.figures(query, source, results)
+
+    # Number of reservations and average stay length, e.g. /analytics/stays/?by=property
+    @action(detail=False, methods=['get'])
+    def stays(self, request):
+        query = self.validated_query(AnalyticsSerializer, request)
+        source, results = analytics.stays(query['from'], query['to'], query.get('property'),
+            query.get('platform'), query['by'])
+        return self.figures(query, source, StaysSerializer(results, many=True).data)
+
+    def validated_query(self, serializer_class, request):
+        query = serializer_class(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    def figures(self, query, source, results):
+        return Response({
+            'from': query['from'],
+            'to': query['to'],
+            'source': source,
+            'results': results,
+        })
+
+# Answered to the clients of the change feed whose cursor is older than the entries deleted by the retention, along
+# with the latest cursor.
+class CursorExpired(exceptions.APIException):
+    status_code = 410
+    default_detail = 'Changes after this cursor were deleted, list the collections again and resume from the ' \
+        'latest cursor.'
+    default_code = 'cursor_expired'
+
+    def __init__(self, latest):
+        super().__init__()
+        self.detail = {'detail': self.detail, 'latest': latest}
+
+class ChangesViewSet(AdmissionControlViewSetMixin, viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [changes.EventStreamRenderer]
+    throttle_scope = 'changes'
+
+    # Waiting requests and event streams (see khanto/async_views.py) hold no database connection while they wait,
+    # and each of their reads is a single indexed query, so they aren't counted as work in flight.
+    admission_control = False
+
+    # Changes made after a cursor (see khanto/changes.py), e.g. /changes/?since=120&model=reservation. Only the
+    # ASGI deployment waits for changes (see khanto/async_views.py), this view ignores `wait`.
+    def list(self, request):
+        query = self.feed_query(request)
+        return Response(changes.read(query['since'], query['limit'], query.get('model')))
+
+    # Validate the query, resuming from the Last-Event-ID header of event streams when it is sent, and reject the
+    # cursors older than the entries deleted by the retention.
+    def feed_query(self, request):
+        if not changes.enabled():
+            raise Http404
+        data = request.query_params.copy()
+        if request.headers.get('Last-Event-ID'):
+            data['since'] = request.headers['Last-Event-ID']
+        query = ChangesSerializer(data=data)
+        query.is_valid(raise_exception=True)
+        if query.validated_data['since'] < changes.horizon():
+            raise CursorExpired(changes.latest())
+        return query.validated_data
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'khanto.settings')
 
 application = get_wsgi_application()
+
+# Load the availability index before the first request, when enabled (see khanto/availability_index.py).
+from khanto.availability_index import warm
+warm()